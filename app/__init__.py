@@ -2,9 +2,7 @@ import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from werkzeug.security import generate_password_hash
 from dotenv import load_dotenv
-from datetime import datetime
 import pytz # Importa a biblioteca para fusos horários
 
 # Carrega variáveis de ambiente do arquivo .env
@@ -21,74 +19,75 @@ login_manager.login_message_category = "info"
 
 
 # --- FILTRO JINJA2 CUSTOMIZADO PARA DATAS E HORAS LOCAIS ---
-def format_datetime_local(value, format='%d/%m/%Y %H:%M'):
+def localdatetime_filter(timezone_name):
     """
-    Filtro Jinja para converter uma data/hora UTC do banco de dados 
-    para o fuso horário local de São Paulo.
+    Monta o filtro Jinja que converte as datas/horas UTC do banco de dados para
+    o fuso DISPLAY_TIMEZONE. O objeto do fuso é criado uma única vez, aqui, e
+    não a cada data exibida.
+    """
+    local_tz = pytz.timezone(timezone_name)
+
+    def format_datetime_local(value, format='%d/%m/%Y %H:%M'):
+        if value is None:
+            return ""
+        # A data do banco é UTC sem fuso: marca como UTC e converte para o fuso local
+        return value.replace(tzinfo=pytz.utc).astimezone(local_tz).strftime(format)
+
+    return format_datetime_local
+
+
+def create_app(light=False):
+    """
+    Cria e configura a instância da aplicação Flask.
+    light=True monta só a configuração e o banco (sem rotas, templates, login
+    nem instrumentação), para scripts como o backup_scheduler.py.
     """
-    if value is None:
-        return ""
-    
-    # Define os fusos horários de origem (UTC) e destino (local)
-    utc_tz = pytz.utc
-    local_tz = pytz.timezone('America/Sao_Paulo') # Você pode mudar para seu fuso horário
-    
-    # Adiciona a informação de que a data do banco é UTC
-    utc_dt = utc_tz.localize(value)
-    
-    # Converte para o fuso horário local
-    local_dt = utc_dt.astimezone(local_tz)
-    
-    return local_dt.strftime(format)
-
-
-def create_app():
-    """Cria e configura a instância da aplicação Flask."""
     app = Flask(__name__)
     app.config.from_object('config.Config')
 
+    from app.database import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+    with app.app_context():
+        from app.database import init_database
+        init_database(app)
+    if light:
+        return app
+
     # --- REGISTRA O FILTRO JINJA2 NA APLICAÇÃO ---
-    app.jinja_env.filters['localdatetime'] = format_datetime_local
+    app.jinja_env.filters['localdatetime'] = localdatetime_filter(app.config['DISPLAY_TIMEZONE'])
+    from app.attachments import attachment_url
+    app.jinja_env.globals['attachment_url'] = attachment_url
 
     # Inicializa as extensões com a aplicação
-    db.init_app(app)
     login_manager.init_app(app)
 
     with app.app_context():
         # Importa os modelos e rotas dentro do contexto da aplicação
-        from app import models, forms
+        from app import models, forms, bootstrap
         from app.routes import main as main_blueprint
-        
+        from app.commands import register_commands
+        from app.instrumentation import init_instrumentation
+        from app.request_cache import init_request_cache
+        from app.card_cache import init_card_cache
+        from app.responses import init_responses
+
         app.register_blueprint(main_blueprint)
-        
-        # Cria as tabelas do banco de dados, se não existirem
-        db.create_all()
-
-        # Cria um usuário administrador padrão na primeira execução
-        if not models.User.query.filter_by(email='admin@empresa.com').first():
-            hashed_password = generate_password_hash('admin123', method='pbkdf2:sha256')
-            admin_user = models.User(
-                name='Administrador',
-                email='admin@empresa.com',
-                sector='TI',
-                password=hashed_password,
-                access_level='administrador'
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            print("Usuário administrador padrão criado!")
-
-        # Cria as configurações padrão do sistema na primeira execução
-        if not models.SystemSettings.query.first():
-            settings = models.SystemSettings()
-            db.session.add(settings)
-            db.session.commit()
-            print("Configurações padrão do sistema criadas!")
+        register_commands(app)
+        init_instrumentation(app)
+        init_responses(app)
+        init_request_cache(app)
+        init_card_cache(app)
+
+        # Banco novo ou esquema desatualizado: cria as tabelas, aplica as migrações e os
+        # registros padrão. Com o banco em dia é uma única leitura (ver app/bootstrap.py)
+        if app.config['AUTO_MIGRATE']:
+            bootstrap.ensure_ready()
 
     return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Função callback do Flask-Login para carregar um usuário pelo ID."""
-    from app.models import User
-    return User.query.get(int(user_id))
\ No newline at end of file
+    """Função callback do Flask-Login para carregar um usuário pelo ID (com cache, ver app/request_cache.py)."""
+    from app.request_cache import get_user
+    return get_user(int(user_id))
\ No newline at end of file
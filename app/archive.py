@@ -0,0 +1,277 @@
+"""
+Arquivo morto: chamados fechados e sem alteração há mais de ARCHIVE_AFTER_DAYS
+dias, com comentários e histórico, ficam em um segundo arquivo SQLite
+(ARCHIVE_DATABASE) em vez das tabelas ativas.
+
+O arquivo só é anexado (ATTACH ... AS archive) quando alguém precisa dele, na
+conexão em uso; a marca fica nas informações da conexão do pool, então cada
+conexão anexa uma única vez. Home, kanban, check_updates e dashboard leem só as
+tabelas ativas, que deixam de crescer com os anos de chamados encerrados.
+Recorrem ao arquivo:
+- view_ticket, quando o chamado não está mais na base ativa (somente leitura);
+- a busca, que completa os resultados com o índice FTS do próprio arquivo;
+- o dashboard, que soma os totais de ArchivedTicketStats, gravados na base
+  ativa na mesma transação que remove os chamados;
+- a coleta de lixo dos anexos, que considera as referências arquivadas.
+
+"flask archive-tickets" move os chamados em lotes: cada lote é copiado e
+depois removido da base ativa. Em WAL o commit não é atômico entre os dois
+arquivos; com essa ordem, uma falha no meio deixa o chamado nos dois lugares
+(e a próxima execução refaz a cópia dele), nunca em nenhum. Os chamados
+mantêm o ID, que a tabela ativa nunca reaproveita (AUTOINCREMENT, migração 9);
+um ID já usado por outro chamado no arquivo interrompe a execução com
+ArchiveError em vez de sobrescrevê-lo. Comentários e histórico recebem IDs
+próprios do arquivo. O arquivo entra nos backups da aplicação (app/backup.py).
+"""
+import sqlite3
+import os
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import MetaData, Table, Column, Index, select, insert, delete, func, text, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import DeclarativeBase, relationship, foreign, joinedload, selectinload
+from app import db
+from app import search
+from app.models import User, Ticket, Comment, TicketHistory, Notification, ArchivedTicketStats
+
+SCHEMA = 'archive'
+FTS_TABLE = f'{SCHEMA}.{search.FTS_TABLE}'
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveBase(DeclarativeBase):
+    metadata = MetaData(schema=SCHEMA)
+
+
+def _copy_table(source, *indexes):
+    """Mesmas colunas da tabela ativa, sem chaves estrangeiras (o usuário fica no outro arquivo)."""
+    columns = [Column(column.name, column.type, primary_key=column.primary_key) for column in source.columns]
+    return Table(source.name, ArchiveBase.metadata, *columns, *indexes)
+
+
+class ArchivedComment(ArchiveBase):
+    __table__ = _copy_table(Comment.__table__, Index('ix_archive_comment_ticket_id', 'ticket_id'))
+    comment_author = relationship(User, primaryjoin=lambda: foreign(ArchivedComment.user_id) == User.id, viewonly=True)
+
+
+class ArchivedTicketHistory(ArchiveBase):
+    __table__ = _copy_table(TicketHistory.__table__, Index('ix_archive_ticket_history_ticket_id', 'ticket_id'))
+    changed_by = relationship(User, primaryjoin=lambda: foreign(ArchivedTicketHistory.changed_by_user_id) == User.id, viewonly=True)
+
+
+class ArchivedTicket(ArchiveBase):
+    """Chamado no arquivo morto: os mesmos campos e relacionamentos de Ticket, somente leitura."""
+    __table__ = _copy_table(Ticket.__table__, Index('ix_archive_ticket_created_at', 'created_at'))
+    author = relationship(User, primaryjoin=lambda: foreign(ArchivedTicket.user_id) == User.id, viewonly=True)
+    assignee_user = relationship(User, primaryjoin=lambda: foreign(ArchivedTicket.assigned_to) == User.id, viewonly=True)
+    comments = relationship(ArchivedComment, primaryjoin=lambda: foreign(ArchivedComment.ticket_id) == ArchivedTicket.id,
+                            viewonly=True)
+    history = relationship(ArchivedTicketHistory, viewonly=True,
+                           primaryjoin=lambda: foreign(ArchivedTicketHistory.ticket_id) == ArchivedTicket.id)
+
+
+# (origem, destino, chave do lote, mantém o ID)
+MOVES = [(Ticket, ArchivedTicket, Ticket.id, True), (Comment, ArchivedComment, Comment.ticket_id, False),
+         (TicketHistory, ArchivedTicketHistory, TicketHistory.ticket_id, False)]
+
+
+def archive_path():
+    """Caminho do arquivo morto, ou None se o banco principal for em memória (sem arquivo ao lado)."""
+    path = current_app.config['ARCHIVE_DATABASE']
+    if path:
+        return path
+    database = db.engine.url.database
+    if not database or database == ':memory:':
+        return None
+    base, _ = os.path.splitext(database)
+    return f'{base}-archive.db'
+
+
+def exists():
+    path = archive_path()
+    return path is not None and os.path.exists(path)
+
+
+def attach(connection, create=False):
+    """
+    Anexa o arquivo morto à conexão, se ainda não estiver anexado. Retorna False
+    se o arquivo não existir (e create for falso). Precisa rodar antes de qualquer
+    escrita na transação: o SQLite não aceita ATTACH no meio de uma.
+    """
+    if connection.info.get('archive_attached'):
+        return True
+    path = archive_path()
+    if path is None:
+        if create:
+            raise ArchiveError('Sem arquivo morto para um banco em memória (defina ARCHIVE_DATABASE).')
+        return False
+    if not create and not os.path.exists(path):
+        return False
+    connection.exec_driver_sql(f'ATTACH DATABASE ? AS {SCHEMA}', (path,))
+    connection.info['archive_attached'] = True
+    return True
+
+
+def ensure_schema(connection):
+    ArchiveBase.metadata.create_all(connection)
+    if search.fts5_supported(connection):
+        connection.execute(text(f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({search.FTS_COLUMNS})'))
+
+
+def archived_max_id():
+    """Maior ID de chamado no arquivo morto (0 se não houver), lido sem anexar o arquivo."""
+    if not exists():
+        return 0
+    path = archive_path()
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute('SELECT COALESCE(MAX(id), 0) FROM ticket').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+def reserve_ids(connection, max_id):
+    """Garante que os próximos chamados recebam IDs acima de max_id (sqlite_sequence do AUTOINCREMENT)."""
+    if not max_id:
+        return
+    connection.execute(text("UPDATE sqlite_sequence SET seq = :max_id WHERE name = 'ticket' AND seq < :max_id"),
+                       {'max_id': max_id})
+    connection.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT 'ticket', :max_id "
+                            "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'ticket')"), {'max_id': max_id})
+
+
+def _has_fts(connection):
+    return connection.execute(text(f"SELECT 1 FROM {SCHEMA}.sqlite_master WHERE name = :name"),
+                              {'name': search.FTS_TABLE}).first() is not None
+
+
+# --- LEITURA ---
+
+def get_ticket(ticket_id):
+    """O chamado arquivado, com autor e comentários, ou None."""
+    if not attach(db.session.connection()):
+        return None
+    return db.session.query(ArchivedTicket).options(
+        joinedload(ArchivedTicket.author),
+        selectinload(ArchivedTicket.comments).joinedload(ArchivedComment.comment_author)
+    ).filter(ArchivedTicket.id == ticket_id).first()
+
+
+def search_archive(base_query, query_text, limit):
+    """Busca no arquivo morto; base_query é uma consulta de ArchivedTicket com o filtro de visibilidade."""
+    connection = db.session.connection()
+    if limit <= 0 or not attach(connection):
+        return [], {}
+    fts_table = FTS_TABLE if _has_fts(connection) else None
+    return search.search_tickets(db.session, base_query, query_text, limit, model=ArchivedTicket, fts_table=fts_table)
+
+
+def referenced_attachments():
+    """Nomes de anexos referenciados por chamados e comentários arquivados."""
+    if not attach(db.session.connection()):
+        return set()
+    names = set()
+    for column in (ArchivedTicket.attachment_filename, ArchivedComment.attachment_filename):
+        names.update(value for value, in db.session.query(column).filter(column.isnot(None)).distinct())
+    return names
+
+
+# --- MOVIMENTAÇÃO ---
+
+def _add_stats(ticket_ids):
+    rows = db.session.query(Ticket.status, Ticket.target_sector, Ticket.priority, func.count(Ticket.id)).filter(
+        Ticket.id.in_(ticket_ids)
+    ).group_by(Ticket.status, Ticket.target_sector, Ticket.priority).all()
+    stmt = sqlite_insert(ArchivedTicketStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['status', 'target_sector', 'priority'],
+        set_={'ticket_count': ArchivedTicketStats.ticket_count + stmt.excluded.ticket_count}
+    )
+    db.session.execute(stmt, [{'status': status, 'target_sector': sector, 'priority': priority, 'ticket_count': count}
+                              for status, sector, priority, count in rows])
+
+
+def _clear_resumed(batch_ids):
+    """
+    Chamados do lote que já estão no arquivo (execução anterior interrompida entre
+    a cópia e a remoção): a cópia antiga sai para ser refeita. Se o ID no arquivo
+    for de outro chamado, levanta ArchiveError sem alterar nada.
+    """
+    archived = db.session.execute(select(ArchivedTicket.id, ArchivedTicket.user_id, ArchivedTicket.created_at)
+                                  .where(ArchivedTicket.id.in_(batch_ids))).all()
+    if not archived:
+        return
+    live = {row.id: (row.user_id, row.created_at) for row in db.session.execute(
+        select(Ticket.id, Ticket.user_id, Ticket.created_at).where(Ticket.id.in_([row.id for row in archived])))}
+    conflicts = sorted(row.id for row in archived if live.get(row.id) != (row.user_id, row.created_at))
+    if conflicts:
+        raise ArchiveError(f"IDs já usados por outros chamados no arquivo morto: {', '.join(map(str, conflicts))}.")
+    resumed = list(live)
+    for _, target, _, _ in MOVES:
+        key = target.id if target is ArchivedTicket else target.ticket_id
+        db.session.execute(delete(target).where(key.in_(resumed)), execution_options={'synchronize_session': False})
+
+
+def archive_closed_tickets(days=None, batch_size=500, now=None):
+    """Move para o arquivo os chamados elegíveis. Retorna (quantidade movida, segundos gastos)."""
+    from app import reports, dashboard
+    started = time.monotonic()
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS'])
+    # O fechamento dos chamados precisa estar no agregado dos relatórios antes de o histórico sair da base ativa
+    reports.refresh_daily_rollup()
+    db.session.commit()
+
+    connection = db.session.connection()
+    attach(connection, create=True)
+    ensure_schema(connection)
+    # Arquivos criados antes da migração 9: os IDs que já estão lá não voltam para a base ativa
+    reserve_ids(connection, connection.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM {SCHEMA}.ticket')).scalar())
+    db.session.commit()
+    has_fts = _has_fts(db.session.connection())
+
+    eligible = (Ticket.status == 'Fechado', Ticket.updated_at < cutoff)
+    moved = 0
+    while True:
+        batch_ids = db.session.execute(select(Ticket.id).where(*eligible).limit(batch_size)).scalars().all()
+        if not batch_ids:
+            break
+        _clear_resumed(batch_ids)
+        for source, target, key, keep_id in MOVES:
+            columns = [column for column in source.__table__.columns if keep_id or column.name != 'id']
+            db.session.execute(insert(target.__table__).from_select(
+                [column.name for column in columns],
+                select(*columns).where(key.in_(batch_ids)).order_by(source.__table__.c.id)
+            ))
+        if has_fts:
+            db.session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM {SCHEMA}.ticket WHERE id IN :ids)')
+                               .bindparams(bindparam('ids', expanding=True)), {'ids': batch_ids})
+            db.session.execute(text(f"""
+                INSERT INTO {FTS_TABLE} (rowid, title, description, comments)
+                SELECT t.id, t.title, t.description,
+                       COALESCE((SELECT group_concat(c.content, ' ') FROM {SCHEMA}.comment c WHERE c.ticket_id = t.id), '')
+                FROM {SCHEMA}.ticket t WHERE t.id IN :ids
+            """).bindparams(bindparam('ids', expanding=True)), {'ids': batch_ids})
+
+        _add_stats(batch_ids)
+        # O chamado sai primeiro: os triggers da busca nos comentários removidos já não encontram a linha do índice
+        no_sync = {'synchronize_session': False}
+        db.session.execute(delete(Ticket).where(Ticket.id.in_(batch_ids)), execution_options=no_sync)
+        db.session.execute(delete(Comment).where(Comment.ticket_id.in_(batch_ids)), execution_options=no_sync)
+        db.session.execute(delete(TicketHistory).where(TicketHistory.ticket_id.in_(batch_ids)), execution_options=no_sync)
+        # Notificações já lidas não têm mais utilidade; as não lidas continuam levando ao chamado arquivado
+        db.session.execute(delete(Notification).where(Notification.ticket_id.in_(batch_ids), Notification.is_read.is_(True)),
+                           execution_options=no_sync)
+        db.session.commit()
+        moved += len(batch_ids)
+        if len(batch_ids) < batch_size:
+            break
+    if moved:
+        dashboard.invalidate()
+    return moved, time.monotonic() - started
@@ -0,0 +1,198 @@
+"""
+Armazenamento de anexos endereçado por conteúdo.
+
+Cada upload é gravado em ATTACHMENT_FOLDER com o nome <sha256><extensão>,
+calculado enquanto o arquivo é copiado em blocos para o disco; o mesmo print
+anexado em dez chamados ocupa espaço uma única vez. Como o nome muda sempre
+que o conteúdo muda, os arquivos são servidos com ETag forte, cache imutável
+de um ano e suporte a Range (ver a rota main.attachment).
+
+Imagens ganham uma miniatura (thumbs/<sha256>.<ext>) gerada numa thread de
+fundo, fora do caminho da requisição; sem o Pillow instalado, as páginas
+simplesmente usam a imagem original. Arquivos antigos, salvos com nome
+aleatório em static/uploads e static/chat_uploads, continuam funcionando pelo
+attachment_url(). "flask attachments-gc" remove os arquivos que nenhum
+registro referencia mais.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from werkzeug.utils import secure_filename
+
+try:
+    from PIL import Image
+except ImportError: # Pillow é opcional: sem ele não há miniaturas
+    Image = None
+
+STORED_EXTENSION = r'\.[a-z0-9]{1,10}'
+STORED_NAME = re.compile(rf'^([0-9a-f]{{64}})({STORED_EXTENSION})?$')
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif'}
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = '.upload-'
+
+_executor = None
+logger = logging.getLogger(__name__)
+
+
+def store_folder():
+    return current_app.config['ATTACHMENT_FOLDER']
+
+
+def thumbnail_path(folder, name):
+    digest, ext = STORED_NAME.match(name).groups()
+    thumb_ext = '.jpg' if ext in ('.jpg', '.jpeg') else '.png'
+    return os.path.join(folder, 'thumbs', f'{digest}{thumb_ext}')
+
+
+def stored_extension(filename):
+    """
+    Extensão do arquivo como entra no nome armazenado, ou '' se ela não couber em
+    STORED_NAME (longa demais, com '_' ou '-'): o nome salvo sempre é reconhecido.
+    """
+    _, ext = os.path.splitext(secure_filename(filename))
+    ext = ext.lower()
+    return ext if re.fullmatch(STORED_EXTENSION, ext) else ''
+
+
+def save_upload(file_storage):
+    """
+    Grava o upload (FileStorage) no armazenamento e retorna o nome a guardar no banco.
+    Se o mesmo conteúdo já existir, o arquivo novo é descartado e o existente reaproveitado.
+    """
+    if not file_storage or not file_storage.filename:
+        return None
+    folder = store_folder()
+    os.makedirs(folder, exist_ok=True)
+    ext = stored_extension(file_storage.filename)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                target.write(chunk)
+        name = f'{digest.hexdigest()}{ext}'
+        final_path = os.path.join(folder, name)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+            os.utime(final_path) # Renova a data para a coleta de lixo não levá-lo antes do commit
+        else:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if ext in IMAGE_EXTENSIONS:
+        schedule_thumbnail(folder, name)
+    return name
+
+
+# --- MINIATURAS ---
+
+def _make_thumbnail(folder, name, size):
+    target = thumbnail_path(folder, name)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(os.path.join(folder, name)) as image:
+        image.thumbnail((size, size))
+        if target.endswith('.jpg') and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = f'{target}.{os.getpid()}.tmp'
+        image.save(tmp_path, format='JPEG' if target.endswith('.jpg') else 'PNG', optimize=True)
+    os.replace(tmp_path, target)
+
+
+def schedule_thumbnail(folder, name):
+    """Agenda a geração da miniatura numa thread de fundo (não faz nada sem o Pillow)."""
+    global _executor
+    if Image is None:
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=current_app.config['THUMBNAIL_WORKERS'], thread_name_prefix='thumbnail')
+    size = current_app.config['THUMBNAIL_SIZE']
+    future = _executor.submit(_make_thumbnail, folder, name, size)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future):
+    # Roda na thread da miniatura, fora do contexto da aplicação: logger do módulo, não current_app.logger
+    error = future.exception()
+    if error is not None:
+        logger.error('Erro ao gerar miniatura: %s', error, exc_info=error)
+
+
+# --- URLS (inclusive dos anexos antigos em static/) ---
+
+def attachment_url(name, legacy_folder='uploads', thumbnail=False):
+    """URL de um anexo; nomes antigos (aleatórios) continuam servidos de static/<legacy_folder>/."""
+    if not name:
+        return None
+    if not STORED_NAME.match(name):
+        return url_for('static', filename=f'{legacy_folder}/{name}')
+    if thumbnail and has_thumbnail(name):
+        return url_for('main.attachment_thumbnail', name=name)
+    return url_for('main.attachment', name=name)
+
+
+def has_thumbnail(name):
+    return bool(name) and bool(STORED_NAME.match(name)) and os.path.exists(thumbnail_path(store_folder(), name))
+
+
+# --- COLETA DE LIXO ---
+
+def referenced_names():
+    from app import db
+    from app.models import Ticket, Comment, ChatMessage, SystemSettings
+    names = set()
+    for column in (Ticket.attachment_filename, Comment.attachment_filename,
+                   ChatMessage.attachment_filename, SystemSettings.logo_filename):
+        names.update(value for value, in db.session.query(column).filter(column.isnot(None)).distinct())
+    from app import archive
+    names.update(archive.referenced_attachments())
+    return names
+
+
+def collect_garbage(grace_seconds=3600, dry_run=False):
+    """
+    Remove anexos e miniaturas sem referência no banco, além de uploads
+    interrompidos. Arquivos mais novos que grace_seconds são preservados (o
+    registro que os referencia pode ainda não ter sido gravado).
+    Retorna (arquivos removidos, bytes liberados).
+    """
+    folder = store_folder()
+    if not os.path.isdir(folder):
+        return [], 0
+    referenced = {name for name in referenced_names() if STORED_NAME.match(name)}
+    referenced_thumbs = {os.path.basename(thumbnail_path(folder, name)) for name in referenced}
+    cutoff = time.time() - grace_seconds
+
+    candidates = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name not in referenced:
+            candidates.append(entry)
+    thumbs_folder = os.path.join(folder, 'thumbs')
+    if os.path.isdir(thumbs_folder):
+        for entry in os.scandir(thumbs_folder):
+            if entry.is_file() and entry.name not in referenced_thumbs:
+                candidates.append(entry)
+
+    removed, freed = [], 0
+    for entry in candidates:
+        stat = entry.stat()
+        if stat.st_mtime > cutoff:
+            continue
+        if not dry_run:
+            os.remove(entry.path)
+        removed.append(os.path.relpath(entry.path, folder))
+        freed += stat.st_size
+    return removed, freed
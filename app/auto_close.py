@@ -0,0 +1,61 @@
+"""
+Fechamento automático de chamados 'Resolvido' parados há mais de auto_close_days.
+
+Trabalha em lotes de até batch_size chamados, cada um em sua própria transação
+curta: um INSERT ... SELECT grava o histórico de todos os chamados do lote e um
+único UPDATE muda o status. As duas instruções repetem o filtro (status e
+updated_at) e rodam na mesma transação de escrita, então um chamado reaberto
+no meio do caminho não é tocado e rodar o job de novo não fecha nada duas
+vezes. O histórico fica sem autor (changed_by_user_id nulo), indicando que a
+mudança foi do sistema. No fim, os fechamentos entram no agregado dos relatórios.
+"""
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, select, update, literal
+from app import db
+from app import dashboard
+from app import reports
+from app.models import Ticket, TicketHistory, SystemSettings
+
+
+def threshold_days():
+    """Dias configurados na tela de configurações (ou AUTO_CLOSE_DAYS, se ainda não houver)."""
+    settings = SystemSettings.query.first()
+    if settings and settings.auto_close_days:
+        return settings.auto_close_days
+    return current_app.config['AUTO_CLOSE_DAYS']
+
+
+def close_resolved_tickets(days=None, batch_size=500, now=None):
+    """Fecha os chamados elegíveis. Retorna (quantidade fechada, segundos gastos)."""
+    started = time.monotonic()
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=days if days is not None else threshold_days())
+    eligible = (Ticket.status == 'Resolvido', Ticket.updated_at < cutoff)
+
+    closed = 0
+    while True:
+        batch_ids = db.session.execute(
+            select(Ticket.id).where(*eligible).limit(batch_size)
+        ).scalars().all()
+        if not batch_ids:
+            break
+        in_batch = (Ticket.id.in_(batch_ids), *eligible)
+        db.session.execute(insert(TicketHistory).from_select(
+            ['ticket_id', 'changed_by_user_id', 'field_changed', 'old_value', 'new_value', 'timestamp'],
+            select(Ticket.id, literal(None), literal('status'), literal('Resolvido'), literal('Fechado'), literal(now))
+            .where(*in_batch)
+        ))
+        result = db.session.execute(
+            update(Ticket).where(*in_batch).values(status='Fechado', closed_at=now, updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        closed += result.rowcount
+        if len(batch_ids) < batch_size:
+            break
+    if closed:
+        reports.refresh_daily_rollup()
+        dashboard.invalidate()
+    return closed, time.monotonic() - started
@@ -0,0 +1,331 @@
+"""
+Backups do banco SQLite.
+
+A cópia é feita pela API de backup online do SQLite (sqlite3.Connection.backup)
+e o resultado é sempre um banco consistente, inclusive com o conteúdo ainda no
+arquivo -wal. Em WAL ela é feita em um único passo, que lê um retrato do banco
+sem bloquear quem escreve. Nos outros modos vai em passos de BACKUP_STEP_PAGES
+páginas, liberando as escritas entre eles; como o SQLite recomeça a cópia
+quando outra conexão escreve, depois de MAX_BACKUP_RESTARTS recomeços ela
+termina em um único passo, em vez de recomeçar para sempre. A cópia é conferida com
+PRAGMA integrity_check, comprimida em gzip por streaming e acompanhada de um
+manifesto JSON (<arquivo>.json) com tamanhos, duração e SHA-256.
+
+O arquivo morto (ver app/archive.py), quando existe, vai junto em
+site_<data-hora>-archive.db.gz, registrado no manifesto do backup principal; a
+restauração devolve os dois. O principal é copiado antes do arquivo morto: se
+um arquivamento acontecer entre as duas cópias, o chamado movido aparece nos
+dois (e o próximo arquivamento conclui a mudança), nunca em nenhum.
+
+A retenção mantém o backup mais recente de cada um dos últimos
+BACKUP_KEEP_DAILY dias e de cada uma das últimas BACKUP_KEEP_WEEKLY semanas.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from flask import current_app
+from werkzeug.utils import safe_join
+from app import db
+
+BACKUP_NAME = re.compile(r'^site_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.db(\.gz)?$')
+TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
+CHUNK_SIZE = 1024 * 1024
+MAX_BACKUP_RESTARTS = 3
+
+
+class BackupError(Exception):
+    pass
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _integrity_check(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        conn.close()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _detach_wal(path):
+    """Deixa a cópia em journal_mode=DELETE: um único arquivo, sem -wal e -shm ao lado."""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        conn.close()
+
+
+def _online_copy(source_path, target_path, step_pages, step_sleep=0.01, max_restarts=MAX_BACKUP_RESTARTS):
+    """Copia source_path para target_path com a API de backup do SQLite (ver o início do módulo)."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if wal or step_pages <= 0:
+            with target:
+                source.backup(target, pages=-1)
+            return
+
+        last = {'remaining': None, 'restarts': 0}
+
+        def progress(status, remaining, total):
+            # Faltar mais páginas que no passo anterior significa que a cópia recomeçou
+            if last['remaining'] is not None and remaining > last['remaining']:
+                last['restarts'] += 1
+                if last['restarts'] > max_restarts:
+                    raise _TooManyRestarts()
+            last['remaining'] = remaining
+
+        try:
+            with target:
+                source.backup(target, pages=step_pages, progress=progress, sleep=step_sleep)
+        except _TooManyRestarts:
+            with target:
+                source.backup(target, pages=-1)
+    finally:
+        target.close()
+        source.close()
+
+
+class _HashingWriter:
+    """Repassa as escritas para o arquivo e calcula o SHA-256 do que foi gravado."""
+
+    def __init__(self, fileobj, digest):
+        self.fileobj = fileobj
+        self.digest = digest
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+
+def manifest_path(backup_path):
+    return f'{backup_path}.json'
+
+
+def archive_filename(filename):
+    """Nome do backup do arquivo morto que acompanha o backup principal."""
+    return filename.replace('.db', '-archive.db', 1)
+
+
+def _copy_compressed(source_path, backup_path, workdir, step_pages, inner_name):
+    """Cópia online de source_path, conferida e comprimida em backup_path. Retorna (tamanho do banco, SHA-256)."""
+    fd, raw_path = tempfile.mkstemp(prefix='.backup-', suffix='.db', dir=workdir)
+    os.close(fd)
+    partial_path = f'{backup_path}.partial'
+    try:
+        _online_copy(source_path, raw_path, step_pages)
+        _detach_wal(raw_path)
+        check = _integrity_check(raw_path)
+        if check != 'ok':
+            raise BackupError(f'A cópia não passou no integrity_check: {check}')
+
+        digest = hashlib.sha256()
+        with open(raw_path, 'rb') as source, open(partial_path, 'wb') as target:
+            with gzip.GzipFile(filename=inner_name, mode='wb', fileobj=_HashingWriter(target, digest), mtime=0) as compressed:
+                shutil.copyfileobj(source, compressed, CHUNK_SIZE)
+        os.replace(partial_path, backup_path)
+        return os.path.getsize(raw_path), digest.hexdigest()
+    finally:
+        for leftover in (raw_path, f'{raw_path}-wal', f'{raw_path}-shm', partial_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def create_backup(db_path, backup_folder, step_pages=1024, archive_path=None):
+    """
+    Cria site_<data-hora>.db.gz e o manifesto; retorna o manifesto (dict). Se
+    archive_path existir, o arquivo morto vai junto (ver archive_filename).
+    """
+    os.makedirs(backup_folder, exist_ok=True)
+    started = time.monotonic()
+    now = datetime.now()
+    filename = f'site_{now.strftime(TIMESTAMP_FORMAT)}.db.gz'
+    backup_path = os.path.join(backup_folder, filename)
+    if os.path.exists(backup_path):
+        raise BackupError(f'Já existe um backup chamado {filename}.')
+
+    database_size, sha256 = _copy_compressed(db_path, backup_path, backup_folder, step_pages, 'site.db')
+    manifest = {
+        'filename': filename,
+        'created_at': now.isoformat(timespec='seconds'),
+        'database_size': database_size,
+        'size': os.path.getsize(backup_path),
+        'sha256': sha256,
+    }
+    if archive_path and os.path.exists(archive_path):
+        archive_backup = os.path.join(backup_folder, archive_filename(filename))
+        try:
+            archive_size, archive_sha256 = _copy_compressed(archive_path, archive_backup, backup_folder, step_pages,
+                                                            'site-archive.db')
+        except BaseException:
+            os.remove(backup_path)
+            raise
+        manifest['archive'] = {
+            'filename': archive_filename(filename),
+            'database_size': archive_size,
+            'size': os.path.getsize(archive_backup),
+            'sha256': archive_sha256,
+        }
+    manifest['duration_seconds'] = round(time.monotonic() - started, 3)
+    with open(manifest_path(backup_path), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _read_manifest(backup_path):
+    try:
+        with open(manifest_path(backup_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_backups(backup_folder):
+    """Backups da pasta, do mais recente ao mais antigo (inclui os .db antigos, sem compressão)."""
+    if not os.path.isdir(backup_folder):
+        return []
+    backups = []
+    for filename in os.listdir(backup_folder):
+        match = BACKUP_NAME.match(filename)
+        if not match:
+            continue
+        path = os.path.join(backup_folder, filename)
+        manifest = _read_manifest(path) or {}
+        backups.append({
+            'filename': filename,
+            'created_at': datetime.strptime(match.group(1), TIMESTAMP_FORMAT),
+            'size': os.path.getsize(path),
+            'database_size': manifest.get('database_size'),
+            'duration_seconds': manifest.get('duration_seconds'),
+            'sha256': manifest.get('sha256'),
+            'archive': manifest.get('archive'),
+        })
+    return sorted(backups, key=lambda b: b['created_at'], reverse=True)
+
+
+def delete_backup(backup_folder, filename):
+    """Remove o backup e seu manifesto. Retorna False se o arquivo não existir."""
+    path = safe_join(backup_folder, filename)
+    if path is None or not BACKUP_NAME.match(filename) or not os.path.exists(path):
+        return False
+    os.remove(path)
+    for companion in (manifest_path(path), os.path.join(backup_folder, archive_filename(filename))):
+        if os.path.exists(companion):
+            os.remove(companion)
+    return True
+
+
+def apply_retention(backup_folder, keep_daily, keep_weekly):
+    """
+    Mantém o backup mais recente de cada um dos últimos keep_daily dias e de cada
+    uma das últimas keep_weekly semanas ISO; remove os demais. Com os dois valores
+    em zero a retenção fica desligada. Retorna os nomes removidos.
+    """
+    if keep_daily <= 0 and keep_weekly <= 0:
+        return []
+    keep, days, weeks = set(), [], []
+    for backup in list_backups(backup_folder):
+        day = backup['created_at'].date()
+        week = day.isocalendar()[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(backup['filename'])
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(backup['filename'])
+    removed = []
+    for backup in list_backups(backup_folder):
+        if backup['filename'] not in keep and delete_backup(backup_folder, backup['filename']):
+            removed.append(backup['filename'])
+    return removed
+
+
+def verify_backup(backup_path, workdir, sha256=None, restored_name='restore.db'):
+    """
+    Confere o SHA-256 (o informado ou o do manifesto), descompacta em workdir e roda o
+    integrity_check. Retorna o caminho do banco descompactado; levanta BackupError se algo não bater.
+    """
+    if sha256 is None:
+        manifest = _read_manifest(backup_path)
+        sha256 = manifest.get('sha256') if manifest else None
+    if sha256 and _sha256(backup_path) != sha256:
+        raise BackupError('SHA-256 diferente do registrado no manifesto: arquivo corrompido.')
+
+    restored_path = os.path.join(workdir, restored_name)
+    if backup_path.endswith('.gz'):
+        with gzip.open(backup_path, 'rb') as source, open(restored_path, 'wb') as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+    else:
+        shutil.copyfile(backup_path, restored_path)
+
+    check = _integrity_check(restored_path)
+    if check != 'ok':
+        raise BackupError(f'O backup não passou no integrity_check: {check}')
+    return restored_path
+
+
+def restore_backup(backup_path, db_path, step_pages=1024, archive_path=None):
+    """
+    Verifica o backup (e o do arquivo morto, se houver) e copia sobre os bancos em uso
+    pela API de backup (seguro com conexões abertas). Um arquivo morto atual que não
+    existia no momento do backup é renomeado para <arquivo>.<data-hora>.bak, para não
+    misturar chamados. Retorna o caminho desse arquivo renomeado, ou None.
+    """
+    archive = (_read_manifest(backup_path) or {}).get('archive')
+    with tempfile.TemporaryDirectory() as workdir:
+        restored_path = verify_backup(backup_path, workdir)
+        restored_archive = None
+        if archive and archive_path:
+            archive_backup = os.path.join(os.path.dirname(backup_path), archive['filename'])
+            if not os.path.exists(archive_backup):
+                raise BackupError(f'Backup do arquivo morto não encontrado: {archive["filename"]}')
+            restored_archive = verify_backup(archive_backup, workdir, archive['sha256'], 'restore-archive.db')
+
+        _online_copy(restored_path, db_path, step_pages)
+        if restored_archive:
+            _online_copy(restored_archive, archive_path, step_pages)
+        elif archive_path and os.path.exists(archive_path):
+            moved_path = f'{archive_path}.{datetime.now().strftime(TIMESTAMP_FORMAT)}.bak'
+            os.replace(archive_path, moved_path)
+            return moved_path
+    return None
+
+
+def database_path():
+    """Arquivo do banco da aplicação. Levanta BackupError se o banco estiver só na memória."""
+    from app.database import is_memory_database
+    if is_memory_database(db.engine.url):
+        raise BackupError('O banco está em memória (sqlite://): não há arquivo para copiar. '
+                          'Aponte DATABASE_URL para um arquivo SQLite para usar backups.')
+    return db.engine.url.database
+
+
+def backup_now():
+    """Cria um backup do banco da aplicação (e do arquivo morto) e aplica a retenção configurada. Retorna (manifesto, removidos)."""
+    from app import archive
+    config = current_app.config
+    manifest = create_backup(database_path(), config['BACKUP_FOLDER'], config['BACKUP_STEP_PAGES'], archive.archive_path())
+    removed = apply_retention(config['BACKUP_FOLDER'], config['BACKUP_KEEP_DAILY'], config['BACKUP_KEEP_WEEKLY'])
+    return manifest, removed
@@ -0,0 +1,66 @@
+"""
+Preparação do banco de dados: tabelas, migrações versionadas e os registros
+padrão (administrador e configurações do sistema).
+
+Roda por inteiro com "flask init-db". Na subida da aplicação (AUTO_MIGRATE),
+ensure_ready faz uma única leitura da versão do esquema e só prepara o banco
+se ela estiver atrás da última migração, ou seja, em um banco novo ou depois
+de uma atualização do código. Nos demais casos, cada worker do gunicorn e
+cada script sobem sem create_all nem consultas de usuário e configurações.
+"""
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+from app import db
+from app import migrations
+
+DEFAULT_ADMIN_EMAIL = 'admin@empresa.com'
+DEFAULT_ADMIN_PASSWORD = 'admin123'
+
+
+def latest_version():
+    return migrations.MIGRATIONS[-1][0]
+
+
+def installed_version(engine):
+    """Versão do esquema gravada no banco (0 se o banco ainda não foi preparado), sem escrever nada."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+    except OperationalError:
+        return 0
+
+
+def create_defaults(log=print):
+    """Cria o administrador padrão e as configurações do sistema, se ainda não existirem."""
+    from app.models import User, SystemSettings
+    if not User.query.filter_by(email=DEFAULT_ADMIN_EMAIL).first():
+        db.session.add(User(
+            name='Administrador',
+            email=DEFAULT_ADMIN_EMAIL,
+            sector='TI',
+            password=generate_password_hash(DEFAULT_ADMIN_PASSWORD, method='pbkdf2:sha256'),
+            access_level='administrador'
+        ))
+        db.session.commit()
+        log("Usuário administrador padrão criado!")
+    if not SystemSettings.query.first():
+        db.session.add(SystemSettings())
+        db.session.commit()
+        log("Configurações padrão do sistema criadas!")
+
+
+def initialize(log=print):
+    """Cria as tabelas que faltam, aplica as migrações pendentes e os registros padrão (idempotente)."""
+    db.create_all()
+    for version, description in migrations.upgrade(db.engine):
+        log(f"Migração {version} aplicada: {description}")
+    create_defaults(log)
+
+
+def ensure_ready(log=print):
+    """Guarda da subida: prepara o banco apenas se o esquema estiver desatualizado. Retorna se preparou."""
+    if installed_version(db.engine) >= latest_version():
+        return False
+    initialize(log)
+    return True
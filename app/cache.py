@@ -0,0 +1,108 @@
+"""
+Cache em memória do processo, com tempo de vida (TTL) e limite de entradas.
+
+Serve para valores caros de calcular e baratos de invalidar, como as métricas
+do dashboard: quem grava no banco chama invalidate() logo após o commit e o
+TTL limita o quanto um valor pode ficar desatualizado quando a escrita
+acontece em outro processo. Quando isso não basta, o cache pode ser ligado a
+uma SharedVersion: um arquivo cujo carimbo muda a cada invalidação, conferido
+com um os.stat() a cada leitura, para que todos os processos esvaziem juntos.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class SharedVersion:
+    """
+    Contador de versão compartilhado entre processos através de um arquivo.
+    bump() regrava o arquivo com os.replace (novo inode e mtime); current()
+    devolve esse carimbo, ou None enquanto o arquivo não existir.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def current(self):
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+    def bump(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, self.path)
+
+
+class TTLCache:
+    """Dicionário LRU com expiração por entrada, seguro para várias threads."""
+
+    def __init__(self, ttl=60, max_entries=256, version=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = version
+        self._seen_version = version.current() if version else None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sync_version(self):
+        # Chamado com o lock: outro processo invalidou desde a última leitura?
+        if self.version is None:
+            return
+        current = self.version.current()
+        if current != self._seen_version:
+            self._data.clear()
+            self._seen_version = current
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._sync_version()
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Retorna o valor em cache ou calcula com factory() e guarda o resultado."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """Remove uma entrada, ou todas se key for None (e avisa os outros processos, se houver SharedVersion)."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            if self.version is not None:
+                self.version.bump()
+                self._seen_version = self.version.current()
+
+    def __len__(self):
+        return len(self._data)
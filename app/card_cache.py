@@ -0,0 +1,51 @@
+"""
+Cache dos cards de chamado já renderizados (components/ticket_card.html), que
+a home e o kanban repetem às centenas a cada carregamento e a cada página.
+
+A chave é o id do chamado, updated_at, o nível de acesso de quem vê e os nomes
+do autor e do responsável (que podem mudar sem tocar no chamado). Toda escrita
+em Ticket grava updated_at, então um chamado alterado simplesmente gera uma
+chave nova e a antiga sai pelo LRU, sem invalidação explícita. O tamanho é
+limitado por TICKET_CARD_CACHE_MAX_ENTRIES (0 desliga o cache). Cards com
+trecho da busca são renderizados sem passar pelo cache.
+"""
+from flask_login import current_user
+from jinja2 import pass_context
+from markupsafe import Markup
+from app.cache import TTLCache
+
+TEMPLATE = 'components/ticket_card.html'
+
+card_cache = TTLCache()
+
+
+def _key(ticket):
+    assignee = ticket.assignee_user
+    return (ticket.id, ticket.updated_at, getattr(current_user, 'access_level', None),
+            ticket.author.name, assignee.name if assignee else None)
+
+
+def _render(context, ticket):
+    # Mesmo caminho do {% include %}: o contexto do template que chama é compartilhado, sem copiar os globais
+    template = context.environment.get_template(TEMPLATE)
+    return Markup(''.join(template.root_render_func(template.new_context(context.get_all(), True, {'ticket': ticket}))))
+
+
+@pass_context
+def render_ticket_card(context, ticket):
+    """Global Jinja: o HTML do card do chamado, do cache quando possível."""
+    snippets = context.get('snippets')
+    if snippets and snippets.get(ticket.id):
+        return _render(context, ticket)
+    key = _key(ticket)
+    html = card_cache.get(key)
+    if html is None:
+        html = _render(context, ticket)
+        card_cache.set(key, html)
+    return html
+
+
+def init_card_cache(app):
+    card_cache.ttl = app.config['TICKET_CARD_CACHE_SECONDS']
+    card_cache.max_entries = app.config['TICKET_CARD_CACHE_MAX_ENTRIES']
+    app.jinja_env.globals['ticket_card'] = render_ticket_card
@@ -0,0 +1,86 @@
+"""
+Manutenção do resumo das conversas do chat (tabela ChatConversation).
+As funções daqui rodam na mesma transação que grava ou lê as mensagens, para
+que a lista de conversas e os contadores de não lidas nunca fiquem defasados.
+"""
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert
+from app import db
+from app import attachments
+from app.models import ChatConversation, ChatMessage
+
+
+def record_chat_message(msg):
+    """Atualiza a última mensagem das duas pontas da conversa e soma uma não lida ao destinatário."""
+    rows = [{'user_id': msg.recipient_id, 'partner_id': msg.sender_id, 'last_message_id': msg.id,
+             'last_message_at': msg.timestamp, 'unread_count': 0 if msg.sender_id == msg.recipient_id else 1}]
+    if msg.sender_id != msg.recipient_id:
+        rows.append({'user_id': msg.sender_id, 'partner_id': msg.recipient_id, 'last_message_id': msg.id,
+                     'last_message_at': msg.timestamp, 'unread_count': 0})
+    stmt = insert(ChatConversation).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'partner_id'],
+        set_={
+            'last_message_id': stmt.excluded.last_message_id,
+            'last_message_at': stmt.excluded.last_message_at,
+            'unread_count': ChatConversation.unread_count + stmt.excluded.unread_count,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def mark_conversation_read(user_id, partner_id):
+    """
+    Marca como lidas, com um único UPDATE, as mensagens do parceiro para o usuário
+    e zera o contador da conversa. Retorna quantas mensagens foram marcadas.
+    """
+    updated = ChatMessage.query.filter(
+        ChatMessage.sender_id == partner_id,
+        ChatMessage.recipient_id == user_id,
+        ChatMessage.is_read == False
+    ).update({'is_read': True}, synchronize_session=False)
+    ChatConversation.query.filter_by(user_id=user_id, partner_id=partner_id).update(
+        {'unread_count': 0}, synchronize_session=False
+    )
+    return updated
+
+
+def serialize_message(msg, sender_name):
+    """Mensagem no formato da API do chat (polling e WebSocket); precisa de contexto de requisição para as URLs."""
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'recipient_id': msg.recipient_id,
+        'sender_name': sender_name,
+        'content': msg.content,
+        'timestamp': msg.timestamp.isoformat() + 'Z',
+        'is_read': msg.is_read,
+        'attachment_filename': msg.attachment_filename,
+        'attachment_url': attachments.attachment_url(msg.attachment_filename, legacy_folder='chat_uploads'),
+        'thumbnail_url': attachments.attachment_url(msg.attachment_filename, thumbnail=True) if attachments.has_thumbnail(msg.attachment_filename) else None
+    }
+
+
+def unread_counts(user_id):
+    """[(parceiro, não lidas)] das conversas do usuário com mensagens não lidas, lidas do resumo."""
+    return db.session.query(ChatConversation.partner_id, ChatConversation.unread_count).filter(
+        ChatConversation.user_id == user_id,
+        ChatConversation.unread_count > 0
+    ).order_by(ChatConversation.partner_id).all()
+
+
+def rebuild_conversations(conn):
+    """Recalcula todo o resumo das conversas a partir do histórico de mensagens, em uma única instrução."""
+    conn.execute(text("DELETE FROM chat_conversation"))
+    conn.execute(text("""
+        INSERT OR IGNORE INTO chat_conversation (user_id, partner_id, last_message_id, last_message_at, unread_count)
+        SELECT owner_id, partner_id, MAX(id), MAX(timestamp), SUM(unread)
+        FROM (
+            SELECT sender_id AS owner_id, recipient_id AS partner_id, id, timestamp, 0 AS unread
+            FROM chat_message
+            UNION ALL
+            SELECT recipient_id, sender_id, id, timestamp, CASE WHEN is_read = 0 THEN 1 ELSE 0 END
+            FROM chat_message WHERE sender_id != recipient_id
+        )
+        GROUP BY owner_id, partner_id
+    """))
@@ -0,0 +1,185 @@
+import click
+from app import db
+
+
+def register_commands(app):
+    """Registra os comandos de linha de comando da aplicação (flask <comando>)."""
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Cria as tabelas, aplica as migrações e os registros padrão (administrador e configurações)."""
+        from app import bootstrap, migrations
+        bootstrap.initialize(log=click.echo)
+        click.echo(f'Banco pronto, esquema na versão {migrations.current_version(db.engine)}.')
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Aplica as migrações pendentes do esquema."""
+        from app import migrations
+        applied = migrations.upgrade(db.engine)
+        for version, description in applied:
+            click.echo(f'Migração {version} aplicada: {description}')
+        click.echo(f'Esquema na versão {migrations.current_version(db.engine)}.')
+
+    @app.cli.command('db-explain')
+    def db_explain():
+        """Verifica com EXPLAIN QUERY PLAN se as consultas principais usam índices."""
+        from app import migrations
+        failures = 0
+        for name, plan, uses_index in migrations.explain_hot_queries(db.engine):
+            click.echo(f"[{'OK' if uses_index else 'SEM ÍNDICE'}] {name}")
+            for step in plan:
+                click.echo(f'    {step}')
+            failures += not uses_index
+        if failures:
+            raise click.ClickException(f'{failures} consulta(s) fazendo varredura completa de tabela.')
+
+    @app.cli.command('db-stress')
+    @click.option('--readers', default=8, show_default=True)
+    @click.option('--writers', default=2, show_default=True)
+    @click.option('--seconds', default=5.0, show_default=True)
+    def db_stress(readers, writers, seconds):
+        """Compara, num banco temporário, leituras concorrendo com escritas com e sem os ajustes do SQLite."""
+        from app import database
+        scenarios = [
+            ('padrão do SQLite (journal DELETE, sem busy_timeout)', [('journal_mode', 'DELETE')]),
+            ('configuração da aplicação', database.sqlite_pragmas(app.config)),
+        ]
+        for label, pragmas in scenarios:
+            stats = database.stress_test(pragmas, readers, writers, seconds)
+            click.echo(f'{label}:')
+            click.echo(f"    leituras: {stats['reads']} (erros de bloqueio: {stats['read_errors']}), "
+                       f"escritas: {stats['writes']} (erros de bloqueio: {stats['write_errors']})")
+            click.echo(f"    latência de leitura: p50 {stats['read_p50_ms']:.2f} ms, "
+                       f"p99 {stats['read_p99_ms']:.2f} ms, máx {stats['read_max_ms']:.2f} ms")
+
+    @app.cli.command('seed')
+    @click.option('--tickets', default=1000, show_default=True, help='Quantidade de chamados (10^3 a 10^6).')
+    @click.option('--seed', 'random_seed', default=42, show_default=True, help='Semente do gerador (mesma semente, mesmos dados).')
+    @click.option('--days', default=365, show_default=True, help='Período coberto pelas datas geradas.')
+    @click.option('--yes', is_flag=True, help='Não pede confirmação se o banco já tiver chamados.')
+    def seed(tickets, random_seed, days, yes):
+        """Preenche o banco com dados sintéticos (usuários, chamados, histórico, comentários e chat)."""
+        from app import seed as seed_data
+        from app.models import Ticket
+        if not yes and Ticket.query.first() is not None:
+            click.confirm('O banco já tem chamados. Adicionar os dados sintéticos mesmo assim?', abort=True)
+        counts = seed_data.seed_database(tickets, random_seed, days, progress=click.echo)
+        seconds = counts.pop('seconds')
+        click.echo(', '.join(f'{table}: {count}' for table, count in counts.items()) + f' ({seconds}s)')
+        click.echo(f'Senha de todos os usuários gerados: {seed_data.SEED_PASSWORD}')
+
+    @app.cli.command('search-rebuild')
+    def search_rebuild():
+        """Reconstrói o índice de busca textual (FTS5) de chamados e comentários."""
+        from app import search
+        with db.engine.begin() as conn:
+            if not search.fts5_supported(conn):
+                raise click.ClickException('Este SQLite não tem suporte a FTS5.')
+            search.create_index(conn)
+            count = search.rebuild_index(conn)
+        click.echo(f'{count} chamado(s) indexado(s).')
+
+    @app.cli.command('reports-rollup')
+    def reports_rollup():
+        """Consolida no agregado diário dos relatórios os chamados alterados desde a última execução."""
+        from app import reports
+        click.echo(f'{reports.refresh_daily_rollup()} fechamento(s) consolidado(s).')
+
+    @app.cli.command('auto-close')
+    @click.option('--days', type=int, default=None, help='Sobrepõe o valor definido nas configurações.')
+    def auto_close(days):
+        """Fecha os chamados 'Resolvido' parados há mais dias que o configurado."""
+        from app import auto_close as auto_close_job
+        closed, seconds = auto_close_job.close_resolved_tickets(days, app.config['AUTO_CLOSE_BATCH_SIZE'])
+        click.echo(f'{closed} chamado(s) fechado(s) automaticamente em {seconds:.2f}s.')
+
+    @app.cli.command('attachments-gc')
+    @click.option('--dry-run', is_flag=True, help='Apenas lista o que seria removido.')
+    def attachments_gc(dry_run):
+        """Remove anexos e miniaturas que nenhum chamado, comentário, mensagem ou logo referencia."""
+        from app import attachments
+        removed, freed = attachments.collect_garbage(app.config['ATTACHMENT_GC_GRACE_SECONDS'], dry_run)
+        for name in removed:
+            click.echo(f"{'seria removido' if dry_run else 'removido'}: {name}")
+        click.echo(f'{len(removed)} arquivo(s), {freed / 1024 / 1024:.1f} MB.')
+
+    @app.cli.command('backup-restore')
+    @click.argument('filename')
+    @click.option('--yes', is_flag=True, help='Não pede confirmação.')
+    def backup_restore(filename, yes):
+        """Verifica um backup (SHA-256 e integrity_check) e restaura o banco a partir dele."""
+        import os
+        from app import backup, archive
+        backup_path = os.path.join(app.config['BACKUP_FOLDER'], os.path.basename(filename))
+        if not os.path.exists(backup_path):
+            raise click.ClickException(f'Backup não encontrado: {backup_path}')
+        try:
+            db_path = backup.database_path()
+        except backup.BackupError as e:
+            raise click.ClickException(str(e))
+        if not yes:
+            click.confirm(f'Substituir o banco atual pelo conteúdo de {filename}?', abort=True)
+        # Sem aplicar a retenção aqui, para não remover o próprio arquivo que será restaurado
+        archive_path = archive.archive_path()
+        manifest = backup.create_backup(db_path, app.config['BACKUP_FOLDER'], app.config['BACKUP_STEP_PAGES'], archive_path)
+        click.echo(f'Backup de segurança do estado atual: {manifest["filename"]}')
+        try:
+            moved = backup.restore_backup(backup_path, db_path, app.config['BACKUP_STEP_PAGES'], archive_path)
+        except backup.BackupError as e:
+            raise click.ClickException(str(e))
+        if moved:
+            click.echo(f'O backup não tem arquivo morto; o atual foi renomeado para {moved}.')
+        db.engine.dispose()
+        from app import request_cache
+        request_cache.invalidate()
+        click.echo(f'Banco restaurado a partir de {filename}.')
+
+    @app.cli.command('tickets-export')
+    @click.argument('output', type=click.File('w', encoding='utf-8', lazy=True))
+    @click.option('--format', 'fmt', type=click.Choice(['json', 'csv']), default='json', show_default=True,
+                  help='json: JSON Lines com comentários e histórico aninhados; csv: uma tabela (--kind).')
+    @click.option('--kind', type=click.Choice(['tickets', 'comments', 'history']), default='tickets', show_default=True)
+    @click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='Criados a partir desta data.')
+    @click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='Criados até esta data (inclusive).')
+    @click.option('--sector', help='Setor de origem ou destino.')
+    @click.option('--status')
+    def tickets_export(output, fmt, kind, start, end, sector, status):
+        """Exporta chamados (com comentários e histórico) em lotes, sem carregar a base na memória."""
+        from app import transfer
+        filters = transfer.ticket_filters(start and start.date(), end and end.date(), sector, status)
+        batch_size = app.config['EXPORT_BATCH_SIZE']
+        chunks = transfer.export_json_lines(filters, batch_size) if fmt == 'json' else transfer.export_csv(filters, kind, batch_size)
+        for chunk in chunks:
+            output.write(chunk)
+
+    @app.cli.command('tickets-import')
+    @click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--format', 'fmt', type=click.Choice(['json', 'csv']), help='Padrão: pela extensão do arquivo.')
+    @click.option('--batch-size', default=1000, show_default=True, help='Chamados por transação.')
+    @click.option('--default-user', help='E-mail do autor usado quando o do arquivo não existe (padrão: administrador).')
+    def tickets_import(source, fmt, batch_size, default_user):
+        """Importa chamados de um JSON Lines (formato do tickets-export) ou de um CSV de chamados."""
+        from app import transfer
+        fmt = fmt or ('csv' if source.name.lower().endswith('.csv') else 'json')
+        try:
+            result = transfer.import_tickets(source, fmt, batch_size, default_user, progress=click.echo)
+        except transfer.ImportFormatError as e:
+            raise click.ClickException(str(e))
+        for error in result['errors']:
+            click.echo(error, err=True)
+        click.echo(f"{result['tickets']} chamados, {result['comments']} comentários e {result['history']} "
+                   f"registros de histórico importados em {result['seconds']}s ({result['error_count']} linha(s) com erro).")
+
+    @app.cli.command('archive-tickets')
+    @click.option('--days', type=int, help='Idade mínima (padrão: ARCHIVE_AFTER_DAYS).')
+    @click.option('--batch-size', default=None, type=int, help='Chamados por transação (padrão: ARCHIVE_BATCH_SIZE).')
+    def archive_tickets(days, batch_size):
+        """Move os chamados fechados antigos (com comentários e histórico) para o arquivo morto."""
+        from app import archive
+        try:
+            moved, seconds = archive.archive_closed_tickets(days, batch_size or app.config['ARCHIVE_BATCH_SIZE'])
+        except archive.ArchiveError as e:
+            db.session.rollback()
+            raise click.ClickException(str(e))
+        click.echo(f'{moved} chamado(s) movido(s) para {archive.archive_path()} em {seconds:.2f}s.')
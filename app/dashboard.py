@@ -0,0 +1,52 @@
+"""
+Métricas do dashboard (chamados por status, setor e prioridade).
+
+Os três gráficos e o total saem de uma única consulta agrupada pelas três
+colunas (somada aos totais do arquivo morto, ver app/archive.py), guardada
+em cache por DASHBOARD_CACHE_SECONDS. As rotas que criam chamados ou mudam
+status, setor ou prioridade chamam invalidate() após o commit, então o
+próprio processo nunca mostra números velhos; nos demais processos a
+defasagem máxima é o TTL.
+"""
+from collections import Counter
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.cache import TTLCache
+from app.models import Ticket, ArchivedTicketStats
+
+METRICS_KEY = 'dashboard_metrics'
+
+metrics_cache = TTLCache(max_entries=8)
+
+
+def compute_metrics():
+    live = db.session.query(
+        Ticket.status, Ticket.target_sector, Ticket.priority, func.count(Ticket.id)
+    ).group_by(Ticket.status, Ticket.target_sector, Ticket.priority)
+    # Chamados do arquivo morto entram pelos totais já agregados, sem abrir o arquivo
+    archived = db.session.query(
+        ArchivedTicketStats.status, ArchivedTicketStats.target_sector, ArchivedTicketStats.priority,
+        ArchivedTicketStats.ticket_count
+    )
+    rows = live.union_all(archived).all()
+
+    by_status, by_sector, by_priority = Counter(), Counter(), Counter()
+    for status, sector, priority, count in rows:
+        by_status[status] += count
+        by_sector[sector] += count
+        by_priority[priority] += count
+    return {
+        'status_data': [{'status': s, 'count': c} for s, c in by_status.items()],
+        'sector_data': [{'sector': s, 'count': c} for s, c in by_sector.items()],
+        'priority_data': [{'priority': p, 'count': c} for p, c in by_priority.items()],
+        'total_tickets': sum(by_status.values()),
+    }
+
+
+def get_metrics():
+    return metrics_cache.get_or_set(METRICS_KEY, compute_metrics, ttl=current_app.config['DASHBOARD_CACHE_SECONDS'])
+
+
+def invalidate():
+    metrics_cache.invalidate(METRICS_KEY)
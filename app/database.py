@@ -0,0 +1,158 @@
+"""
+Ajustes do SQLite para produção, aplicados a cada nova conexão do pool.
+
+- journal_mode=WAL: leitores não esperam por quem está escrevendo (e vice-versa);
+- synchronous=NORMAL: seguro com WAL e bem mais barato que FULL a cada commit;
+- busy_timeout: em vez de "database is locked" imediato, espera o outro escritor;
+- mmap_size e cache_size: leituras servidas da memória.
+
+Todos os valores vêm da configuração (variáveis SQLITE_* do ambiente).
+"flask db-stress" compara, num banco temporário, leitores concorrendo com
+escritores com e sem esses ajustes.
+"""
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from app import db
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and (url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+
+def engine_options(config):
+    """
+    Opções do create_engine: as do pool (DB_POOL_*) e as de SQLALCHEMY_ENGINE_OPTIONS.
+    O SQLite em memória usa StaticPool, que não aceita pool_size, max_overflow nem pool_timeout.
+    """
+    options = {'pool_recycle': config['DB_POOL_RECYCLE']}
+    if not is_memory_database(config['SQLALCHEMY_DATABASE_URI']):
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'])
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+
+def sqlite_pragmas(config):
+    """Lista de (pragma, valor) a aplicar, a partir da configuração."""
+    pragmas = [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']), # Negativo = tamanho em KiB
+    ]
+    if config['SQLITE_MMAP_SIZE_MB']:
+        pragmas.append(('mmap_size', config['SQLITE_MMAP_SIZE_MB'] * 1024 * 1024))
+    return pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def init_database(app):
+    """Registra os PRAGMAs no engine da aplicação (só para SQLite)."""
+    engine = db.engine
+    if engine.url.get_backend_name() != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def stress_test(pragmas, readers=8, writers=2, seconds=5.0, write_hold=0.05):
+    """
+    Em um banco temporário, roda leitores (a consulta de notificações não lidas)
+    concorrendo com escritores que seguram a transação por write_hold segundos.
+    Retorna latências de leitura (ms), número de leituras e escritas e erros de bloqueio.
+    """
+    workdir = tempfile.mkdtemp(prefix='db-stress-')
+    path = os.path.join(workdir, 'stress.db')
+
+    def connect():
+        # timeout=0: a espera por lock fica só a cargo do PRAGMA busy_timeout (se houver)
+        conn = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+        apply_pragmas(conn, pragmas)
+        return conn
+
+    setup = connect()
+    setup.execute('CREATE TABLE notification (id INTEGER PRIMARY KEY, user_id INTEGER, is_read BOOLEAN, message TEXT)')
+    setup.execute('CREATE INDEX ix_notification_user_unread ON notification (user_id, is_read, id)')
+    setup.executemany('INSERT INTO notification (user_id, is_read, message) VALUES (?, 0, ?)',
+                      [(i % 50, f'mensagem {i}') for i in range(20000)])
+    setup.close()
+
+    stats = {'read_latencies': [], 'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def reader(n):
+        conn = connect()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.execute('SELECT id, message FROM notification WHERE user_id = ? AND is_read = 0 AND id > ? '
+                             'ORDER BY id LIMIT 50', (n % 50, 0)).fetchall()
+                with lock:
+                    stats['read_latencies'].append((time.perf_counter() - started) * 1000)
+                    stats['reads'] += 1
+            except sqlite3.OperationalError:
+                with lock:
+                    stats['read_errors'] += 1
+        conn.close()
+
+    def writer(n):
+        conn = connect()
+        while time.monotonic() < deadline:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute('UPDATE notification SET is_read = 1 - is_read WHERE user_id = ?', (n % 50,))
+                time.sleep(write_hold)
+                conn.execute('COMMIT')
+                with lock:
+                    stats['writes'] += 1
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                with lock:
+                    stats['write_errors'] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for filename in os.listdir(workdir):
+        os.remove(os.path.join(workdir, filename))
+    os.rmdir(workdir)
+
+    latencies = stats.pop('read_latencies')
+    stats.update({
+        'read_p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'read_p99_ms': _percentile(latencies, 0.99),
+        'read_max_ms': max(latencies, default=0.0),
+    })
+    return stats
@@ -0,0 +1,72 @@
+import json
+import queue
+import threading
+
+
+def format_sse(event, data):
+    """Formata um evento no protocolo text/event-stream (Server-Sent Events)."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventBus:
+    """
+    Barramento publish/subscribe em memória do processo.
+    Cada conexão SSE assina com o ID do usuário e recebe apenas os eventos
+    endereçados a ele. Um cliente lento nunca bloqueia quem publica: se a fila
+    dele estiver cheia o evento é descartado e o polling cobre a diferença.
+    Vale só dentro de um processo: com vários workers, um evento publicado em
+    um deles não chega aos streams abertos nos outros. O navegador compensa
+    consultando /check_updates (pelo cursor) a cada abertura do stream e, com
+    ele aberto, em um ritmo lento (ver static/js/script.js).
+    """
+
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id, limit=None):
+        """Nova assinatura do usuário, ou None se o processo já tiver limit conexões abertas."""
+        with self._lock:
+            if limit and self._count >= limit:
+                return None
+            subscription = queue.Queue(maxsize=self.max_queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            self._count -= 1
+            if not subscriptions:
+                del self._subscribers[user_id]
+
+    def __len__(self):
+        return self._count
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def is_subscribed(self, user_id):
+        return user_id in self._subscribers
+
+    def publish(self, user_ids, event, data):
+        """Entrega o evento para todas as conexões abertas dos usuários informados."""
+        message = format_sse(event, data)
+        with self._lock:
+            targets = [q for uid in set(user_ids) for q in self._subscribers.get(uid, ())]
+        for subscription in targets:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                pass
+        return len(targets)
+
+
+# Instância global, compartilhada pelas rotas do processo
+event_bus = EventBus()
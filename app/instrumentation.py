@@ -0,0 +1,263 @@
+"""
+Instrumentação das requisições: contagem de consultas SQL por requisição,
+orçamento de consultas (query budget) por rota e métricas de desempenho.
+
+Cada resposta leva o cabeçalho X-Query-Count. Uma rota pode declarar seu
+orçamento com @query_budget(n); as demais usam QUERY_BUDGET da configuração.
+Estourar o orçamento gera um aviso no log, ou um erro se QUERY_BUDGET_STRICT
+estiver ligado (útil em testes e benchmarks). Respostas em streaming consultam
+o banco enquanto o corpo é gerado, depois dos cabeçalhos: ficam sem
+X-Query-Count e o orçamento é conferido quando a resposta é fechada.
+
+Com METRICS_ENABLED, o processo também acumula, em memória:
+- histograma da latência por rota (endpoint + método) e contagem por status;
+- consultas SQL e tempo gasto no banco por rota (eventos do engine);
+- tempo de renderização de cada template (sinais do Flask);
+- consultas acima de SLOW_QUERY_MS, que também vão para o log.
+A rota /metrics expõe tudo no formato texto do Prometheus. Os valores são do
+processo: com vários workers, cada um responde pelos seus. O custo por
+requisição é algumas chamadas a perf_counter e atualizações de dicionário
+sob um lock.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, has_app_context, request, current_app, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Define o número máximo de consultas SQL de uma rota (use logo acima do def)."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+_local = threading.local()
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def count_queries():
+    """
+    Conta as consultas executadas dentro do bloco, na thread atual.
+        with count_queries() as counter:
+            client.get('/tickets_kanban')
+        assert counter['count'] <= 10
+    """
+    counter = {'count': 0, 'statements': []}
+    stack = _local.__dict__.setdefault('counters', [])
+    stack.append(counter)
+    try:
+        yield counter
+    finally:
+        stack.remove(counter)
+
+
+# --- MÉTRICAS (formato Prometheus) ---
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'chamados_http_request_duration_seconds': ('histogram', 'Tempo de resposta por rota.'),
+    'chamados_http_requests_total': ('counter', 'Requisições por rota e status.'),
+    'chamados_sql_queries_total': ('counter', 'Consultas SQL executadas, por rota.'),
+    'chamados_sql_query_duration_seconds': ('histogram', 'Duração de cada consulta SQL, por rota.'),
+    'chamados_sql_slow_queries_total': ('counter', 'Consultas SQL acima de SLOW_QUERY_MS, por rota.'),
+    'chamados_template_render_duration_seconds': ('histogram', 'Tempo de renderização por template.'),
+}
+
+
+class MetricsRegistry:
+    """Contadores e histogramas em memória, identificados por (nome, rótulos)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+
+        lines = ['# HELP chamados_process_start_time_seconds Início do processo (epoch).',
+                 '# TYPE chamados_process_start_time_seconds gauge',
+                 f'chamados_process_start_time_seconds {self.started_at:.3f}']
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value}')
+                continue
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", repr(bound)),))} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total:.6f}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+_settings = {'enabled': False, 'slow_query_seconds': None}
+
+
+def _endpoint():
+    return (request.endpoint or 'desconhecido') if has_request_context() else 'fora_de_requisicao'
+
+
+# --- EVENTOS DO ENGINE (todas as conexões SQLAlchemy) ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    for counter in getattr(_local, 'counters', ()):
+        counter['count'] += 1
+        counter['statements'].append(statement)
+    if _settings['enabled']:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _time_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not _settings['enabled'] or not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    endpoint = _endpoint()
+    labels = (('endpoint', endpoint),)
+    registry.inc('chamados_sql_queries_total', labels)
+    registry.observe('chamados_sql_query_duration_seconds', labels, elapsed)
+    if has_request_context():
+        g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+    threshold = _settings['slow_query_seconds']
+    if threshold is not None and elapsed >= threshold:
+        registry.inc('chamados_sql_slow_queries_total', labels)
+        message = f'Consulta lenta ({elapsed * 1000:.1f} ms) em {endpoint}: {" ".join(statement.split())[:500]}'
+        (current_app.logger if has_app_context() else logger).warning(message)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_failed_query(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# --- SINAIS DE TEMPLATE ---
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    started = g.get('template_started')
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        registry.observe('chamados_template_render_duration_seconds',
+                         (('template', template.name or 'desconhecido'),), elapsed)
+
+
+def init_instrumentation(app):
+    _settings['enabled'] = app.config['METRICS_ENABLED']
+    slow_ms = app.config['SLOW_QUERY_MS']
+    _settings['slow_query_seconds'] = slow_ms / 1000 if slow_ms else None
+
+    if _settings['enabled']:
+        before_render_template.connect(_template_started, app)
+        template_rendered.connect(_template_finished, app)
+
+        @app.before_request
+        def start_timer():
+            g.request_started = time.perf_counter()
+
+    def enforce_budget(endpoint, count, budget):
+        # Sem current_app: também roda no fechamento de respostas em streaming, fora do contexto
+        if budget is not None and count > budget:
+            message = f'{endpoint} executou {count} consultas SQL (orçamento: {budget}).'
+            if app.config['QUERY_BUDGET_STRICT']:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+
+    @app.after_request
+    def check_query_budget(response):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', current_app.config['QUERY_BUDGET'])
+        endpoint = request.endpoint
+        if response.is_streamed and not response.direct_passthrough:
+            # Corpo gerado depois daqui (stream_with_context, com o mesmo g): a contagem só fica completa no fim.
+            # Arquivos (send_file) são direct_passthrough e já fizeram as suas consultas.
+            request_g = g._get_current_object()
+            response.call_on_close(lambda: enforce_budget(endpoint, request_g.get('query_count', 0), budget))
+            return response
+        count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(count)
+        enforce_budget(endpoint, count, budget)
+        return response
+
+    if _settings['enabled']:
+        @app.after_request
+        def record_request(response):
+            started = g.get('request_started')
+            if started is None:
+                return response
+            elapsed = time.perf_counter() - started
+            endpoint = request.endpoint or 'desconhecido'
+            registry.observe('chamados_http_request_duration_seconds',
+                             (('endpoint', endpoint), ('method', request.method)), elapsed)
+            registry.inc('chamados_http_requests_total',
+                         (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+            # Mesmos números no DevTools do navegador (aba Network > Timing)
+            response.headers['Server-Timing'] = f'db;dur={g.get("sql_seconds", 0.0) * 1000:.1f}, app;dur={elapsed * 1000:.1f}'
+            return response
@@ -0,0 +1,328 @@
+"""
+Migrações versionadas do esquema do banco de dados.
+
+O db.create_all() cria tabelas que ainda não existem, mas nunca altera as
+existentes (índices, colunas, tabelas auxiliares). Cada migração abaixo tem um
+número de versão e é aplicada uma única vez, em ordem, registrando-se na
+tabela schema_version. Para criar uma nova migração basta decorar uma função
+com @migration(<próxima versão>, '<descrição>'). A subida só chama o
+create_all quando o banco está atrás da última versão (app/bootstrap.py):
+tabelas e modelos novos precisam vir acompanhados de uma migração.
+
+Uma migração descreve o esquema na sua versão: o SQL que ela precisa fica
+escrito nela, em vez de vir dos modelos ou dos módulos da aplicação, que
+continuam mudando depois dela.
+"""
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime
+from sqlalchemy import text, or_, and_, not_
+
+MIGRATIONS = []
+logger = logging.getLogger(__name__)
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR(255) NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(engine):
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(engine):
+    """
+    Aplica as migrações pendentes e retorna a lista das que foram aplicadas.
+    O registro da versão é gravado antes da migração, na mesma transação: se
+    vários processos sobem ao mesmo tempo, só o primeiro executa cada migração.
+    """
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            _ensure_version_table(conn)
+            result = conn.execute(
+                text("INSERT OR IGNORE INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.utcnow()}
+            )
+            if result.rowcount == 0:
+                continue
+            fn(conn)
+            applied.append((version, description))
+    return applied
+
+
+def _execute_all(conn, statements):
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _archive_rows(sql):
+    """
+    Linhas de uma consulta ao arquivo morto (ver app/archive.py), aberto à parte e só
+    para leitura: o SQLite não aceita ATTACH dentro da transação da migração. Vazio se
+    o arquivo, ou a tabela consultada, ainda não existir.
+    """
+    from app import archive
+    path = archive.archive_path() # Só a localização do arquivo, que vem da configuração
+    if path is None or not os.path.exists(path):
+        return []
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        return conn.execute(sql).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+# --- MIGRAÇÕES ---
+
+@migration(1, 'Índices compostos para visibilidade de chamados, chat e verificação de atualizações')
+def add_hot_query_indexes(conn):
+    _execute_all(conn, [
+        # Filtros de visibilidade da home e do kanban (cada ramo do OR tem seu índice)
+        "CREATE INDEX IF NOT EXISTS ix_ticket_status_created_at ON ticket (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_target_sector_status ON ticket (target_sector, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_origin_sector_status ON ticket (origin_sector, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_assigned_to_status ON ticket (assigned_to, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_user_id_status ON ticket (user_id, status, created_at)",
+        # Janelas de tempo do /check_updates
+        "CREATE INDEX IF NOT EXISTS ix_ticket_created_at ON ticket (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_comment_created_at ON comment (created_at)",
+        # Comentários e histórico de um chamado
+        "CREATE INDEX IF NOT EXISTS ix_comment_ticket_id_created_at ON comment (ticket_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_history_ticket_id_timestamp ON ticket_history (ticket_id, timestamp)",
+        # Conversas do chat (par remetente/destinatário) e mensagens não lidas
+        "CREATE INDEX IF NOT EXISTS ix_chat_message_pair ON chat_message (sender_id, recipient_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_message_unread ON chat_message (recipient_id, is_read, sender_id)",
+        # Destinatários das notificações (técnicos do setor e administradores)
+        "CREATE INDEX IF NOT EXISTS ix_user_access_level_sector ON user (access_level, sector)",
+        "ANALYZE",
+    ])
+
+
+@migration(2, 'Resumo das conversas do chat (última mensagem e não lidas por par de usuários)')
+def add_chat_conversation_summary(conn):
+    from app.models import ChatConversation
+    ChatConversation.__table__.create(conn, checkfirst=True)
+    # Preenche o resumo a partir do histórico existente, em uma única instrução
+    from app.chat import rebuild_conversations
+    rebuild_conversations(conn)
+
+
+@migration(3, 'Índice das notificações não lidas por usuário')
+def add_notification_index(conn):
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_notification_user_unread ON notification (user_id, is_read, id)",
+    ])
+
+
+@migration(4, 'Índice de busca textual (FTS5) de chamados e comentários')
+def add_ticket_search_index(conn):
+    from app import search
+    if not search.fts5_supported(conn):
+        logger.warning('SQLite sem suporte a FTS5: a busca continuará usando LIKE.')
+        return
+    search.create_index(conn)
+    search.rebuild_index(conn)
+
+
+@migration(5, 'Índice das colunas do kanban (status + ordem do quadro)')
+def add_kanban_column_index(conn):
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_ticket_status_priority ON ticket (status, priority, created_at, id)",
+    ])
+
+
+@migration(6, 'Agregado diário de fechamentos para os relatórios')
+def add_report_rollup(conn):
+    from app.models import TicketDailyStats, ReportRollupState
+    TicketDailyStats.__table__.create(conn, checkfirst=True)
+    ReportRollupState.__table__.create(conn, checkfirst=True)
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_ticket_history_field_value_timestamp ON ticket_history (field_changed, new_value, timestamp)",
+    ])
+
+
+@migration(7, 'Índice dos chamados parados por status (fechamento automático)')
+def add_status_updated_at_index(conn):
+    _execute_all(conn, [
+        "CREATE INDEX IF NOT EXISTS ix_ticket_status_updated_at ON ticket (status, updated_at)",
+    ])
+
+
+@migration(8, 'Totais dos chamados do arquivo morto para o dashboard')
+def add_archived_ticket_stats(conn):
+    from app.models import ArchivedTicketStats
+    ArchivedTicketStats.__table__.create(conn, checkfirst=True)
+
+
+
+@migration(9, 'Chamados com AUTOINCREMENT (IDs de chamados arquivados nunca são reaproveitados)')
+def add_ticket_autoincrement(conn):
+    """
+    Sem AUTOINCREMENT o SQLite dá ao chamado novo o maior ID da tabela + 1: ao
+    mover os últimos chamados para o arquivo morto, os IDs deles voltariam a ser
+    usados. O SQLite não altera a chave de uma tabela existente, então a tabela
+    é recriada (com os mesmos índices e triggers) e a sequência começa acima do
+    maior ID já arquivado.
+    """
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'ticket'")).scalar()
+    if 'AUTOINCREMENT' not in ddl.upper():
+        dependents = conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = 'ticket' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+        )).scalars().all()
+        conn.execute(text(
+            "CREATE TABLE ticket_new ("
+            "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+            "title VARCHAR(150) NOT NULL, "
+            "description TEXT NOT NULL, "
+            "user_id INTEGER NOT NULL, "
+            "origin_sector VARCHAR(50) NOT NULL, "
+            "target_sector VARCHAR(50) NOT NULL, "
+            "priority VARCHAR(20) NOT NULL, "
+            "status VARCHAR(20) NOT NULL, "
+            "created_at DATETIME, "
+            "updated_at DATETIME, "
+            "closed_at DATETIME, "
+            "attachment_filename VARCHAR(100), "
+            "assigned_to INTEGER, "
+            "FOREIGN KEY(user_id) REFERENCES user (id), "
+            "FOREIGN KEY(assigned_to) REFERENCES user (id))"
+        ))
+        existing = {row[1] for row in conn.execute(text("PRAGMA table_info(ticket)"))}
+        columns = ', '.join(row[1] for row in conn.execute(text("PRAGMA table_info(ticket_new)")) if row[1] in existing)
+        _execute_all(conn, [
+            f"INSERT INTO ticket_new ({columns}) SELECT {columns} FROM ticket ORDER BY id",
+            "DROP TABLE ticket",
+            "ALTER TABLE ticket_new RENAME TO ticket",
+        ])
+        _execute_all(conn, dependents)
+    archived_max_id = (_archive_rows("SELECT COALESCE(MAX(id), 0) FROM ticket") or [(0,)])[0][0]
+    if archived_max_id:
+        params = {'max_id': archived_max_id}
+        conn.execute(text("UPDATE sqlite_sequence SET seq = :max_id WHERE name = 'ticket' AND seq < :max_id"), params)
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT 'ticket', :max_id "
+                          "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'ticket')"), params)
+
+
+@migration(10, 'Fechamentos contados por chamado (reabertos deixam de contar nos relatórios)')
+def add_ticket_closing(conn):
+    """
+    O agregado diário somava cada mudança de status para 'Fechado': um chamado
+    fechado duas vezes contava duas, e um reaberto continuava contando. Ele é
+    refeito a partir dos chamados atualmente fechados (ativos e arquivados),
+    como os relatórios calculavam antes do agregado.
+    """
+    # Fechamento de cada chamado: a mesma consulta nas tabelas ativa e arquivada
+    closings = ("SELECT id, closed_at, target_sector, COALESCE(assigned_to, 0), "
+                "(julianday(closed_at) - julianday(created_at)) * 86400 FROM ticket "
+                "WHERE status = 'Fechado' AND closed_at IS NOT NULL")
+    _execute_all(conn, [
+        "CREATE TABLE IF NOT EXISTS ticket_closing ("
+        "ticket_id INTEGER NOT NULL, "
+        "closed_at DATETIME NOT NULL, "
+        "target_sector VARCHAR(50) NOT NULL, "
+        "assigned_to INTEGER NOT NULL, "
+        "close_seconds FLOAT NOT NULL, "
+        "PRIMARY KEY (ticket_id))",
+        "CREATE INDEX IF NOT EXISTS ix_ticket_closing_closed_at ON ticket_closing (closed_at)",
+        "DELETE FROM ticket_closing",
+        f"INSERT INTO ticket_closing (ticket_id, closed_at, target_sector, assigned_to, close_seconds) {closings}",
+    ])
+    keys = ('ticket_id', 'closed_at', 'target_sector', 'assigned_to', 'close_seconds')
+    archived = [dict(zip(keys, row)) for row in _archive_rows(closings)]
+    if archived:
+        conn.execute(text(
+            "INSERT OR IGNORE INTO ticket_closing (ticket_id, closed_at, target_sector, assigned_to, close_seconds) "
+            "VALUES (:ticket_id, :closed_at, :target_sector, :assigned_to, :close_seconds)"
+        ), archived)
+    _execute_all(conn, [
+        "DELETE FROM ticket_daily_stats",
+        "INSERT INTO ticket_daily_stats (day, target_sector, assigned_to, closed_count, total_close_seconds) "
+        "SELECT date(closed_at), target_sector, assigned_to, COUNT(*), SUM(close_seconds) "
+        "FROM ticket_closing GROUP BY date(closed_at), target_sector, assigned_to",
+        "INSERT OR REPLACE INTO report_rollup_state (name, last_history_id) "
+        "SELECT 'ticket_daily_stats', COALESCE(MAX(id), 0) FROM ticket_history",
+    ])
+
+
+# --- VERIFICAÇÃO DOS PLANOS DE EXECUÇÃO ---
+
+def hot_queries():
+    """Consultas representativas das rotas mais acessadas, no mesmo formato usado em routes.py."""
+    from app.models import User, Ticket, Comment, ChatMessage, ChatConversation, Notification
+    closed = ['Resolvido', 'Fechado']
+    visibility = or_(Ticket.target_sector == 'TI', Ticket.origin_sector == 'TI', Ticket.assigned_to == 1)
+    now = datetime.utcnow()
+    return {
+        'home (técnico)': Ticket.query.filter(visibility).filter(not_(Ticket.status.in_(closed))).order_by(Ticket.created_at.desc()),
+        'home (colaborador)': Ticket.query.filter_by(user_id=1).filter(not_(Ticket.status.in_(closed))).order_by(Ticket.created_at.desc()),
+        'kanban (técnico)': Ticket.query.filter(visibility).order_by(Ticket.priority.desc(), Ticket.created_at.asc()),
+        'coluna do kanban (administrador)': Ticket.query.filter(Ticket.status == 'Aberto').order_by(
+            Ticket.priority.desc(), Ticket.created_at.asc(), Ticket.id.asc()
+        ).limit(26),
+        'kanban (colaborador)': Ticket.query.filter_by(user_id=1).order_by(Ticket.priority.desc(), Ticket.created_at.asc()),
+        'chamados recentes': Ticket.query.filter(Ticket.created_at > now),
+        'fechamento automático': Ticket.query.with_entities(Ticket.id).filter(
+            Ticket.status == 'Resolvido', Ticket.updated_at < now
+        ).limit(500),
+        'comentários recentes': Comment.query.filter(Comment.created_at > now, Comment.user_id != 1),
+        'comentários do chamado': Comment.query.filter_by(ticket_id=1).order_by(Comment.created_at),
+        'chat (mensagens da conversa)': ChatMessage.query.filter(or_(
+            and_(ChatMessage.sender_id == 1, ChatMessage.recipient_id == 2),
+            and_(ChatMessage.sender_id == 2, ChatMessage.recipient_id == 1)
+        )).filter(ChatMessage.id > 0).order_by(ChatMessage.id.asc()),
+        'chat (não lidas)': ChatMessage.query.with_entities(ChatMessage.sender_id).filter(
+            ChatMessage.recipient_id == 1, ChatMessage.is_read == False
+        ).distinct(),
+        'chat (remetentes com não lidas)': ChatConversation.query.with_entities(
+            ChatConversation.partner_id, ChatConversation.unread_count
+        ).filter(ChatConversation.user_id == 1, ChatConversation.unread_count > 0),
+        'lista de conversas do chat': ChatConversation.query.filter_by(user_id=1).order_by(ChatConversation.last_message_at.desc()),
+        'notificações não lidas': Notification.query.filter(
+            Notification.user_id == 1, Notification.is_read == False, Notification.id > 0
+        ).order_by(Notification.id.asc()),
+        'destinatários de notificação': User.query.with_entities(User.id).filter(or_(
+            and_(User.access_level == 'tecnico', User.sector == 'TI'),
+            User.access_level == 'administrador'
+        )),
+    }
+
+
+_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+def explain_hot_queries(engine, queries=None):
+    """
+    Roda EXPLAIN QUERY PLAN em cada consulta e indica se ela usa índices.
+    Retorna uma lista de (nome, linhas do plano, usa_indice).
+    """
+    queries = queries if queries is not None else hot_queries()
+    results = []
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            compiled = query.statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+            params = tuple(None for _ in compiled.positiontup or ())
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+            plan = [row[-1] for row in rows]
+            uses_index = not any(_FULL_SCAN.match(step) for step in plan)
+            results.append((name, plan, uses_index))
+    return results
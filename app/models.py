@@ -16,6 +16,10 @@ class User(db.Model, UserMixin):
     tickets_assigned = db.relationship('Ticket', backref='assignee_user', lazy=True, foreign_keys='Ticket.assigned_to')
     comments = db.relationship('Comment', backref='comment_author', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_user_access_level_sector', 'access_level', 'sector'),
+    )
+
     def __repr__(self):
         return f"User('{self.name}', '{self.email}', '{self.sector}')"
 
@@ -39,6 +43,20 @@ class Ticket(db.Model):
     comments = db.relationship('Comment', backref='ticket', lazy=True, cascade="all, delete-orphan")
     history = db.relationship('TicketHistory', backref='ticket', lazy=True, cascade="all, delete-orphan")
 
+    # Índices dos filtros de visibilidade e das janelas de tempo (ver app/migrations.py)
+    __table_args__ = (
+        db.Index('ix_ticket_status_created_at', 'status', 'created_at'),
+        db.Index('ix_ticket_target_sector_status', 'target_sector', 'status', 'created_at'),
+        db.Index('ix_ticket_origin_sector_status', 'origin_sector', 'status', 'created_at'),
+        db.Index('ix_ticket_assigned_to_status', 'assigned_to', 'status', 'created_at'),
+        db.Index('ix_ticket_user_id_status', 'user_id', 'status', 'created_at'),
+        db.Index('ix_ticket_created_at', 'created_at'),
+        db.Index('ix_ticket_status_priority', 'status', 'priority', 'created_at', 'id'),
+        db.Index('ix_ticket_status_updated_at', 'status', 'updated_at'),
+        # IDs nunca reaproveitados: os chamados movidos para o arquivo morto continuam com o seu (migração 9)
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f"Ticket('{self.title}', '{self.status}', '{self.priority}')"
 
@@ -50,6 +68,11 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     attachment_filename = db.Column(db.String(100), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_comment_created_at', 'created_at'),
+        db.Index('ix_comment_ticket_id_created_at', 'ticket_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f"Comment('{self.content[:20]}...', 'Ticket ID: {self.ticket_id}')"
 
@@ -64,6 +87,11 @@ class TicketHistory(db.Model):
 
     changed_by = db.relationship('User', backref='history_changes', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_ticket_history_ticket_id_timestamp', 'ticket_id', 'timestamp'),
+        db.Index('ix_ticket_history_field_value_timestamp', 'field_changed', 'new_value', 'timestamp'),
+    )
+
     def __repr__(self):
         return f"TicketHistory(Ticket:{self.ticket_id}, Field:{self.field_changed}, Old:{self.old_value}, New:{self.new_value})"
 
@@ -78,6 +106,10 @@ class Notification(db.Model):
     user = db.relationship('User', backref='notifications')
     ticket_link = db.relationship('Ticket', backref='related_notifications')
 
+    __table_args__ = (
+        db.Index('ix_notification_user_unread', 'user_id', 'is_read', 'id'),
+    )
+
     def __repr__(self):
         return f"Notification('{self.message}', User: {self.user_id}, Read: {self.is_read})"
 
@@ -95,9 +127,77 @@ class ChatMessage(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='received_messages')
 
+    __table_args__ = (
+        db.Index('ix_chat_message_pair', 'sender_id', 'recipient_id', 'id'),
+        db.Index('ix_chat_message_unread', 'recipient_id', 'is_read', 'sender_id'),
+    )
+
     def __repr__(self):
         return f'<ChatMessage {self.sender_id} to {self.recipient_id}>'
 
+class ChatConversation(db.Model):
+    """
+    Resumo desnormalizado de uma conversa do chat, do ponto de vista de um participante
+    (uma linha por par usuário/parceiro). Atualizado a cada mensagem enviada (ver app/chat.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    partner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('chat_message.id'), nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+
+    partner = db.relationship('User', foreign_keys=[partner_id])
+    last_message = db.relationship('ChatMessage')
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'partner_id', name='uq_chat_conversation_pair'),
+        db.Index('ix_chat_conversation_user_last', 'user_id', 'last_message_at'),
+    )
+
+    def __repr__(self):
+        return f'<ChatConversation {self.user_id} with {self.partner_id}, unread: {self.unread_count}>'
+
+class TicketDailyStats(db.Model):
+    """
+    Agregado diário dos fechamentos de chamados (por setor de destino e atendente),
+    preenchido de forma incremental a partir do TicketHistory (ver app/reports.py).
+    """
+    day = db.Column(db.Date, primary_key=True)
+    target_sector = db.Column(db.String(50), primary_key=True)
+    assigned_to = db.Column(db.Integer, primary_key=True, default=0) # 0 = sem atendente
+    closed_count = db.Column(db.Integer, nullable=False, default=0)
+    total_close_seconds = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TicketDailyStats {self.day} {self.target_sector}: {self.closed_count}>'
+
+class TicketClosing(db.Model):
+    """
+    Fechamento contado em TicketDailyStats para cada chamado atualmente 'Fechado' (ativo ou
+    arquivado). Guarda o que foi somado para descontar se o chamado for reaberto ou reatribuído.
+    """
+    ticket_id = db.Column(db.Integer, primary_key=True) # sem FK: o chamado pode ir para o arquivo morto
+    closed_at = db.Column(db.DateTime, nullable=False, index=True)
+    target_sector = db.Column(db.String(50), nullable=False)
+    assigned_to = db.Column(db.Integer, nullable=False, default=0) # 0 = sem atendente
+    close_seconds = db.Column(db.Float, nullable=False, default=0)
+
+class ReportRollupState(db.Model):
+    """Marca d'água do último TicketHistory já consolidado em cada agregado."""
+    name = db.Column(db.String(50), primary_key=True)
+    last_history_id = db.Column(db.Integer, nullable=False, default=0)
+
+class ArchivedTicketStats(db.Model):
+    """
+    Totais dos chamados movidos para o arquivo morto, por status, setor de destino e prioridade.
+    Somados às métricas do dashboard sem abrir o arquivo (ver app/archive.py).
+    """
+    status = db.Column(db.String(20), primary_key=True)
+    target_sector = db.Column(db.String(50), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    ticket_count = db.Column(db.Integer, nullable=False, default=0)
+
 class SystemSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     auto_close_days = db.Column(db.Integer, default=7)
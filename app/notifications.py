@@ -0,0 +1,94 @@
+"""
+Notificações de chamados, distribuídas no momento do evento (fan-out na escrita).
+
+Quando um chamado é aberto, comentado ou muda de status, uma linha de
+Notification é inserida para cada destinatário, em uma única instrução.
+O /check_updates e o stream SSE apenas leem "notificações não lidas deste
+usuário após o cursor", sem recalcular quem deveria ser avisado.
+"""
+from datetime import datetime
+from flask import url_for
+from sqlalchemy import insert, select, literal, or_, and_, false
+from app import db
+from app.events import event_bus
+from app.models import User, Notification
+
+_RETURNING = (Notification.id, Notification.user_id, Notification.ticket_id, Notification.message)
+
+
+def notify_new_ticket(ticket, author_name):
+    """Avisa os técnicos do setor de destino e todos os administradores (exceto o autor)."""
+    message = f"Novo chamado #{ticket.id}: '{ticket.title}' aberto por {author_name}."
+    recipients = select(
+        User.id, literal(ticket.id), literal(message), false(), literal(datetime.utcnow())
+    ).where(
+        or_(and_(User.access_level == 'tecnico', User.sector == ticket.target_sector),
+            User.access_level == 'administrador'),
+        User.id != ticket.user_id,
+        User.is_active == True
+    )
+    stmt = insert(Notification).from_select(
+        ['user_id', 'ticket_id', 'message', 'is_read', 'created_at'], recipients
+    ).returning(*_RETURNING)
+    return db.session.execute(stmt).all()
+
+
+def notify_users(user_ids, ticket_id, message):
+    """Avisa uma lista explícita de usuários sobre um chamado."""
+    return notify_many([(user_ids, ticket_id, message)])
+
+
+def notify_many(entries):
+    """Avisos de vários chamados, [(destinatários, ticket_id, mensagem), ...], em uma única instrução."""
+    now = datetime.utcnow()
+    rows = [{'user_id': uid, 'ticket_id': ticket_id, 'message': message, 'is_read': False, 'created_at': now}
+            for user_ids, ticket_id, message in entries for uid in user_ids if uid is not None]
+    if not rows:
+        return []
+    return db.session.execute(insert(Notification).values(rows).returning(*_RETURNING)).all()
+
+
+def notify_ticket_participants(ticket, message, changed_by_id):
+    """Avisa o autor e o responsável pelo chamado, exceto quem fez a alteração."""
+    return notify_users({ticket.user_id, ticket.assigned_to} - {changed_by_id}, ticket.id, message)
+
+
+def serialize(notification_id, ticket_id, message):
+    return {'id': notification_id, 'message': message, 'url': url_for('main.view_ticket', ticket_id=ticket_id)}
+
+
+def publish(created):
+    """Envia pelo stream SSE as notificações recém-gravadas (chamar depois do commit)."""
+    for notification_id, user_id, ticket_id, message in created:
+        event_bus.publish([user_id], 'ticket', serialize(notification_id, ticket_id, message))
+
+
+def unread_since(user_id, cursor, limit=50):
+    return Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False,
+        Notification.id > cursor
+    ).order_by(Notification.id.asc()).limit(limit).all()
+
+
+def unread_version(user_id, cursor):
+    """(quantidade, maior ID) das não lidas após o cursor: muda sempre que o resultado de unread_since mudaria."""
+    return db.session.query(db.func.count(Notification.id), db.func.max(Notification.id)).filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False,
+        Notification.id > cursor
+    ).one()
+
+
+def latest_id(user_id):
+    return db.session.query(db.func.max(Notification.id)).filter(Notification.user_id == user_id).scalar() or 0
+
+
+def mark_read(user_id, up_to=None, ids=None):
+    """Marca em lote as notificações do usuário como lidas, com um único UPDATE."""
+    query = Notification.query.filter(Notification.user_id == user_id, Notification.is_read == False)
+    if ids is not None:
+        query = query.filter(Notification.id.in_(ids))
+    if up_to is not None:
+        query = query.filter(Notification.id <= up_to)
+    return query.update({'is_read': True}, synchronize_session=False)
@@ -0,0 +1,176 @@
+"""
+Métricas de tempo de fechamento para a página de relatórios, calculadas no banco.
+
+Contam os chamados atualmente 'Fechado', uma vez cada, na data de closed_at;
+a duração vai da abertura do chamado até closed_at. Um chamado reaberto deixa
+de contar, e fechado de novo conta só o último fechamento.
+
+TicketClosing guarda, por chamado, o fechamento somado em TicketDailyStats.
+A consolidação é incremental (marca d'água no último TicketHistory processado):
+todo chamado com histórico novo é recalculado, e a diferença para o que estava
+guardado é aplicada ao agregado diário. Percentis e a lista detalhada vêm de
+TicketClosing, com o trabalho feito pelo SQLite.
+
+A página de relatórios só lê. Quem grava fechamentos consolida o agregado logo
+depois do commit: a alteração de chamados que fecha, reabre ou mexe em chamado
+fechado (ver ticket_updates.touches_closings), o fechamento automático, a
+importação, o seed e o arquivamento (antes de mover, para que os chamados do
+arquivo morto continuem contando). "flask reports-rollup" consolida o que faltar.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import func, select, delete
+from sqlalchemy.dialects.sqlite import insert
+from app import db
+from app import archive
+from app.models import User, Ticket, TicketHistory, TicketClosing, TicketDailyStats, ReportRollupState
+
+ROLLUP_NAME = 'ticket_daily_stats'
+CLOSING_COLUMNS = ['ticket_id', 'closed_at', 'target_sector', 'assigned_to', 'close_seconds']
+
+
+def format_duration(seconds):
+    if seconds is None: return "N/A"
+    total_seconds = int(seconds)
+    days, remainder = divmod(total_seconds, 86400)
+    hours, remainder = divmod(remainder, 3600)
+    minutes, _ = divmod(remainder, 60)
+    parts = []
+    if days > 0: parts.append(f"{days}d")
+    if hours > 0: parts.append(f"{hours}h")
+    if minutes > 0: parts.append(f"{minutes}m")
+    return " ".join(parts) if parts else "< 1m"
+
+
+def current_closings():
+    """Consulta dos chamados ativos que contam como fechados, nas colunas de TicketClosing."""
+    return select(
+        Ticket.id, Ticket.closed_at, Ticket.target_sector, func.coalesce(Ticket.assigned_to, 0),
+        (func.julianday(Ticket.closed_at) - func.julianday(Ticket.created_at)) * 86400
+    ).where(Ticket.status == 'Fechado', Ticket.closed_at.isnot(None))
+
+
+def refresh_daily_rollup():
+    """
+    Recalcula os chamados com TicketHistory ainda não processado e aplica a diferença em
+    TicketDailyStats. A marca d'água é atualizada com compare-and-set: se dois processos
+    rodarem juntos, só um deles grava e nada é contado duas vezes. Retorna o número de
+    fechamentos consolidados.
+    """
+    state = db.session.get(ReportRollupState, ROLLUP_NAME)
+    last_id = state.last_history_id if state else 0
+    new_last_id = db.session.query(func.max(TicketHistory.id)).scalar()
+    if new_last_id is None or new_last_id <= last_id:
+        return 0
+
+    if state is None:
+        db.session.execute(insert(ReportRollupState).values(name=ROLLUP_NAME, last_history_id=0).on_conflict_do_nothing())
+    claimed = ReportRollupState.query.filter_by(name=ROLLUP_NAME, last_history_id=last_id).update(
+        {'last_history_id': new_last_id}, synchronize_session=False
+    )
+    if not claimed:
+        db.session.rollback()
+        return 0
+
+    changed = select(TicketHistory.ticket_id).where(TicketHistory.id > last_id, TicketHistory.id <= new_last_id).distinct()
+    old = db.session.execute(select(
+        TicketClosing.closed_at, TicketClosing.target_sector, TicketClosing.assigned_to, TicketClosing.close_seconds
+    ).where(TicketClosing.ticket_id.in_(changed))).all()
+    new = db.session.execute(current_closings().where(Ticket.id.in_(changed))).all()
+
+    deltas = defaultdict(lambda: [0, 0.0])
+    for sign, rows in ((-1, old), (1, (row[1:] for row in new))):
+        for closed_at, sector, assigned_to, seconds in rows:
+            delta = deltas[(closed_at.date(), sector, assigned_to)]
+            delta[0] += sign
+            delta[1] += sign * (seconds or 0)
+
+    db.session.execute(delete(TicketClosing).where(TicketClosing.ticket_id.in_(changed)))
+    if new:
+        db.session.execute(insert(TicketClosing), [dict(zip(CLOSING_COLUMNS, row)) for row in new])
+
+    values = [{'day': day, 'target_sector': sector, 'assigned_to': assigned_to,
+               'closed_count': count, 'total_close_seconds': seconds}
+              for (day, sector, assigned_to), (count, seconds) in deltas.items() if count or seconds]
+    if values:
+        stmt = insert(TicketDailyStats)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'target_sector', 'assigned_to'],
+            set_={
+                'closed_count': TicketDailyStats.closed_count + stmt.excluded.closed_count,
+                'total_close_seconds': TicketDailyStats.total_close_seconds + stmt.excluded.total_close_seconds,
+            }
+        )
+        db.session.execute(stmt, values)
+    db.session.commit()
+    return len(new)
+
+
+def closing_stats(start=None, end=None):
+    """
+    Retorna {(setor, atendente): (quantidade, segundos_totais)} dos fechamentos entre start e end
+    (datas, inclusive; atendente 0 = sem atendente), com uma única consulta agrupada no agregado
+    diário, na última consolidação feita por refresh_daily_rollup.
+    """
+    query = db.session.query(
+        TicketDailyStats.target_sector, TicketDailyStats.assigned_to,
+        func.sum(TicketDailyStats.closed_count), func.sum(TicketDailyStats.total_close_seconds)
+    )
+    if start is not None:
+        query = query.filter(TicketDailyStats.day >= start)
+    if end is not None:
+        query = query.filter(TicketDailyStats.day <= end)
+    rows = query.group_by(TicketDailyStats.target_sector, TicketDailyStats.assigned_to).all()
+    return {(sector, assignee): (count, seconds or 0) for sector, assignee, count, seconds in rows if count}
+
+
+def summarize(stats, by=None):
+    """Reagrupa o resultado de closing_stats: by=None (total), 'sector' ou 'assignee'."""
+    grouped = defaultdict(lambda: [0, 0.0])
+    for (sector, assignee), (count, seconds) in stats.items():
+        key = {None: 'total', 'sector': sector, 'assignee': assignee}[by]
+        grouped[key][0] += count
+        grouped[key][1] += seconds
+    return {key: tuple(values) for key, values in grouped.items()}
+
+
+def _range_filter(query, start, end):
+    if start is not None:
+        query = query.filter(TicketClosing.closed_at >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.filter(TicketClosing.closed_at < datetime.combine(end + timedelta(days=1), time.min))
+    return query
+
+
+def closing_percentiles(start=None, end=None, percentiles=(0.5, 0.9)):
+    """Percentis do tempo de fechamento, com ORDER BY ... LIMIT 1 OFFSET k no próprio SQLite."""
+    query = _range_filter(db.session.query(TicketClosing.close_seconds), start, end)
+    count = query.with_entities(func.count(TicketClosing.ticket_id)).scalar()
+    if not count:
+        return {p: None for p in percentiles}
+    result = {}
+    for p in percentiles:
+        offset = int(p * (count - 1))
+        result[p] = query.order_by(TicketClosing.close_seconds).limit(1).offset(offset).scalar()
+    return result
+
+
+def closed_ticket_details(start=None, end=None, page=1, per_page=20):
+    """
+    Lista paginada dos fechamentos mais recentes, só com as colunas exibidas. Título e autor
+    vêm do chamado ativo ou, se ele já foi arquivado, do arquivo morto.
+    """
+    title, author_id = Ticket.title, Ticket.user_id
+    archived = archive.attach(db.session.connection())
+    if archived:
+        title = func.coalesce(Ticket.title, archive.ArchivedTicket.title)
+        author_id = func.coalesce(Ticket.user_id, archive.ArchivedTicket.user_id)
+    query = db.session.query(
+        TicketClosing.ticket_id.label('id'), title.label('title'), User.name.label('author'),
+        TicketClosing.close_seconds.label('seconds'), TicketClosing.closed_at
+    ).outerjoin(Ticket, Ticket.id == TicketClosing.ticket_id)
+    if archived:
+        query = query.outerjoin(archive.ArchivedTicket, archive.ArchivedTicket.id == TicketClosing.ticket_id)
+    query = _range_filter(query.join(User, User.id == author_id), start, end)
+    query = query.order_by(TicketClosing.closed_at.desc(), TicketClosing.ticket_id.desc())
+    return query.paginate(page=page, per_page=per_page, error_out=False)
@@ -0,0 +1,78 @@
+"""
+Cache das leituras feitas em toda requisição: as configurações do sistema
+(context processor dos templates) e o usuário logado (user_loader do Flask-Login).
+
+Guardamos só os valores das colunas; a cada requisição o objeto é remontado e
+anexado à sessão com merge(load=False), sem ir ao banco. As rotas que alteram
+usuários ou configurações chamam invalidate() após o commit, e o arquivo de
+versão (REQUEST_CACHE_VERSION_FILE, por padrão ao lado do banco SQLite) faz os
+demais processos descartarem o cache na leitura seguinte.
+"""
+import os
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.cache import TTLCache, SharedVersion
+from app.models import User, SystemSettings
+
+SETTINGS_KEY = 'system_settings'
+
+shared_version = SharedVersion()
+request_cache = TTLCache(version=shared_version)
+
+
+def _columns(obj):
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _attach(model, values):
+    """Remonta a instância a partir dos valores das colunas e a anexa à sessão sem consultar o banco."""
+    mapper = inspect(model)
+    identity_key = mapper.identity_key_from_primary_key([values[col.key] for col in mapper.primary_key])
+    existing = db.session.identity_map.get(identity_key)
+    if existing is not None:
+        # Já carregado nesta requisição: não sobrescreve o estado (possivelmente alterado) da sessão
+        return existing
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return db.session.merge(obj, load=False)
+
+
+def get_settings():
+    values = request_cache.get(SETTINGS_KEY)
+    if values is None:
+        settings = SystemSettings.query.first()
+        if settings is None:
+            return None
+        values = _columns(settings)
+        request_cache.set(SETTINGS_KEY, values)
+    return _attach(SystemSettings, values)
+
+
+def get_user(user_id):
+    key = ('user', user_id)
+    values = request_cache.get(key)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        values = _columns(user)
+        request_cache.set(key, values)
+    return _attach(User, values)
+
+
+def invalidate():
+    request_cache.invalidate()
+
+
+def _default_version_file(app):
+    database = db.engine.url.database
+    if db.engine.url.get_backend_name() == 'sqlite' and database and database != ':memory:':
+        return f'{os.path.abspath(database)}.cache-version'
+    return os.path.join(app.instance_path, 'request-cache.version')
+
+
+def init_request_cache(app):
+    request_cache.ttl = app.config['REQUEST_CACHE_SECONDS']
+    request_cache.max_entries = app.config['REQUEST_CACHE_MAX_ENTRIES']
+    shared_version.path = app.config.get('REQUEST_CACHE_VERSION_FILE') or _default_version_file(app)
@@ -0,0 +1,59 @@
+"""
+Respostas HTTP mais baratas para as rotas consultadas por polling.
+
+- ETag / 304: a rota calcula uma versão curta do conteúdo (um contador ou o
+  último ID, numa consulta agregada) antes de montar o JSON; se o navegador
+  mandar o mesmo valor em If-None-Match, a resposta é 304 sem corpo.
+- Compressão: respostas JSON e HTML acima de COMPRESS_MIN_SIZE são enviadas em
+  brotli (se o pacote "brotli" estiver instalado) ou gzip, conforme o
+  Accept-Encoding. Arquivos (send_file) e streams como o SSE não são tocados.
+"""
+import gzip
+import hashlib
+from flask import request, current_app, Response
+
+try:
+    import brotli
+except ImportError: # Opcional: sem ele, só gzip
+    brotli = None
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """Retorna uma resposta 304 se o cliente já tem esta versão, ou None."""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def compress_response(response):
+    config = current_app.config
+    if (not config['COMPRESS_ENABLED'] or response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300 or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < config['COMPRESS_MIN_SIZE']:
+        return response
+    if brotli is not None and request.accept_encodings['br']:
+        response.set_data(brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY']))
+        response.headers['Content-Encoding'] = 'br'
+    elif request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=config['COMPRESS_LEVEL']))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def init_responses(app):
+    app.after_request(compress_response)
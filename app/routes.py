@@ -1,63 +1,67 @@
+import hmac
+import io
 import os
-import uuid
-import shutil
-from werkzeug.utils import secure_filename
-from flask import render_template, url_for, flash, redirect, request, abort, jsonify, Blueprint, current_app, send_from_directory, session, Response
+import queue
+import time
+from flask import render_template, url_for, flash, redirect, request, abort, jsonify, Blueprint, current_app, send_from_directory, send_file, Response, stream_with_context
 from app import db
+from app.events import event_bus
+from app.instrumentation import query_budget, registry as metrics_registry
 from app.forms import LoginForm, RegistrationForm, TicketForm, CommentForm, TicketUpdateForm, ChangePasswordForm, ChatMessageForm, SettingsForm
-from app.models import User, Ticket, Comment, TicketHistory, ChatMessage, SystemSettings
+from app.models import User, Ticket, Comment, TicketHistory, ChatMessage, ChatConversation, SystemSettings
+from app.chat import record_chat_message, mark_conversation_read, unread_counts, serialize_message
+from app import notifications
+from app.search import search_tickets
+from app import reports as reports_service
+from app import dashboard as dashboard_metrics
+from app import request_cache
+from app import backup as backup_service
+from app import attachments
+from app import transfer
+from app import archive
+from app import ticket_updates
+from app.responses import make_etag, not_modified, with_etag
 from flask_login import login_user, current_user, logout_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func, or_, cast, String, not_, and_
+from sqlalchemy import func, or_, not_, and_
+from sqlalchemy.orm import joinedload, selectinload
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 
 main = Blueprint('main', __name__)
 
 # --- CONTEXT PROCESSOR (Disponibiliza configurações globais nos templates) ---
 @main.context_processor
 def inject_system_settings():
-    settings = SystemSettings.query.first()
-    return dict(system_settings=settings)
+    return dict(system_settings=request_cache.get_settings())
 
 # --- FUNÇÕES AUXILIARES ---
 def save_attachment(form_attachment):
-    if not form_attachment or not form_attachment.filename:
-        return None
-    random_hex = uuid.uuid4().hex
-    _, f_ext = os.path.splitext(form_attachment.filename)
-    secure_name = secure_filename(f"{random_hex}{f_ext}")
-    upload_path = current_app.config['UPLOAD_FOLDER']
-    os.makedirs(upload_path, exist_ok=True)
-    file_path = os.path.join(upload_path, secure_name)
-    form_attachment.save(file_path)
-    return secure_name
+    return attachments.save_upload(form_attachment)
 
 def save_chat_attachment(form_attachment):
-    if not form_attachment or not form_attachment.filename:
-        return None
-    random_hex = uuid.uuid4().hex
-    _, f_ext = os.path.splitext(form_attachment.filename)
-    secure_name = secure_filename(f"{random_hex}{f_ext}")
-    upload_path = os.path.join(current_app.static_folder, 'chat_uploads')
-    os.makedirs(upload_path, exist_ok=True)
-    file_path = os.path.join(upload_path, secure_name)
-    form_attachment.save(file_path)
-    return secure_name
+    return attachments.save_upload(form_attachment)
 
 # --- NOVA FUNÇÃO PARA SALVAR LOGO ---
 def save_logo(form_logo):
-    if not form_logo or not form_logo.filename:
-        return None
-    random_hex = uuid.uuid4().hex
-    _, f_ext = os.path.splitext(form_logo.filename)
-    secure_name = secure_filename(f"logo_{random_hex}{f_ext}")
-    # Salva na pasta padrão de uploads
-    upload_path = current_app.config['UPLOAD_FOLDER']
-    os.makedirs(upload_path, exist_ok=True)
-    file_path = os.path.join(upload_path, secure_name)
-    form_logo.save(file_path)
-    return secure_name
+    return attachments.save_upload(form_logo)
+
+def visible_tickets_query(model=Ticket):
+    """Chamados que o usuário logado pode ver, conforme seu nível de acesso (model=ArchivedTicket para o arquivo morto)."""
+    query = db.session.query(model)
+    if current_user.access_level == 'administrador':
+        return query
+    elif current_user.access_level == 'tecnico':
+        return query.filter(or_(model.target_sector == current_user.sector, model.origin_sector == current_user.sector, model.assigned_to == current_user.id))
+    return query.filter(model.user_id == current_user.id)
+
+def search_visible_tickets(base_query, query_text, limit=200):
+    """Busca nos chamados ativos; se não preencherem o limite, completa com os do arquivo morto."""
+    tickets, snippets = search_tickets(db.session, base_query, query_text, limit=limit)
+    if len(tickets) < limit:
+        archived, archived_snippets = archive.search_archive(visible_tickets_query(archive.ArchivedTicket), query_text, limit - len(tickets))
+        tickets, snippets = tickets + archived, {**snippets, **archived_snippets}
+    return tickets, snippets
 
 def is_admin():
     return current_user.is_authenticated and current_user.access_level == 'administrador'
@@ -69,25 +73,20 @@ def is_tecnico():
 @main.route('/')
 @main.route('/home')
 @login_required
+@query_budget(6)
 def home():
-    session.pop('last_check_time', None)
     query_param = request.args.get('q', '', type=str)
     
-    if current_user.access_level == 'administrador':
-        base_query = Ticket.query
-    elif current_user.access_level == 'tecnico':
-        base_query = Ticket.query.filter(or_(Ticket.target_sector == current_user.sector, Ticket.origin_sector == current_user.sector, Ticket.assigned_to == current_user.id))
-    else:
-        base_query = Ticket.query.filter_by(user_id=current_user.id)
+    base_query = visible_tickets_query()
 
+    # Autor e responsável vêm na mesma consulta: o card não dispara uma carga por chamado
+    base_query = base_query.options(joinedload(Ticket.author), joinedload(Ticket.assignee_user))
+    snippets = {}
     if query_param:
-        search_term = f"%{query_param}%"
-        base_query = base_query.filter(or_(Ticket.title.ilike(search_term), cast(Ticket.id, String).ilike(search_term)))
+        tickets, snippets = search_visible_tickets(base_query, query_param)
     else:
-        base_query = base_query.filter(not_(Ticket.status.in_(['Resolvido', 'Fechado'])))
-
-    tickets = base_query.order_by(Ticket.created_at.desc()).all()
-    return render_template('index.html', title='Início', tickets=tickets)
+        tickets = base_query.filter(not_(Ticket.status.in_(['Resolvido', 'Fechado']))).order_by(Ticket.created_at.desc()).all()
+    return render_template('index.html', title='Início', tickets=tickets, snippets=snippets)
 
 @main.route('/login', methods=['GET', 'POST'])
 def login():
@@ -147,10 +146,13 @@ def create_ticket():
             attachment_filename=attachment_filename
         )
         db.session.add(ticket)
-        db.session.commit()
+        db.session.flush()
         history_entry = TicketHistory(ticket_id=ticket.id, changed_by_user_id=current_user.id, field_changed='status', old_value='N/A', new_value='Aberto')
         db.session.add(history_entry)
+        created = notifications.notify_new_ticket(ticket, current_user.name)
         db.session.commit()
+        notifications.publish(created)
+        dashboard_metrics.invalidate()
         flash('Seu chamado foi aberto com sucesso!', 'success')
         return redirect(url_for('main.tickets_kanban'))
     form.origin_sector.data = current_user.sector
@@ -158,43 +160,42 @@ def create_ticket():
 
 @main.route('/ticket/<int:ticket_id>', methods=['GET', 'POST'])
 @login_required
+@query_budget(8)
 def view_ticket(ticket_id):
-    ticket = Ticket.query.get_or_404(ticket_id)
-    if not (current_user.id == ticket.user_id or (is_tecnico() and (ticket.target_sector == current_user.sector or ticket.origin_sector == current_user.sector)) or is_admin()):
+    ticket = Ticket.query.options(
+        joinedload(Ticket.author),
+        selectinload(Ticket.comments).joinedload(Comment.comment_author)
+    ).filter_by(id=ticket_id).first()
+    if ticket is None:
+        return view_archived_ticket(ticket_id)
+    if not can_view_ticket(ticket):
         abort(403)
     comment_form = CommentForm()
     update_form = TicketUpdateForm()
     if is_tecnico():
-        tecnicos = User.query.filter(or_(User.access_level == 'tecnico', User.access_level == 'administrador')).all()
+        # Só responsáveis ativos (o atual continua na lista, para o formulário validar sem trocá-lo)
+        tecnicos = User.query.filter(or_(User.access_level == 'tecnico', User.access_level == 'administrador'),
+                                     or_(User.is_active == True, User.id == ticket.assigned_to)).order_by(User.name).all()
         update_form.assigned_to.choices = [(0, 'Não Atribuído')] + [(t.id, f"{t.name} ({t.sector})") for t in tecnicos]
     if request.method == 'POST':
         if update_form.submit_update.data and update_form.validate():
-            new_status = update_form.status.data
-            if new_status == 'Fechado' and ticket.status != 'Fechado':
-                ticket.closed_at = datetime.utcnow()
-            elif new_status != 'Fechado' and ticket.status == 'Fechado':
-                ticket.closed_at = None
-            changes = []
-            if update_form.status.data != ticket.status:
-                changes.append(('status', ticket.status, update_form.status.data))
-                ticket.status = update_form.status.data
-            if update_form.priority.data != ticket.priority:
-                changes.append(('priority', ticket.priority, update_form.priority.data))
-                ticket.priority = update_form.priority.data
-            new_assigned_to = update_form.assigned_to.data if update_form.assigned_to.data != 0 else None
-            if new_assigned_to != ticket.assigned_to:
-                old_assignee = User.query.get(ticket.assigned_to)
-                new_assignee = User.query.get(new_assigned_to)
-                old_assignee_name = old_assignee.name if old_assignee else 'N/A'
-                new_assignee_name = new_assignee.name if new_assignee else 'N/A'
-                changes.append(('assigned_to', old_assignee_name, new_assignee_name))
-                ticket.assigned_to = new_assigned_to
-            for field, old_val, new_val in changes:
-                history_entry = TicketHistory(ticket_id=ticket.id, changed_by_user_id=current_user.id, field_changed=field, old_value=old_val, new_value=new_val)
-                db.session.add(history_entry)
-            db.session.commit()
+            changes = {'status': update_form.status.data, 'priority': update_form.priority.data,
+                       'assigned_to': update_form.assigned_to.data or None}
+            try:
+                applied, created = ticket_updates.apply_changes([ticket], changes, current_user)
+                closings_changed = ticket_updates.touches_closings([ticket], changes, applied)
+                db.session.commit()
+            except ticket_updates.ChangeError as e:
+                db.session.rollback()
+                flash(str(e), 'danger')
+                return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
+            notifications.publish(created)
+            if closings_changed:
+                reports_service.refresh_daily_rollup()
+            if any(field in ('status', 'priority') for field, _, _ in applied.get(ticket_id, ())):
+                dashboard_metrics.invalidate()
             flash('Chamado atualizado com sucesso!', 'success')
-            return redirect(url_for('main.view_ticket', ticket_id=ticket.id))
+            return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
         if comment_form.submit_comment.data and comment_form.validate():
             attachment_filename = save_attachment(comment_form.attachment.data)
             comment = Comment(content=comment_form.content.data, 
@@ -202,7 +203,9 @@ def view_ticket(ticket_id):
                               ticket_id=ticket.id,
                               attachment_filename=attachment_filename)
             db.session.add(comment)
+            created = notifications.notify_ticket_participants(ticket, f"Novo comentário no chamado #{ticket.id}: '{ticket.title}' por {current_user.name}.", current_user.id)
             db.session.commit()
+            notifications.publish(created)
             flash('Comentário adicionado!', 'success')
             return redirect(url_for('main.view_ticket', ticket_id=ticket.id))
     if request.method == 'GET' and is_tecnico():
@@ -211,91 +214,244 @@ def view_ticket(ticket_id):
         update_form.assigned_to.data = ticket.assigned_to or 0
     return render_template('view_ticket.html', title=ticket.title, ticket=ticket, comment_form=comment_form, update_form=update_form, is_tecnico=is_tecnico(), is_admin=is_admin())
 
+def can_view_ticket(ticket):
+    return current_user.id == ticket.user_id or (is_tecnico() and (ticket.target_sector == current_user.sector or ticket.origin_sector == current_user.sector)) or is_admin()
+
+def view_archived_ticket(ticket_id):
+    """Chamado que já foi para o arquivo morto: mesma página, sem edição nem comentários."""
+    ticket = archive.get_ticket(ticket_id)
+    if ticket is None:
+        abort(404)
+    if not can_view_ticket(ticket):
+        abort(403)
+    if request.method == 'POST':
+        flash('Este chamado está arquivado e não pode mais ser alterado.', 'warning')
+        return redirect(url_for('main.view_ticket', ticket_id=ticket_id))
+    return render_template('view_ticket.html', title=ticket.title, ticket=ticket, comment_form=CommentForm(), update_form=TicketUpdateForm(), is_tecnico=is_tecnico(), is_admin=is_admin(), archived=True)
+
+KANBAN_STATUSES = ['Aberto', 'Em Atendimento', 'Resolvido', 'Fechado']
+
+def encode_kanban_cursor(ticket):
+    return f"{ticket.priority}|{ticket.created_at.isoformat()}|{ticket.id}"
+
+def decode_kanban_cursor(cursor):
+    try:
+        priority, created_at, ticket_id = cursor.split('|')
+        return priority, datetime.fromisoformat(created_at), int(ticket_id)
+    except (AttributeError, ValueError):
+        return None
+
+def kanban_column_page(base_query, status, cursor=None, limit=None):
+    """
+    Uma página de uma coluna do kanban, paginada por keyset na mesma ordem do quadro
+    (prioridade decrescente, criação crescente, id). Retorna (chamados, próximo cursor).
+    """
+    limit = limit or current_app.config['KANBAN_PAGE_SIZE']
+    query = base_query.filter(Ticket.status == status)
+    position = decode_kanban_cursor(cursor) if cursor else None
+    if position:
+        priority, created_at, ticket_id = position
+        query = query.filter(or_(
+            Ticket.priority < priority,
+            and_(Ticket.priority == priority, or_(
+                Ticket.created_at > created_at,
+                and_(Ticket.created_at == created_at, Ticket.id > ticket_id)
+            ))
+        ))
+    tickets = query.options(joinedload(Ticket.author), joinedload(Ticket.assignee_user)).order_by(
+        Ticket.priority.desc(), Ticket.created_at.asc(), Ticket.id.asc()
+    ).limit(limit + 1).all()
+    next_cursor = encode_kanban_cursor(tickets[limit - 1]) if len(tickets) > limit else None
+    return tickets[:limit], next_cursor
+
 @main.route('/tickets_kanban')
 @login_required
+@query_budget(8)
 def tickets_kanban():
-    session.pop('last_check_time', None)
     query_param = request.args.get('q', '', type=str)
-    if current_user.access_level == 'administrador':
-        base_query = Ticket.query
-    elif current_user.access_level == 'tecnico':
-        base_query = Ticket.query.filter(or_(Ticket.target_sector == current_user.sector, Ticket.origin_sector == current_user.sector, Ticket.assigned_to == current_user.id))
-    else:
-        base_query = Ticket.query.filter_by(user_id=current_user.id)
+    base_query = visible_tickets_query()
+    snippets = {}
+    columns = {}
     if query_param:
-        search_term = f"%{query_param}%"
-        base_query = base_query.filter(or_(Ticket.title.ilike(search_term), cast(Ticket.id, String).ilike(search_term)))
-    tickets = base_query.order_by(Ticket.priority.desc(), Ticket.created_at.asc()).all()
-    return render_template('tickets_kanban.html', title='Kanban de Chamados', tickets=tickets)
-
-@main.route('/update_ticket_status/<int:ticket_id>', methods=['POST'])
+        # A busca devolve um número limitado de resultados por relevância: sem paginação
+        tickets, snippets = search_visible_tickets(base_query.options(joinedload(Ticket.author), joinedload(Ticket.assignee_user)), query_param)
+        for status in KANBAN_STATUSES:
+            column_tickets = [t for t in tickets if t.status == status]
+            columns[status] = {'tickets': column_tickets, 'count': len(column_tickets), 'next_cursor': None}
+    else:
+        # Cada coluna carrega só a primeira página; o restante vem sob demanda pela API
+        counts = dict(base_query.with_entities(Ticket.status, func.count(Ticket.id)).group_by(Ticket.status).all())
+        for status in KANBAN_STATUSES:
+            column_tickets, next_cursor = kanban_column_page(base_query, status) if counts.get(status) else ([], None)
+            columns[status] = {'tickets': column_tickets, 'count': counts.get(status, 0), 'next_cursor': next_cursor}
+    # Responsáveis possíveis para a barra de alteração em massa
+    tecnicos = User.query.filter(or_(User.access_level == 'tecnico', User.access_level == 'administrador'), User.is_active == True).order_by(User.name).all() if is_tecnico() else []
+    return render_template('tickets_kanban.html', title='Kanban de Chamados', columns=columns, statuses=KANBAN_STATUSES, snippets=snippets,
+                           tecnicos=tecnicos, priorities=ticket_updates.PRIORITIES)
+
+@main.route('/api/kanban/column')
 @login_required
-def update_ticket_status(ticket_id):
+@query_budget(4)
+def kanban_column():
+    """Próxima página de uma coluna do kanban, com os cards já renderizados."""
+    status = request.args.get('status', '', type=str)
+    if status not in KANBAN_STATUSES:
+        return jsonify({'success': False, 'message': 'Status inválido.'}), 400
+    limit = max(1, min(request.args.get('limit', current_app.config['KANBAN_PAGE_SIZE'], type=int), 100))
+    tickets, next_cursor = kanban_column_page(visible_tickets_query(), status, request.args.get('cursor'), limit)
+    html = render_template('components/kanban_cards.html', tickets=tickets)
+    return jsonify({'success': True, 'html': html, 'next_cursor': next_cursor})
+
+@main.route('/api/search')
+@login_required
+def search_api():
+    """Busca textual nos chamados visíveis ao usuário: resultados por relevância, com trechos destacados."""
+    query_param = request.args.get('q', '', type=str)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    tickets, snippets = search_visible_tickets(visible_tickets_query(), query_param, limit=limit)
+    return jsonify(results=[{
+        'id': ticket.id,
+        'title': ticket.title,
+        'status': ticket.status,
+        'snippet': str(snippets[ticket.id]) if snippets.get(ticket.id) else None,
+        'url': url_for('main.view_ticket', ticket_id=ticket.id)
+    } for ticket in tickets])
+
+@main.route('/api/tickets/bulk_update', methods=['POST'])
+@login_required
+@query_budget(12)
+def bulk_update_tickets():
+    """
+    Altera status, prioridade e/ou responsável de vários chamados em uma transação.
+    Corpo: {"ticket_ids": [...], "changes": {"status": ..., "priority": ..., "assigned_to": ...}}.
+    Responde com o resultado de cada chamado, na ordem pedida.
+    """
     if not is_tecnico():
         return jsonify({'success': False, 'message': 'Permissão negada.'}), 403
-    ticket = Ticket.query.get_or_404(ticket_id)
-    data = request.get_json()
-    new_status = data.get('new_status')
-    if not new_status:
-        return jsonify({'success': False, 'message': 'Novo status não fornecido.'}), 400
-    old_status = ticket.status
-    if old_status != new_status:
-        try:
-            if new_status == 'Fechado':
-                ticket.closed_at = datetime.utcnow()
-            else:
-                ticket.closed_at = None
-            ticket.status = new_status
-            history_entry = TicketHistory(ticket_id=ticket.id, changed_by_user_id=current_user.id, field_changed='status', old_value=old_status, new_value=new_status)
-            db.session.add(history_entry)
-            db.session.commit()
-            return jsonify({'success': True, 'message': f'Status do chamado #{ticket.id} alterado para {new_status}.'})
-        except Exception:
-            db.session.rollback()
-            return jsonify({'success': False, 'message': 'Erro ao salvar no banco de dados.'}), 500
-    return jsonify({'success': False, 'message': 'O status já é o mesmo.'})
+    data = request.get_json(silent=True) or {}
+    ticket_ids = data.get('ticket_ids')
+    if not isinstance(ticket_ids, list) or not ticket_ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ticket_ids):
+        return jsonify({'success': False, 'message': 'Informe a lista de chamados (ticket_ids).'}), 400
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    if len(ticket_ids) > current_app.config['BULK_UPDATE_MAX_TICKETS']:
+        return jsonify({'success': False, 'message': f"Máximo de {current_app.config['BULK_UPDATE_MAX_TICKETS']} chamados por vez."}), 400
+    try:
+        changes = ticket_updates.validate_changes(data.get('changes'))
+    except ticket_updates.ChangeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    tickets = {ticket.id: ticket for ticket in Ticket.query.filter(Ticket.id.in_(ticket_ids))}
+    allowed = ticket_updates.editable_ids(visible_tickets_query(), list(tickets))
+    try:
+        editable = [tickets[i] for i in ticket_ids if i in allowed]
+        applied, created = ticket_updates.apply_changes(editable, changes, current_user)
+        closings_changed = ticket_updates.touches_closings(editable, changes, applied)
+        db.session.commit()
+    except ticket_updates.ChangeError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': 'Erro ao salvar no banco de dados.'}), 500
+    notifications.publish(created)
+    if closings_changed:
+        reports_service.refresh_daily_rollup()
+    if any(field in ('status', 'priority') for changed in applied.values() for field, _, _ in changed):
+        dashboard_metrics.invalidate()
+
+    results = []
+    for ticket_id in ticket_ids:
+        if ticket_id not in tickets:
+            results.append({'id': ticket_id, 'success': False, 'message': 'Chamado não encontrado.'})
+        elif ticket_id not in allowed:
+            results.append({'id': ticket_id, 'success': False, 'message': 'Permissão negada.'})
+        elif ticket_id not in applied:
+            results.append({'id': ticket_id, 'success': True, 'message': 'Nenhuma alteração.', 'changes': []})
+        else:
+            results.append({'id': ticket_id, 'success': True, 'message': 'Chamado atualizado.',
+                            'changes': [{'field': field, 'old': old, 'new': new} for field, old, new in applied[ticket_id]]})
+    return jsonify({'success': all(result['success'] for result in results), 'updated': len(applied), 'results': results})
+
+# --- ANEXOS (ARMAZENAMENTO POR CONTEÚDO) ---
+def send_attachment(path, name):
+    # O nome é o SHA-256 do conteúdo: a URL nunca muda de conteúdo, então o cache pode ser eterno
+    response = send_file(path, conditional=True, etag=name, max_age=current_app.config['ATTACHMENT_CACHE_SECONDS'])
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['ATTACHMENT_CACHE_SECONDS']}, immutable"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@main.route('/attachments/<name>')
+def attachment(name):
+    if not attachments.STORED_NAME.match(name): abort(404)
+    path = os.path.join(attachments.store_folder(), name)
+    if not os.path.exists(path): abort(404)
+    return send_attachment(path, name)
+
+@main.route('/attachments/<name>/thumbnail')
+def attachment_thumbnail(name):
+    if not attachments.STORED_NAME.match(name): abort(404)
+    path = attachments.thumbnail_path(attachments.store_folder(), name)
+    if not os.path.exists(path):
+        return redirect(url_for('main.attachment', name=name))
+    return send_attachment(path, f'{name}-thumbnail')
 
 # --- ROTAS DE DASHBOARD E RELATÓRIOS ---
 @main.route('/dashboard')
 @login_required
 def dashboard():
     if not is_tecnico(): abort(403)
-    status_counts = db.session.query(Ticket.status, func.count(Ticket.id)).group_by(Ticket.status).all()
-    status_data = [{'status': s, 'count': c} for s, c in status_counts]
-    sector_counts = db.session.query(Ticket.target_sector, func.count(Ticket.id)).group_by(Ticket.target_sector).all()
-    sector_data = [{'sector': s, 'count': c} for s, c in sector_counts]
-    priority_counts = db.session.query(Ticket.priority, func.count(Ticket.id)).group_by(Ticket.priority).all()
-    priority_data = [{'priority': p, 'count': c} for p, c in priority_counts]
-    total_tickets = Ticket.query.count()
-    return render_template('dashboard.html', title='Dashboard', status_data=json.dumps(status_data), sector_data=json.dumps(sector_data), priority_data=json.dumps(priority_data), total_tickets=total_tickets)
+    metrics = dashboard_metrics.get_metrics()
+    return render_template('dashboard.html', title='Dashboard', status_data=json.dumps(metrics['status_data']), sector_data=json.dumps(metrics['sector_data']), priority_data=json.dumps(metrics['priority_data']), total_tickets=metrics['total_tickets'])
+
+@main.route('/api/dashboard/metrics')
+@login_required
+def dashboard_metrics_api():
+    if not is_tecnico(): abort(403)
+    return jsonify(dashboard_metrics.get_metrics())
+
+def parse_date_arg(name):
+    value = request.args.get(name, '', type=str)
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
 
 @main.route('/reports')
 @login_required
+@query_budget(20)
 def reports():
     if not is_tecnico(): abort(403)
-    def format_timedelta(td):
-        if td is None: return "N/A"
-        total_seconds = int(td.total_seconds())
-        days, remainder = divmod(total_seconds, 86400)
-        hours, remainder = divmod(remainder, 3600)
-        minutes, _ = divmod(remainder, 60)
-        parts = []
-        if days > 0: parts.append(f"{days}d")
-        if hours > 0: parts.append(f"{hours}h")
-        if minutes > 0: parts.append(f"{minutes}m")
-        return " ".join(parts) if parts else "< 1m"
+    start, end = parse_date_arg('start'), parse_date_arg('end')
+    page = request.args.get('page', 1, type=int)
+
+    # Só leitura: o agregado diário é consolidado por quem fecha ou reabre chamados (ver app/reports.py)
+
     tickets_per_user = db.session.query(User.name, func.count(Ticket.id).label('ticket_count')).join(Ticket, User.id == Ticket.user_id).group_by(User.name).order_by(func.count(Ticket.id).desc()).all()
-    closed_tickets = Ticket.query.filter(Ticket.status == 'Fechado', Ticket.closed_at.isnot(None)).all()
-    average_closing_time, closing_time_details = None, []
-    if closed_tickets:
-        total_seconds = sum([(t.closed_at - t.created_at).total_seconds() for t in closed_tickets])
-        average_seconds = total_seconds / len(closed_tickets) if closed_tickets else 0
-        average_closing_time_td = timedelta(seconds=average_seconds)
-        average_closing_time = format_timedelta(average_closing_time_td)
-        for ticket in closed_tickets:
-            duration = ticket.closed_at - ticket.created_at
-            closing_time_details.append({'id': ticket.id, 'title': ticket.title, 'author': ticket.author.name, 'duration_str': format_timedelta(duration)})
-    return render_template('reports.html', title='Relatórios', tickets_per_user=tickets_per_user, average_closing_time=average_closing_time, closing_time_details=closing_time_details)
+
+    def average(count_and_seconds):
+        count, seconds = count_and_seconds
+        return reports_service.format_duration(seconds / count)
+
+    stats = reports_service.closing_stats(start, end)
+    overall = reports_service.summarize(stats).get('total')
+    average_closing_time = average(overall) if overall else None
+    closed_count = overall[0] if overall else 0
+    percentiles = {p: reports_service.format_duration(v) for p, v in reports_service.closing_percentiles(start, end).items()}
+
+    by_sector = sorted(reports_service.summarize(stats, 'sector').items(), key=lambda item: -item[1][0])
+    sector_breakdown = [{'sector': sector, 'count': stats[0], 'average': average(stats)} for sector, stats in by_sector]
+
+    by_assignee = sorted(reports_service.summarize(stats, 'assignee').items(), key=lambda item: -item[1][0])
+    assignee_names = dict(db.session.query(User.id, User.name).filter(User.id.in_([uid for uid, _ in by_assignee])).all())
+    assignee_breakdown = [{'name': assignee_names.get(uid, 'Não Atribuído'), 'count': stats[0], 'average': average(stats)} for uid, stats in by_assignee]
+
+    details_page = reports_service.closed_ticket_details(start, end, page=page)
+    closing_time_details = [{'id': row.id, 'title': row.title, 'author': row.author, 'duration_str': reports_service.format_duration(row.seconds)} for row in details_page.items]
+
+    return render_template('reports.html', title='Relatórios', tickets_per_user=tickets_per_user,
+                           average_closing_time=average_closing_time, closed_count=closed_count, percentiles=percentiles,
+                           sector_breakdown=sector_breakdown, assignee_breakdown=assignee_breakdown,
+                           closing_time_details=closing_time_details, details_page=details_page, start=start, end=end)
 
 # --- ROTAS DE ADMINISTRAÇÃO ---
 @main.route('/users', methods=['GET', 'POST'])
@@ -309,6 +465,7 @@ def user_management():
         hashed_password = generate_password_hash(form.password.data, method='pbkdf2:sha256')
         user_to_change.password = hashed_password
         db.session.commit()
+        request_cache.invalidate()
         flash(f'A senha do usuário {user_to_change.name} foi alterada com sucesso!', 'success')
         return redirect(url_for('main.user_management'))
     users = User.query.order_by(User.name).all()
@@ -324,6 +481,7 @@ def delete_user(user_id):
         return redirect(url_for('main.user_management'))
     db.session.delete(user_to_delete)
     db.session.commit()
+    request_cache.invalidate()
     flash(f'Usuário {user_to_delete.name} foi excluído com sucesso.', 'success')
     return redirect(url_for('main.user_management'))
 
@@ -337,6 +495,7 @@ def toggle_user_status(user_id):
         return redirect(url_for('main.user_management'))
     user_to_toggle.is_active = not user_to_toggle.is_active
     db.session.commit()
+    request_cache.invalidate()
     status = "ativado" if user_to_toggle.is_active else "bloqueado"
     flash(f'O usuário {user_to_toggle.name} foi {status} com sucesso.', 'success')
     return redirect(url_for('main.user_management'))
@@ -345,24 +504,18 @@ def toggle_user_status(user_id):
 @login_required
 def backup():
     if not is_admin(): abort(403)
-    backup_folder = current_app.config['BACKUP_FOLDER']
-    os.makedirs(backup_folder, exist_ok=True)
-    backups = sorted([f for f in os.listdir(backup_folder) if f.endswith('.db')], reverse=True)
+    backups = backup_service.list_backups(current_app.config['BACKUP_FOLDER'])
     return render_template('backup.html', title='Backup do Sistema', backups=backups)
 
 @main.route('/create_backup', methods=['POST'])
 @login_required
 def create_backup():
     if not is_admin(): abort(403)
-    db_path = os.path.join(current_app.instance_path, 'site.db')
-    backup_folder = current_app.config['BACKUP_FOLDER']
-    os.makedirs(backup_folder, exist_ok=True)
-    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    backup_filename = f'site_{timestamp}.db'
-    backup_path = os.path.join(backup_folder, backup_filename)
     try:
-        shutil.copy2(db_path, backup_path)
-        flash(f'Backup "{backup_filename}" criado com sucesso!', 'success')
+        manifest, removed = backup_service.backup_now()
+        flash(f'Backup "{manifest["filename"]}" criado com sucesso em {manifest["duration_seconds"]:.1f}s!', 'success')
+        if removed:
+            flash(f'{len(removed)} backup(s) antigo(s) removido(s) pela política de retenção.', 'info')
     except Exception as e:
         flash(f'Erro ao criar o backup: {e}', 'danger')
     return redirect(url_for('main.backup'))
@@ -378,11 +531,8 @@ def download_backup(filename):
 @login_required
 def delete_backup(filename):
     if not is_admin(): abort(403)
-    backup_folder = current_app.config['BACKUP_FOLDER']
-    file_path = os.path.join(backup_folder, filename)
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        if backup_service.delete_backup(current_app.config['BACKUP_FOLDER'], filename):
             flash(f'Backup "{filename}" excluído com sucesso.', 'success')
         else:
             flash('Arquivo de backup não encontrado.', 'warning')
@@ -390,6 +540,50 @@ def delete_backup(filename):
         flash(f'Erro ao excluir o backup: {e}', 'danger')
     return redirect(url_for('main.backup'))
 
+# --- EXPORTAÇÃO E IMPORTAÇÃO DE CHAMADOS ---
+@main.route('/export')
+@login_required
+@query_budget(None) # Proporcional ao tamanho da exportação: algumas consultas por lote
+def export_tickets():
+    """Exporta chamados em streaming (JSON Lines ou CSV), filtrando por período de criação, setor e status."""
+    if not is_admin(): abort(403)
+    fmt = request.args.get('format', 'json', type=str)
+    kind = request.args.get('kind', 'tickets', type=str)
+    if fmt not in ('json', 'csv') or kind not in transfer.CSV_FIELDS:
+        abort(400)
+    filters = transfer.ticket_filters(parse_date_arg('start'), parse_date_arg('end'),
+                                      request.args.get('sector') or None, request.args.get('status') or None)
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    if fmt == 'json':
+        chunks, mimetype, extension = transfer.export_json_lines(filters, batch_size), 'application/x-ndjson', 'jsonl'
+    else:
+        chunks, mimetype, extension = transfer.export_csv(filters, kind, batch_size), 'text/csv', 'csv'
+    filename = f"chamados-{kind if fmt == 'csv' else 'completo'}-{datetime.now().strftime('%Y%m%d-%H%M')}.{extension}"
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@main.route('/import', methods=['POST'])
+@login_required
+@query_budget(None) # Proporcional ao tamanho do arquivo: algumas consultas por lote
+def import_tickets():
+    if not is_admin(): abort(403)
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        flash('Selecione um arquivo para importar.', 'warning')
+        return redirect(url_for('main.backup'))
+    fmt = 'csv' if upload.filename.lower().endswith('.csv') else 'json'
+    # Lido linha a linha direto do upload, sem carregar o arquivo inteiro
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        result = transfer.import_tickets(stream, fmt)
+    except transfer.ImportFormatError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.backup'))
+    flash(f"{result['tickets']} chamado(s) importado(s) em {result['seconds']}s, com {result['comments']} comentário(s).", 'success')
+    if result['error_count']:
+        flash(f"{result['error_count']} linha(s) ignorada(s): " + '; '.join(result['errors'][:5]), 'warning')
+    return redirect(url_for('main.backup'))
+
 @main.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
@@ -412,6 +606,7 @@ def settings():
                 settings.logo_filename = logo_filename
                 
         db.session.commit()
+        request_cache.invalidate()
         flash('Configurações salvas com sucesso!', 'success')
         return redirect(url_for('main.settings'))
         
@@ -423,62 +618,98 @@ def settings():
 @main.route('/check_updates')
 @login_required
 def check_updates():
-    last_check_str = session.get('last_check_time')
-    if not last_check_str:
-        session['last_check_time'] = datetime.utcnow().isoformat()
-        return jsonify(updates=[])
-    last_check_dt = datetime.fromisoformat(last_check_str)
+    """
+    Notificações de chamados não lidas do usuário, após o cursor ?since=<id>.
+    Sem cursor, devolve apenas o cursor atual (o que já existia não é reenviado).
+    As notificações são gravadas no momento do evento (ver app/notifications.py).
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify(updates=[], cursor=notifications.latest_id(current_user.id))
+    # Versão das não lidas após o cursor (quantas e a mais nova): sem mudança, 304 sem montar o JSON
+    etag = make_etag('check_updates', current_user.id, since, *notifications.unread_version(current_user.id, since))
+    cached = not_modified(etag)
+    if cached:
+        return cached
     updates_payload = []
     notified_tickets = set()
-    new_tickets = Ticket.query.filter(Ticket.created_at > last_check_dt).all()
-    for ticket in new_tickets:
-        tecnicos_do_setor = User.query.filter_by(sector=ticket.target_sector, access_level='tecnico').all()
-        admins = User.query.filter_by(access_level='administrador').all()
-        notificar_para = set(tecnicos_do_setor + admins)
-        if current_user in notificar_para and ticket.user_id != current_user.id:
-            if ticket.id not in notified_tickets:
-                message = f"Novo chamado #{ticket.id}: '{ticket.title}' aberto por {ticket.author.name}."
-                updates_payload.append({'message': message, 'url': url_for('main.view_ticket', ticket_id=ticket.id)})
-                notified_tickets.add(ticket.id)
-    new_comments = Comment.query.filter(Comment.created_at > last_check_dt, Comment.user_id != current_user.id).all()
-    for comment in new_comments:
-        ticket = comment.ticket
-        is_author = ticket.user_id == current_user.id
-        is_assignee = ticket.assigned_to is not None and ticket.assigned_to == current_user.id
-        if is_author or is_assignee:
-            if ticket.id not in notified_tickets:
-                message = f"Novo comentário no chamado #{ticket.id}: '{ticket.title}' por {comment.comment_author.name}."
-                updates_payload.append({'message': message, 'url': url_for('main.view_ticket', ticket_id=ticket.id)})
-                notified_tickets.add(ticket.id)
-    session['last_check_time'] = datetime.utcnow().isoformat()
-    return jsonify(updates=updates_payload)
+    pending = notifications.unread_since(current_user.id, since)
+    for notification in pending:
+        if notification.ticket_id not in notified_tickets:
+            updates_payload.append(notifications.serialize(notification.id, notification.ticket_id, notification.message))
+            notified_tickets.add(notification.ticket_id)
+    cursor = pending[-1].id if pending else since
+    return with_etag(jsonify(updates=updates_payload, cursor=cursor), etag)
+
+@main.route('/api/notifications/mark_read', methods=['POST'])
+@login_required
+def mark_notifications_read():
+    """Marca em lote as notificações como lidas: todas, até um ID (up_to) ou uma lista de IDs (ids)."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if ids is not None and not isinstance(ids, list):
+        return jsonify({'success': False, 'message': 'O campo ids deve ser uma lista.'}), 400
+    updated = notifications.mark_read(current_user.id, up_to=data.get('up_to'), ids=ids)
+    db.session.commit()
+    return jsonify({'success': True, 'updated': updated})
+
+@main.route('/stream')
+@login_required
+def stream():
+    """
+    Conexão Server-Sent Events: entrega ao navegador, assim que acontecem, apenas
+    os eventos de chamados e de chat destinados ao usuário logado.
+    O /check_updates continua disponível como alternativa via polling.
+
+    Cada stream ocupa uma thread do servidor por até SSE_MAX_STREAM_SECONDS: em
+    produção o servidor precisa de threads (gunicorn -k gthread --threads N, ou
+    gevent), nunca só workers síncronos. SSE_MAX_STREAMS limita os streams
+    abertos por processo, deixando threads livres para as demais rotas; acima
+    do limite a resposta é 204 e o navegador fica no polling.
+    """
+    if not current_app.config['SSE_ENABLED']:
+        return Response(status=204)
+    user_id = current_user.id
+    keepalive = current_app.config['SSE_KEEPALIVE_SECONDS']
+    max_duration = current_app.config['SSE_MAX_STREAM_SECONDS']
+    subscription = event_bus.subscribe(user_id, limit=current_app.config['SSE_MAX_STREAMS'])
+    if subscription is None:
+        # 204 encerra o EventSource sem novas tentativas: o navegador segue com o polling
+        return Response(status=204)
+
+    def generate():
+        yield 'retry: 5000\n\n'
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            try:
+                yield subscription.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream')
+    # Libera a vaga ao fechar a resposta, mesmo se o cliente sair antes do primeiro envio
+    response.call_on_close(lambda: event_bus.unsubscribe(user_id, subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # --- ROTAS DE CHAT (REESTRUTURADAS E CORRIGIDAS) ---
 
 @main.route('/chat', methods=['GET'])
 @login_required
+@query_budget(5)
 def chat_users():
-    sent_to_ids = db.session.query(ChatMessage.recipient_id).filter(ChatMessage.sender_id == current_user.id).distinct()
-    received_from_ids = db.session.query(ChatMessage.sender_id).filter(ChatMessage.recipient_id == current_user.id).distinct()
-    all_partner_ids = {row[0] for row in sent_to_ids}.union({row[0] for row in received_from_ids})
-
-    conversations = []
-    for partner_id in all_partner_ids:
-        last_message = ChatMessage.query.filter(
-            or_(
-                (ChatMessage.sender_id == current_user.id) & (ChatMessage.recipient_id == partner_id),
-                (ChatMessage.sender_id == partner_id) & (ChatMessage.recipient_id == current_user.id)
-            )
-        ).order_by(ChatMessage.timestamp.desc()).first()
-        if last_message:
-            conversations.append(last_message)
-    
-    conversations.sort(key=lambda x: x.timestamp, reverse=True)
+    # Uma única consulta indexada no resumo das conversas, já ordenada pela última mensagem
+    conversations = ChatConversation.query.options(
+        joinedload(ChatConversation.partner),
+        joinedload(ChatConversation.last_message)
+    ).filter(ChatConversation.user_id == current_user.id).order_by(ChatConversation.last_message_at.desc()).all()
 
+    partner_ids = db.session.query(ChatConversation.partner_id).filter(ChatConversation.user_id == current_user.id)
     users_without_conversations = User.query.filter(
         User.id != current_user.id,
-        ~User.id.in_(all_partner_ids)
+        ~User.id.in_(partner_ids)
     ).order_by(User.name).all()
 
     return render_template('chat_users.html', conversations=conversations, users_without_conversations=users_without_conversations, title="Chat")
@@ -497,7 +728,10 @@ def chat_conversation(recipient_id):
                           content=form.content.data,
                           attachment_filename=attachment_filename)
         db.session.add(msg)
+        db.session.flush()
+        record_chat_message(msg)
         db.session.commit()
+        event_bus.publish([recipient_id], 'chat', {'sender_id': current_user.id, 'sender_name': current_user.name})
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             return jsonify({'success': True})
         return redirect(url_for('main.chat_conversation', recipient_id=recipient_id))
@@ -505,63 +739,108 @@ def chat_conversation(recipient_id):
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return jsonify({'success': False, 'errors': form.errors})
 
-    return render_template('chat_conversation.html', form=form, recipient=recipient, title=f"Chat com {recipient.name}")
+    return render_template('chat_conversation.html', form=form, recipient=recipient, title=f"Chat com {recipient.name}",
+                           chat_ws_url=current_app.config['CHAT_WS_URL'])
 
 
 @main.route('/api/chat/<int:recipient_id>/messages')
 @login_required
 def get_chat_messages(recipient_id):
+    """
+    Mensagens da conversa paginadas por ID (keyset), em ordem cronológica.
+    - since_id: apenas as mensagens mais novas que o ID informado (polling incremental);
+      se não houver nada novo, responde 204 sem corpo.
+    - before_id: a página anterior, usada quando o usuário rola a conversa para cima.
+    - sem parâmetros: a página mais recente da conversa.
+    """
+    since_id = request.args.get('since_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    # A conversa muda quando chega mensagem nova ou quando uma das pontas lê as mensagens (is_read).
+    # Sem mensagem nova o contador de não lidas só diminui: a última mensagem e os contadores
+    # das duas pontas do resumo servem de versão
+    version = db.session.query(
+        ChatConversation.user_id, ChatConversation.last_message_id, ChatConversation.unread_count
+    ).filter(or_(
+        and_(ChatConversation.user_id == current_user.id, ChatConversation.partner_id == recipient_id),
+        and_(ChatConversation.user_id == recipient_id, ChatConversation.partner_id == current_user.id)
+    )).order_by(ChatConversation.user_id).all()
+    etag = make_etag('chat_messages', current_user.id, recipient_id, since_id, before_id, limit,
+                     [tuple(row) for row in version])
+    cached = not_modified(etag)
+    if cached:
+        return cached
     query = ChatMessage.query.filter(
         or_(
             (ChatMessage.sender_id == current_user.id) & (ChatMessage.recipient_id == recipient_id),
             (ChatMessage.sender_id == recipient_id) & (ChatMessage.recipient_id == current_user.id)
         )
     )
-    messages = query.order_by(ChatMessage.timestamp.asc()).all()
+    if since_id is not None:
+        messages = query.filter(ChatMessage.id > since_id).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        if not messages:
+            return Response(status=204)
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        if before_id is not None:
+            query = query.filter(ChatMessage.id < before_id)
+        messages = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit][::-1]
+
+    # Só existem dois participantes: os nomes são resolvidos uma única vez, sem carregar msg.sender por linha
+    sender_names = {current_user.id: current_user.name}
+    if recipient_id != current_user.id:
+        sender_names[recipient_id] = db.session.query(User.name).filter(User.id == recipient_id).scalar()
+
     messages_data = []
     for msg in messages:
-        data = {
-            'sender_name': msg.sender.name,
-            'content': msg.content,
-            'timestamp': msg.timestamp.isoformat() + 'Z',
-            'is_current_user': msg.sender_id == current_user.id,
-            'attachment_filename': msg.attachment_filename,
-            'attachment_url': url_for('static', filename=f'chat_uploads/{msg.attachment_filename}') if msg.attachment_filename else None
-        }
+        data = serialize_message(msg, sender_names.get(msg.sender_id))
+        data['is_current_user'] = msg.sender_id == current_user.id
         messages_data.append(data)
-    return jsonify(messages_data)
+    return with_etag(jsonify({'messages': messages_data, 'has_more': has_more}), etag)
 
 # --- NOVAS ROTAS PARA NOTIFICAÇÕES DE CHAT ---
 
 @main.route('/api/chat/unread_info', methods=['GET'])
 @login_required
 def unread_info():
-    """Retorna uma lista de IDs de remetentes que têm mensagens não lidas para o utilizador atual."""
-    unread_senders = db.session.query(ChatMessage.sender_id).filter(
-        ChatMessage.recipient_id == current_user.id,
-        ChatMessage.is_read == False
-    ).distinct().all()
-    # Extrai os IDs da lista de tuplos
-    sender_ids = [s[0] for s in unread_senders]
-    return jsonify({'unread_senders': sender_ids})
+    """
+    Retorna os IDs dos remetentes com mensagens não lidas para o utilizador atual, e quantas são.
+    Vem do resumo das conversas (uma linha por parceiro), não do histórico de mensagens.
+    """
+    counts = unread_counts(current_user.id)
+    etag = make_etag('unread_info', current_user.id, counts)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify({
+        'unread_senders': [partner_id for partner_id, _ in counts],
+        'unread_counts': {str(partner_id): count for partner_id, count in counts},
+        'unread_total': sum(count for _, count in counts),
+    }), etag)
 
 
 @main.route('/api/chat/<int:sender_id>/mark_as_read', methods=['POST'])
 @login_required
 def mark_as_read(sender_id):
-    """Marca todas as mensagens de um remetente específico como lidas."""
-    messages_to_update = ChatMessage.query.filter(
-        ChatMessage.sender_id == sender_id,
-        ChatMessage.recipient_id == current_user.id,
-        ChatMessage.is_read == False
-    ).all()
-    
-    for msg in messages_to_update:
-        msg.is_read = True
-    
+    """Marca todas as mensagens de um remetente específico como lidas (um UPDATE em lote)."""
+    updated = mark_conversation_read(current_user.id, sender_id)
     db.session.commit()
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'updated': updated})
     
+# --- MÉTRICAS DE DESEMPENHO ---
+@main.route('/metrics')
+def metrics():
+    """Métricas do processo no formato do Prometheus: para administradores logados ou com METRICS_TOKEN."""
+    token = current_app.config['METRICS_TOKEN']
+    authorized = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (authorized or is_admin()):
+        return Response('Acesso negado.\n', status=403, mimetype='text/plain') # Texto simples para o coletor
+    return Response(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+                    headers={'Cache-Control': 'no-store'})
+
 # --- ROTAS DE AJUDA E ERRO ---
 @main.route('/help')
 @login_required
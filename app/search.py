@@ -0,0 +1,160 @@
+"""
+Busca textual de chamados com SQLite FTS5.
+
+O índice ticket_fts tem uma linha por chamado (rowid = ticket.id) com título,
+descrição e o texto dos comentários. Ele é mantido por triggers no próprio
+banco (ver a migração 4), então qualquer escrita em ticket ou comment, inclusive
+importações em lote, já atualiza a busca. "flask search-rebuild" reconstrói o
+índice a partir das tabelas. Se o SQLite não tiver FTS5, a busca volta ao LIKE.
+"""
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import text, or_, cast, String, Integer, Float
+from app.models import Ticket
+
+FTS_TABLE = 'ticket_fts'
+FTS_COLUMNS = "title, description, comments, tokenize = 'unicode61 remove_diacritics 2'"
+
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({FTS_COLUMNS})",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_fts_after_insert AFTER INSERT ON ticket BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, description, comments) VALUES (new.id, new.title, new.description, '');
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_fts_after_update AFTER UPDATE OF title, description ON ticket BEGIN
+        UPDATE {FTS_TABLE} SET title = new.title, description = new.description WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS ticket_fts_after_delete AFTER DELETE ON ticket BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    # Comentário novo: apenas concatena o texto, sem reler os demais comentários
+    f"""CREATE TRIGGER IF NOT EXISTS comment_fts_after_insert AFTER INSERT ON comment BEGIN
+        UPDATE {FTS_TABLE} SET comments = comments || ' ' || new.content WHERE rowid = new.ticket_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS comment_fts_after_update AFTER UPDATE OF content ON comment BEGIN
+        UPDATE {FTS_TABLE} SET comments = COALESCE((SELECT group_concat(content, ' ') FROM comment WHERE ticket_id = new.ticket_id), '')
+        WHERE rowid = new.ticket_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS comment_fts_after_delete AFTER DELETE ON comment BEGIN
+        UPDATE {FTS_TABLE} SET comments = COALESCE((SELECT group_concat(content, ' ') FROM comment WHERE ticket_id = old.ticket_id), '')
+        WHERE rowid = old.ticket_id;
+    END""",
+]
+
+TRIGGERS = [
+    'ticket_fts_after_insert', 'ticket_fts_after_update', 'ticket_fts_after_delete',
+    'comment_fts_after_insert', 'comment_fts_after_update', 'comment_fts_after_delete',
+]
+
+_available = {}
+
+
+def fts5_supported(conn):
+    try:
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        conn.exec_driver_sql("DROP TABLE temp.fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def is_available(session):
+    """Indica (com cache por banco) se o índice FTS existe neste banco de dados."""
+    key = str(session.get_bind().url)
+    if key not in _available:
+        _available[key] = session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first() is not None
+    return _available[key]
+
+
+def create_index(conn):
+    for statement in CREATE_STATEMENTS:
+        conn.execute(text(statement))
+    _available.clear()
+
+
+def drop_triggers(conn):
+    """Desliga a manutenção automática do índice (cargas em massa); create_index religa."""
+    for name in TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def rebuild_index(conn):
+    """Reconstrói o índice inteiro a partir de ticket e comment. Retorna o número de chamados indexados."""
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    result = conn.execute(text(f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, description, comments)
+        SELECT t.id, t.title, t.description,
+               COALESCE((SELECT group_concat(c.content, ' ') FROM comment c WHERE c.ticket_id = t.id), '')
+        FROM ticket t
+    """))
+    conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"))
+    return result.rowcount
+
+
+def build_match_query(query_text):
+    """Converte o texto digitado numa expressão FTS5 segura: cada termo vira um prefixo entre aspas."""
+    terms = re.findall(r'\w+', query_text, flags=re.UNICODE)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _exact_id(query_text):
+    match = re.fullmatch(r'\s*#?(\d+)\s*', query_text)
+    return int(match.group(1)) if match else None
+
+
+# Marcadores que não aparecem em texto digitado; trocados por <mark> depois do escape do HTML
+_HIGHLIGHT_START, _HIGHLIGHT_END = '\x02', '\x03'
+
+
+def highlight(snippet):
+    if not snippet:
+        return None
+    escaped = str(escape(snippet))
+    return Markup(escaped.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+def search_tickets(session, base_query, query_text, limit=200, model=Ticket, fts_table=FTS_TABLE):
+    """
+    Aplica a busca a uma consulta de chamados que já traz o filtro de visibilidade.
+    Retorna (chamados em ordem de relevância, {ticket_id: trecho destacado}).
+    Um número (ou "#número") que corresponda a um chamado visível é resolvido direto pelo ID.
+    model e fts_table permitem buscar no arquivo morto (ver app/archive.py); fts_table=None usa o LIKE.
+    """
+    ticket_id = _exact_id(query_text)
+    if ticket_id is not None:
+        ticket = base_query.filter(model.id == ticket_id).first()
+        if ticket:
+            return [ticket], {}
+
+    match_query = build_match_query(query_text)
+    if match_query is None:
+        return [], {}
+
+    if fts_table is None or (fts_table == FTS_TABLE and not is_available(session)):
+        search_term = f"%{query_text}%"
+        # Sem relevância para ordenar: os alterados mais recentemente primeiro, com ordem estável entre páginas e bancos
+        tickets = base_query.filter(or_(model.title.ilike(search_term), cast(model.id, String).ilike(search_term))).order_by(
+            model.updated_at.desc(), model.id.desc()
+        ).limit(limit).all()
+        return tickets, {}
+
+    # Nas funções do FTS5 a tabela é citada pelo nome sem o esquema (ex.: archive.ticket_fts -> ticket_fts)
+    name = fts_table.rsplit('.', 1)[-1]
+    matches = text(f"""
+        SELECT rowid AS ticket_id,
+               bm25({name}, 10.0, 3.0, 1.0) AS rank,
+               snippet({name}, -1, :hl_start, :hl_end, '…', 16) AS snippet
+        FROM {fts_table} WHERE {name} MATCH :match
+    """).bindparams(match=match_query, hl_start=_HIGHLIGHT_START, hl_end=_HIGHLIGHT_END).columns(
+        ticket_id=Integer, rank=Float, snippet=String
+    ).subquery('matches')
+
+    rows = base_query.join(matches, matches.c.ticket_id == model.id).add_columns(matches.c.snippet).order_by(
+        matches.c.rank
+    ).limit(limit).all()
+    tickets = [ticket for ticket, _ in rows]
+    snippets = {ticket.id: highlight(snippet) for ticket, snippet in rows}
+    return tickets, snippets
@@ -0,0 +1,183 @@
+"""
+Gerador de dados sintéticos para desenvolvimento e benchmarks ("flask seed").
+
+Preenche todas as tabelas com distribuições parecidas com as de produção:
+a maior parte dos chamados vai para a TI, a maioria já está fechada, cada
+chamado tem um histórico de status coerente, alguns comentários e uma
+notificação; o chat concentra a conversa de cada usuário em poucos parceiros.
+As linhas são inseridas em lotes (executemany) e o índice de busca, o resumo
+das conversas e o agregado dos relatórios são reconstruídos uma vez no final,
+o que permite chegar a 10^6 chamados em poucos minutos.
+
+O gerador é determinístico: a mesma semente produz o mesmo banco.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert, func
+from werkzeug.security import generate_password_hash
+from app import db
+from app.models import User, Ticket, Comment, TicketHistory, Notification, ChatMessage
+
+SEED_PASSWORD = 'senha123'
+
+SECTORS = ['TI', 'Vendas', 'Faturamento', 'Contas a Pagar', 'Contas a Receber', 'RH', 'Marketing', 'Outros']
+TARGET_SECTOR_WEIGHTS = [45, 8, 10, 7, 7, 10, 5, 8]
+PRIORITIES = ['baixa', 'media', 'alta']
+PRIORITY_WEIGHTS = [50, 35, 15]
+STATUSES = ['Aberto', 'Em Atendimento', 'Resolvido', 'Fechado']
+STATUS_WEIGHTS = [12, 13, 10, 65]
+
+PROBLEMS = ['Impressora', 'Computador', 'Sistema de vendas', 'E-mail', 'VPN', 'Planilha de faturamento',
+            'Nota fiscal', 'Acesso à rede', 'Telefone', 'Boleto', 'Folha de pagamento', 'Monitor',
+            'Certificado digital', 'Backup', 'Senha do ERP', 'Relatório mensal']
+SYMPTOMS = ['não liga', 'está lento', 'apresenta erro', 'não imprime', 'travou', 'sem acesso',
+            'não sincroniza', 'fora do ar', 'com divergência de valores', 'pede atualização']
+DETAILS = ['desde a manhã de hoje', 'depois da última atualização', 'apenas no meu usuário',
+           'para todo o setor', 'ao emitir o relatório', 'quando tento salvar o arquivo',
+           'com a mensagem "acesso negado"', 'de forma intermitente']
+COMMENTS = ['Verificando o problema.', 'Pode reiniciar o equipamento e testar novamente?',
+            'Reiniciei e continua igual.', 'Atualização aplicada, favor validar.', 'Funcionou, obrigado!',
+            'Encaminhado para o fornecedor.', 'Aguardando retorno do usuário.', 'Senha redefinida.']
+CHAT_LINES = ['Bom dia!', 'Consegue ver meu chamado?', 'Já estou verificando.', 'Obrigado!',
+              'Pode me ligar?', 'Reiniciei aqui.', 'Ficou resolvido?', 'Vou abrir um chamado.']
+
+
+def _batched_insert(model, rows, batch_size):
+    # render_nulls: sem ele, cada troca entre valor e NULL numa coluna quebra o executemany em outra instrução
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(model), rows[start:start + batch_size], execution_options={'render_nulls': True})
+
+
+def seed_database(tickets=1000, seed=42, days=365, batch_size=5000, progress=None):
+    """
+    Gera `tickets` chamados e os dados relacionados proporcionais a eles.
+    Retorna um dicionário com a quantidade de linhas inseridas por tabela.
+    """
+    from app import search, reports, archive
+    from app.chat import rebuild_conversations
+
+    rng = random.Random(seed)
+    report = progress or (lambda message: None)
+    started = time.monotonic()
+    now = datetime.utcnow().replace(microsecond=0)
+    counts = {}
+
+    # --- USUÁRIOS ---
+    password = generate_password_hash(SEED_PASSWORD, method='pbkdf2:sha256')
+    user_count = max(20, tickets // 100)
+    first_user = (db.session.query(func.max(User.id)).scalar() or 0) + 1
+    users = []
+    for i in range(user_count):
+        level = 'administrador' if i < 2 else ('tecnico' if i % 6 == 0 else 'colaborador')
+        sector = 'TI' if level != 'colaborador' and i % 4 != 0 else rng.choice(SECTORS)
+        users.append({'id': first_user + i, 'name': f'Usuário {first_user + i}', 'email': f'usuario{first_user + i}@empresa.com',
+                      'sector': sector, 'password': password, 'access_level': level, 'is_active': True,
+                      'created_at': now - timedelta(days=days + 30)})
+    _batched_insert(User, users, batch_size)
+    counts['user'] = len(users)
+    technicians_by_sector = {}
+    for user in users:
+        if user['access_level'] != 'colaborador':
+            technicians_by_sector.setdefault(user['sector'], []).append(user['id'])
+    all_technicians = [uid for ids in technicians_by_sector.values() for uid in ids]
+    user_ids = [user['id'] for user in users]
+    report(f'{len(users)} usuários')
+
+    fts = search.is_available(db.session)
+    if fts:
+        search.drop_triggers(db.session.connection())
+    db.session.commit()
+
+    try:
+        # --- CHAMADOS, HISTÓRICO, COMENTÁRIOS E NOTIFICAÇÕES (em blocos, para limitar a memória) ---
+        # IDs explícitos acima dos ativos e dos arquivados (a tabela nunca reaproveita IDs, migração 9)
+        first_ticket = max(db.session.query(func.max(Ticket.id)).scalar() or 0, archive.archived_max_id()) + 1
+        counts.update({'ticket': 0, 'ticket_history': 0, 'comment': 0, 'notification': 0})
+        for block_start in range(0, tickets, batch_size):
+            ticket_rows, history_rows, comment_rows, notification_rows = [], [], [], []
+            for n in range(block_start, min(tickets, block_start + batch_size)):
+                ticket_id = first_ticket + n
+                author = rng.choice(user_ids)
+                target = rng.choices(SECTORS, TARGET_SECTOR_WEIGHTS)[0]
+                status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+                created = now - timedelta(seconds=rng.randint(0, days * 86400))
+                # Tempo até cada etapa: log-normal, como filas de atendimento reais (mediana de algumas horas)
+                steps = [created]
+                for _ in range(STATUSES.index(status)):
+                    steps.append(min(now, steps[-1] + timedelta(hours=rng.lognormvariate(1.5, 1.2))))
+                technicians = technicians_by_sector.get(target) or all_technicians
+                assignee = rng.choice(technicians) if status != 'Aberto' else None
+
+                ticket_rows.append({
+                    'id': ticket_id, 'title': f'{rng.choice(PROBLEMS)} {rng.choice(SYMPTOMS)}',
+                    'description': f'{rng.choice(PROBLEMS)} {rng.choice(SYMPTOMS)} {rng.choice(DETAILS)}.',
+                    'user_id': author, 'origin_sector': rng.choice(SECTORS), 'target_sector': target,
+                    'priority': rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0], 'status': status,
+                    'created_at': created, 'updated_at': steps[-1],
+                    'closed_at': steps[-1] if status == 'Fechado' else None, 'assigned_to': assignee,
+                })
+                history_rows.append({'ticket_id': ticket_id, 'changed_by_user_id': author, 'field_changed': 'status',
+                                     'old_value': 'N/A', 'new_value': 'Aberto', 'timestamp': created})
+                for index in range(1, len(steps)):
+                    history_rows.append({'ticket_id': ticket_id, 'changed_by_user_id': assignee, 'field_changed': 'status',
+                                         'old_value': STATUSES[index - 1], 'new_value': STATUSES[index], 'timestamp': steps[index]})
+                span = max(1, int((steps[-1] - created).total_seconds()))
+                for _ in range(min(6, int(rng.expovariate(0.6)))):
+                    comment_rows.append({'content': rng.choice(COMMENTS), 'user_id': rng.choice([author, assignee or author]),
+                                         'ticket_id': ticket_id, 'created_at': created + timedelta(seconds=rng.randint(0, span))})
+                notification_rows.append({'user_id': author, 'ticket_id': ticket_id, 'is_read': steps[-1] < now - timedelta(days=2),
+                                          'message': f"Chamado #{ticket_id} alterado para {status}.", 'created_at': steps[-1]})
+
+            _batched_insert(Ticket, ticket_rows, batch_size)
+            _batched_insert(TicketHistory, history_rows, batch_size)
+            _batched_insert(Comment, comment_rows, batch_size)
+            _batched_insert(Notification, notification_rows, batch_size)
+            db.session.commit()
+            counts['ticket'] += len(ticket_rows)
+            counts['ticket_history'] += len(history_rows)
+            counts['comment'] += len(comment_rows)
+            counts['notification'] += len(notification_rows)
+            report(f"{counts['ticket']} chamados")
+
+        # --- CHAT: cada usuário conversa principalmente com alguns parceiros ---
+        # Sorteia um a mais e descarta o próprio usuário, que nunca é parceiro de si mesmo (O(n), não O(n²))
+        partners = {}
+        for uid in user_ids:
+            sampled = [other for other in rng.sample(user_ids, min(6, len(user_ids))) if other != uid]
+            partners[uid] = sampled[:5]
+        message_count = tickets // 2
+        counts['chat_message'] = 0
+        for block_start in range(0, message_count, batch_size):
+            rows = []
+            for _ in range(block_start, min(message_count, block_start + batch_size)):
+                sender = rng.choice(user_ids)
+                recipient = rng.choice(partners[sender])
+                timestamp = now - timedelta(seconds=rng.randint(0, days * 86400))
+                rows.append({'sender_id': sender, 'recipient_id': recipient, 'content': rng.choice(CHAT_LINES),
+                             'timestamp': timestamp, 'is_read': timestamp < now - timedelta(hours=6)})
+            _batched_insert(ChatMessage, rows, batch_size)
+            db.session.commit()
+            counts['chat_message'] += len(rows)
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        # Religa os triggers e refaz o índice mesmo se a carga parar no meio (os blocos já gravados ficam)
+        if fts:
+            conn = db.session.connection()
+            search.create_index(conn)
+            search.rebuild_index(conn)
+            db.session.commit()
+
+    # --- ESTRUTURAS DERIVADAS ---
+    rebuild_conversations(db.session.connection())
+    db.session.commit()
+    report('resumo do chat e índice de busca reconstruídos')
+    reports.refresh_daily_rollup()
+    from app import dashboard, request_cache
+    dashboard.invalidate()
+    request_cache.invalidate()
+
+    counts['seconds'] = round(time.monotonic() - started, 1)
+    return counts
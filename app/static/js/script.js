@@ -1,11 +1,31 @@
+// --- POLLING COM REQUISIÇÃO CONDICIONAL (ETag / If-None-Match) ---
+// Guarda o último ETag de cada endpoint e o reenvia; se nada mudou o servidor
+// responde 304 sem corpo e a promessa resolve com null (assim como no 204).
+const pollingETags = new Map();
+
+function fetchJSONIfChanged(url) {
+    const key = new URL(url, window.location.href).pathname;
+    const etag = pollingETags.get(key);
+    return fetch(url, { headers: etag ? { 'If-None-Match': etag } : {}, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304 || response.status === 204) return null;
+            if (!response.ok) return Promise.reject('A resposta da rede não foi OK');
+            const newETag = response.headers.get('ETag');
+            if (newETag) pollingETags.set(key, newETag);
+            return response.json();
+        });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     
     // --- LÓGICA DOS GRÁFICOS (DASHBOARD) ---
+    const charts = {};
+
     // Alterado de PIE para BAR (Colunas)
     const statusCtx = document.getElementById('statusChart');
     if (statusCtx) {
         const statusData = JSON.parse(statusCtx.dataset.chartdata);
-        new Chart(statusCtx, {
+        charts.status = new Chart(statusCtx, {
             type: 'bar', // Mudado para barras (colunas)
             data: {
                 labels: statusData.map(d => d.status),
@@ -36,7 +56,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const sectorCtx = document.getElementById('sectorChart');
     if (sectorCtx) {
         const sectorData = JSON.parse(sectorCtx.dataset.chartdata);
-        new Chart(sectorCtx, {
+        charts.sector = new Chart(sectorCtx, {
             type: 'bar',
             data: {
                 labels: sectorData.map(d => d.sector),
@@ -67,7 +87,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const priorityCtx = document.getElementById('priorityChart');
     if (priorityCtx) {
         const priorityData = JSON.parse(priorityCtx.dataset.chartdata);
-        new Chart(priorityCtx, {
+        charts.priority = new Chart(priorityCtx, {
             type: 'bar', // Mudado para barras
             data: {
                 labels: priorityData.map(d => d.priority),
@@ -94,13 +114,160 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Atualiza os gráficos pelo endpoint JSON, sem recarregar a página (só com a aba visível)
+    const dashboardMetrics = document.getElementById('dashboardMetrics');
+    if (dashboardMetrics) {
+        function setChartData(chart, items, labelKey) {
+            if (!chart) return;
+            chart.data.labels = items.map(d => d[labelKey]);
+            chart.data.datasets[0].data = items.map(d => d.count);
+            chart.update();
+        }
+
+        function refreshDashboard() {
+            if (document.hidden) return;
+            fetch(dashboardMetrics.dataset.metricsUrl)
+                .then(response => response.ok ? response.json() : null)
+                .then(metrics => {
+                    if (!metrics) return;
+                    setChartData(charts.status, metrics.status_data, 'status');
+                    setChartData(charts.sector, metrics.sector_data, 'sector');
+                    setChartData(charts.priority, metrics.priority_data, 'priority');
+                    document.getElementById('totalTickets').textContent = metrics.total_tickets;
+                })
+                .catch(error => console.error('Erro ao atualizar o dashboard:', error));
+        }
+
+        setInterval(refreshDashboard, parseInt(dashboardMetrics.dataset.refreshSeconds, 10) * 1000);
+        document.addEventListener('visibilitychange', refreshDashboard);
+    }
+
     // --- LÓGICA DO KANBAN DRAG-AND-DROP ---
     const kanbanContainer = document.querySelector('.kanban-container');
     if (kanbanContainer) {
         const kanbanColumns = document.querySelectorAll('.kanban-column-body');
+
+        function updateColumnCount(column, delta) {
+            const badge = column.closest('.kanban-column').querySelector('.kanban-column-count');
+            if (badge) badge.textContent = Math.max(0, parseInt(badge.textContent, 10) + delta);
+        }
+
+        // --- CARREGAMENTO SOB DEMANDA DAS COLUNAS (PAGINAÇÃO POR CURSOR) ---
+        function loadMoreTickets(column) {
+            const cursor = column.dataset.nextCursor;
+            if (!cursor || column.dataset.loading === 'true') return;
+            column.dataset.loading = 'true';
+            const params = new URLSearchParams({ status: column.dataset.status, cursor: cursor });
+            fetch(`/api/kanban/column?${params}`)
+                .then(response => response.ok ? response.json() : Promise.reject('A resposta da rede não foi OK'))
+                .then(data => {
+                    const sentinel = column.querySelector('.kanban-sentinel');
+                    const template = document.createElement('template');
+                    template.innerHTML = data.html;
+                    // Cards que já foram arrastados para esta coluna não são duplicados
+                    template.content.querySelectorAll('.kanban-card').forEach(card => {
+                        if (document.querySelector(`.kanban-card[data-ticket-id="${card.dataset.ticketId}"]`)) card.remove();
+                    });
+                    column.insertBefore(template.content, sentinel);
+                    column.dataset.nextCursor = data.next_cursor || '';
+                    if (!data.next_cursor && sentinel) sentinel.remove();
+                })
+                .catch(error => console.error('Erro ao carregar mais chamados:', error))
+                .finally(() => {
+                    column.dataset.loading = 'false';
+                });
+        }
+
+        if ('IntersectionObserver' in window) {
+            const observer = new IntersectionObserver(entries => {
+                entries.forEach(entry => {
+                    if (entry.isIntersecting) loadMoreTickets(entry.target.closest('.kanban-column-body'));
+                });
+            }, { rootMargin: '200px' });
+            document.querySelectorAll('.kanban-sentinel').forEach(sentinel => observer.observe(sentinel));
+        } else {
+            kanbanColumns.forEach(column => column.addEventListener('scroll', () => {
+                if (column.scrollTop + column.clientHeight >= column.scrollHeight - 100) loadMoreTickets(column);
+            }));
+        }
+
+        // --- SELEÇÃO MÚLTIPLA E ALTERAÇÃO EM MASSA ---
+        const bulkBar = document.getElementById('kanban-bulk-bar');
+        const selectedCards = () => Array.from(document.querySelectorAll('.kanban-card.kanban-selected'));
+
+        function refreshBulkBar() {
+            if (!bulkBar) return;
+            const count = selectedCards().length;
+            document.getElementById('kanban-bulk-count').textContent = count;
+            bulkBar.classList.toggle('d-none', count === 0);
+        }
+
+        function clearSelection() {
+            selectedCards().forEach(card => {
+                card.classList.remove('kanban-selected');
+                card.querySelector('.kanban-select').checked = false;
+            });
+            refreshBulkBar();
+        }
+
+        // Delegação: vale também para os cards carregados depois pela paginação
+        kanbanContainer.addEventListener('change', event => {
+            if (!event.target.classList.contains('kanban-select')) return;
+            event.target.closest('.kanban-card').classList.toggle('kanban-selected', event.target.checked);
+            refreshBulkBar();
+        });
+
+        function bulkUpdate(ticketIds, changes) {
+            return fetch('/api/tickets/bulk_update', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ticket_ids: ticketIds, changes: changes })
+            })
+            .then(response => response.json().then(data => {
+                if (!data.results) throw new Error(data.message || 'Erro no servidor');
+                return data;
+            }));
+        }
+
+        function reportFailures(data) {
+            const failures = data.results.filter(result => !result.success);
+            if (failures.length) {
+                alert('Alguns chamados não foram alterados:\n' + failures.map(result => `#${result.id}: ${result.message}`).join('\n'));
+            }
+            return failures;
+        }
+
+        if (bulkBar) {
+            document.getElementById('kanban-bulk-clear').addEventListener('click', clearSelection);
+            document.getElementById('kanban-bulk-apply').addEventListener('click', () => {
+                const changes = {};
+                const status = document.getElementById('kanban-bulk-status').value;
+                const priority = document.getElementById('kanban-bulk-priority').value;
+                const assignee = document.getElementById('kanban-bulk-assignee').value;
+                if (status) changes.status = status;
+                if (priority) changes.priority = priority;
+                if (assignee !== '') changes.assigned_to = parseInt(assignee, 10);
+                if (!Object.keys(changes).length) {
+                    alert('Escolha ao menos uma alteração.');
+                    return;
+                }
+                const ticketIds = selectedCards().map(card => parseInt(card.dataset.ticketId, 10));
+                bulkUpdate(ticketIds, changes)
+                    .then(data => {
+                        reportFailures(data);
+                        // Cards, contadores e cores mudam juntos: recarregar o quadro é o mais simples
+                        if (data.updated) window.location.reload();
+                    })
+                    .catch(error => alert('Não foi possível atualizar os chamados. ' + error.message));
+            });
+        }
+
         kanbanColumns.forEach(column => {
             new Sortable(column, {
                 group: 'kanban',
+                draggable: '.kanban-card',
+                filter: '.kanban-select',
+                preventOnFilter: false,
                 animation: 150,
                 ghostClass: 'sortable-ghost',
                 dragClass: 'sortable-drag',
@@ -108,34 +275,37 @@ document.addEventListener('DOMContentLoaded', function() {
                     const itemEl = evt.item;
                     const toColumn = evt.to;
                     const fromColumn = evt.from;
-                    const ticketId = itemEl.dataset.ticketId;
                     const newStatus = toColumn.dataset.status;
                     const oldStatus = fromColumn.dataset.status;
+                    if (newStatus === oldStatus) return;
 
-                    if (newStatus !== oldStatus) {
-                        fetch(`/update_ticket_status/${ticketId}`, {
-                            method: 'POST',
-                            headers: { 'Content-Type': 'application/json' },
-                            body: JSON.stringify({ new_status: newStatus })
-                        })
-                        .then(response => {
-                            if (!response.ok) {
-                                return response.json().then(err => { throw new Error(err.message || 'Erro no servidor') });
-                            }
-                            return response.json();
-                        })
+                    // Arrastar um card marcado leva junto todos os marcados
+                    const cards = itemEl.classList.contains('kanban-selected') ? selectedCards() : [itemEl];
+                    const origins = new Map(cards.map(card => [card, card.parentElement]));
+                    cards.forEach(card => {
+                        if (card !== itemEl) toColumn.insertBefore(card, itemEl.nextSibling);
+                        updateColumnCount(origins.get(card), -1);
+                        updateColumnCount(toColumn, 1);
+                    });
+                    const revertMove = card => {
+                        const origin = origins.get(card);
+                        origin.insertBefore(card, origin.querySelector('.kanban-sentinel'));
+                        updateColumnCount(toColumn, -1);
+                        updateColumnCount(origin, 1);
+                    };
+                    const ticketIds = cards.map(card => parseInt(card.dataset.ticketId, 10));
+                    bulkUpdate(ticketIds, { status: newStatus })
                         .then(data => {
-                            if (!data.success) {
-                                fromColumn.appendChild(itemEl); 
-                                alert('Erro ao atualizar o chamado: ' + data.message);
-                            }
+                            reportFailures(data).forEach(result => {
+                                revertMove(document.querySelector(`.kanban-card[data-ticket-id="${result.id}"]`));
+                            });
+                            if (cards.length > 1) clearSelection();
                         })
                         .catch(error => {
                             console.error('Erro:', error);
-                            fromColumn.appendChild(itemEl);
+                            cards.forEach(revertMove);
                             alert('Não foi possível atualizar o chamado. ' + error.message);
                         });
-                    }
                 }
             });
         });
@@ -196,6 +366,58 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
 
+        // --- TEMPO REAL (SSE) COM POLLING COMO ALTERNATIVA ---
+        // Com o stream aberto o servidor envia os eventos; se o navegador não
+        // suportar EventSource ou o servidor recusar o stream, volta ao polling.
+        // O barramento de eventos é do processo: o que for publicado enquanto o
+        // stream reconecta, ou em outro worker, não chega por ele. Por isso, a
+        // cada abertura do stream os pollers rodam uma vez (as notificações ficam
+        // gravadas e o /check_updates parte do cursor) e, com ele aberto, seguem
+        // em um ritmo lento.
+        const STREAM_POLL_INTERVAL = 60000;
+        const realtime = { pollers: [], timers: [], interval: null, onTicket: null, onChat: null };
+
+        function startPolling(interval) {
+            // interval: ritmo único (stream aberto); sem ele, cada poller no seu ritmo normal
+            const mode = interval || 'normal';
+            if (realtime.interval === mode) return;
+            stopPolling();
+            realtime.interval = mode;
+            realtime.timers = realtime.pollers.map(p => setInterval(p.fn, interval || p.interval));
+        }
+
+        function stopPolling() {
+            realtime.timers.forEach(clearInterval);
+            realtime.timers = [];
+            realtime.interval = null;
+        }
+
+        function connectEventStream() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            const source = new EventSource('/stream');
+            source.addEventListener('open', () => {
+                // Recupera o que foi publicado enquanto o stream estava fechado
+                realtime.pollers.forEach(p => p.fn());
+                startPolling(STREAM_POLL_INTERVAL);
+            });
+            source.addEventListener('ticket', e => realtime.onTicket && realtime.onTicket(JSON.parse(e.data)));
+            source.addEventListener('chat', e => {
+                const data = JSON.parse(e.data);
+                if (realtime.onChat) realtime.onChat(data);
+                document.dispatchEvent(new CustomEvent('chat:message', { detail: data }));
+            });
+            source.addEventListener('error', () => {
+                // O EventSource reconecta sozinho; enquanto isso o polling cobre a lacuna
+                startPolling();
+                if (source.readyState === EventSource.CLOSED) {
+                    source.close();
+                }
+            });
+        }
+
         // --- NOTIFICAÇÕES DE CHAMADOS (TICKETS) ---
         const updateToastEl = document.getElementById('updateToast');
         if (updateToastEl) {
@@ -204,27 +426,51 @@ document.addEventListener('DOMContentLoaded', function() {
             const toastLinkEl = document.getElementById('toast-link');
             const ticketNotificationSound = document.getElementById('notification-sound');
 
+            // Cursor da última notificação recebida (pelo stream ou pelo polling)
+            let notificationCursor = null;
+
+            function markNotificationsRead(upTo) {
+                fetch('/api/notifications/mark_read', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ up_to: upTo })
+                }).catch(error => console.error('Erro ao marcar notificações como lidas:', error));
+            }
+
+            function showTicketUpdate(update) {
+                if (update.id && (notificationCursor === null || update.id > notificationCursor)) {
+                    notificationCursor = update.id;
+                }
+                toastMessageEl.textContent = update.message;
+                toastLinkEl.href = update.url;
+                updateToast.show();
+
+                if (soundEnabled && ticketNotificationSound) {
+                    ticketNotificationSound.play().catch(error => console.log("A reprodução do som falhou:", error));
+                }
+            }
+
             function checkForTicketUpdates() {
-                fetch('/check_updates')
-                    .then(response => response.ok ? response.json() : Promise.reject('A resposta da rede não foi OK'))
+                const url = notificationCursor === null ? '/check_updates' : `/check_updates?since=${notificationCursor}`;
+                fetchJSONIfChanged(url)
                     .then(data => {
+                        if (data === null) return; // Nada mudou desde a última verificação
                         if (data.updates && data.updates.length > 0) {
-                            data.updates.forEach(update => {
-                                toastMessageEl.textContent = update.message;
-                                toastLinkEl.href = update.url;
-                                updateToast.show();
-
-                                if (soundEnabled && ticketNotificationSound) {
-                                    ticketNotificationSound.play().catch(error => console.log("A reprodução do som falhou:", error));
-                                }
-                            });
+                            data.updates.forEach(showTicketUpdate);
+                            markNotificationsRead(data.cursor);
                         }
+                        notificationCursor = data.cursor;
                     })
                     .catch(error => {
                         console.error('Erro ao verificar atualizações de chamados:', error);
                     });
             }
-            setInterval(checkForTicketUpdates, 15000);
+            realtime.onTicket = update => {
+                showTicketUpdate(update);
+                markNotificationsRead(update.id);
+            };
+            realtime.pollers.push({ fn: checkForTicketUpdates, interval: 15000 });
+            checkForTicketUpdates(); // Obtém o cursor inicial
         }
 
         // --- NOTIFICAÇÕES DE CHAT (GLOBAL) ---
@@ -233,9 +479,9 @@ document.addEventListener('DOMContentLoaded', function() {
         let knownUnreadSenders = new Set();
 
         function checkUnreadChatMessages() {
-            fetch('/api/chat/unread_info')
-                .then(response => response.ok ? response.json() : Promise.reject('Resposta de rede não foi OK'))
+            fetchJSONIfChanged('/api/chat/unread_info')
                 .then(data => {
+                    if (data === null) return; // Nada mudou desde a última verificação
                     const unreadSenders = new Set(data.unread_senders || []);
 
                     if (unreadSenders.size > 0) {
@@ -265,9 +511,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
         }
         
-        // Verifica por novas mensagens de chat a cada 10 segundos
+        // Verifica por novas mensagens de chat a cada 10 segundos (apenas sem o stream)
         checkUnreadChatMessages();
-        setInterval(checkUnreadChatMessages, 10000);
+        realtime.onChat = checkUnreadChatMessages;
+        realtime.pollers.push({ fn: checkUnreadChatMessages, interval: 10000 });
+
+        connectEventStream();
     }
     
     // --- LÓGICA PARA IMPRIMIR RELATÓRIO ---
@@ -0,0 +1,120 @@
+"""
+Alteração de status, prioridade e responsável de chamados, de um ou de vários
+de uma vez (seleção múltipla no kanban, triagem em massa), sempre em uma única
+transação. A tela do chamado e a rota em massa (que também recebe o arrastar
+de um card no kanban, com um só chamado) passam por apply_changes:
+- os nomes dos responsáveis (antigos e novo) saem de uma única consulta;
+- os chamados mudam em um único UPDATE por chave primária (executemany);
+- o histórico de todos os chamados vai em um único INSERT, e as notificações
+  de mudança de status em outro.
+A permissão é checada para o conjunto (editable_ids), com o mesmo filtro de
+visibilidade das listagens; quem chama faz o commit e, se touches_closings,
+consolida o agregado dos relatórios (reports.refresh_daily_rollup).
+"""
+from datetime import datetime
+from sqlalchemy import insert, update
+from app import db
+from app import notifications
+from app.forms import TicketUpdateForm
+from app.models import User, Ticket, TicketHistory
+
+STATUSES = [value for value, _ in TicketUpdateForm.status.kwargs['choices']]
+PRIORITIES = [value for value, _ in TicketUpdateForm.priority.kwargs['choices']]
+FIELDS = ('status', 'priority', 'assigned_to')
+
+
+class ChangeError(ValueError):
+    pass
+
+
+def validate_changes(data):
+    """
+    Normaliza as alterações pedidas ({'status', 'priority', 'assigned_to'}, todas
+    opcionais; assigned_to 0 ou None tira o responsável). Levanta ChangeError.
+    """
+    if not isinstance(data, dict):
+        raise ChangeError('Alterações inválidas.')
+    changes = {field: data[field] for field in FIELDS if field in data}
+    if not changes:
+        raise ChangeError('Nenhuma alteração informada.')
+    if 'status' in changes and changes['status'] not in STATUSES:
+        raise ChangeError('Status inválido.')
+    if 'priority' in changes and changes['priority'] not in PRIORITIES:
+        raise ChangeError('Prioridade inválida.')
+    if 'assigned_to' in changes:
+        assignee = changes['assigned_to']
+        if assignee is not None and (isinstance(assignee, bool) or not isinstance(assignee, int)):
+            raise ChangeError('Responsável inválido.')
+        changes['assigned_to'] = assignee or None
+    return changes
+
+
+def editable_ids(visible_query, ticket_ids):
+    """IDs, entre os pedidos, que o usuário pode alterar (visible_query já traz o filtro de visibilidade)."""
+    return {ticket_id for ticket_id, in visible_query.filter(Ticket.id.in_(ticket_ids)).with_entities(Ticket.id)}
+
+
+def touches_closings(tickets, changes, applied):
+    """
+    Se alguma alteração gravada foi em chamado fechado, antes ou depois dela (o agregado dos
+    relatórios muda). Chame antes do commit, enquanto os chamados têm os valores antigos.
+    """
+    return any(ticket.id in applied and 'Fechado' in (ticket.status, changes.get('status')) for ticket in tickets)
+
+
+def _user_names(tickets, new_assignee):
+    """{id: (nome, pode atender)} dos responsáveis atuais e do novo, em uma consulta."""
+    ids = {ticket.assigned_to for ticket in tickets} | {new_assignee}
+    ids.discard(None)
+    if not ids:
+        return {}
+    rows = db.session.query(User.id, User.name, User.access_level, User.is_active).filter(User.id.in_(ids))
+    return {uid: (name, is_active and access_level in ('tecnico', 'administrador'))
+            for uid, name, access_level, is_active in rows}
+
+
+def apply_changes(tickets, changes, user, now=None):
+    """
+    Grava as alterações (já validadas) dos chamados carregados, sem commit; os
+    objetos em memória não são atualizados. Retorna ({id do chamado: [(campo, antigo, novo), ...]} dos que mudaram,
+    notificações criadas, para notifications.publish depois do commit).
+    """
+    now = now or datetime.utcnow()
+    new_assignee = changes.get('assigned_to')
+    names = {}
+    if 'assigned_to' in changes and any(ticket.assigned_to != new_assignee for ticket in tickets):
+        names = _user_names(tickets, new_assignee)
+        if new_assignee is not None and not names.get(new_assignee, (None, False))[1]:
+            raise ChangeError('Responsável inválido.')
+
+    applied, rows, history, messages = {}, [], [], []
+    for ticket in tickets:
+        changed = []
+        status, priority, closed_at = ticket.status, ticket.priority, ticket.closed_at
+        assignee = ticket.assigned_to
+        if changes.get('status', status) != status:
+            changed.append(('status', status, changes['status']))
+            status = changes['status']
+            closed_at = now if status == 'Fechado' else None
+        if changes.get('priority', priority) != priority:
+            changed.append(('priority', priority, changes['priority']))
+            priority = changes['priority']
+        if 'assigned_to' in changes and new_assignee != assignee:
+            changed.append(('assigned_to', names.get(assignee, ('N/A',))[0], names.get(new_assignee, ('N/A',))[0]))
+            assignee = new_assignee
+        if not changed:
+            continue
+        applied[ticket.id] = changed
+        # Todas as linhas com as mesmas colunas: o UPDATE por chave primária vira um único executemany
+        rows.append({'id': ticket.id, 'status': status, 'priority': priority, 'closed_at': closed_at,
+                     'assigned_to': assignee, 'updated_at': now})
+        history.extend({'ticket_id': ticket.id, 'changed_by_user_id': user.id, 'field_changed': field,
+                        'old_value': old, 'new_value': new, 'timestamp': now} for field, old, new in changed)
+        if status != ticket.status:
+            messages.append(({ticket.user_id, assignee} - {user.id}, ticket.id,
+                             f"Chamado #{ticket.id}: '{ticket.title}' alterado para {status} por {user.name}."))
+
+    if rows:
+        db.session.execute(update(Ticket), rows)
+        db.session.execute(insert(TicketHistory), history)
+    return applied, notifications.notify_many(messages)
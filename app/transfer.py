@@ -0,0 +1,313 @@
+"""
+Exportação e importação em massa de chamados, com comentários e histórico.
+
+Exportação: os chamados são lidos em lotes por chave (id > último id, LIMIT
+batch_size) e os comentários e o histórico de cada lote em uma consulta por
+tabela. As linhas saem de um gerador, então a memória não cresce com o tamanho
+da base, tanto na rota /export (resposta em streaming) quanto no "flask tickets-export".
+- json: uma linha JSON por chamado (JSON Lines), com comments e history
+  aninhados; é o formato lido pela importação;
+- csv: uma linha por chamado, comentário ou alteração (kind=tickets|comments|history).
+Usuários aparecem pelo e-mail, para que o arquivo sirva em outra instalação.
+
+Importação: lê JSON Lines (formato acima) ou um CSV de chamados e grava em
+lotes de batch_size chamados por transação (executemany). Os chamados recebem
+IDs novos, dados pelo próprio SQLite no INSERT (RETURNING, na ordem das linhas), e
+os comentários e o histórico do lote são ligados a eles em seguida: chamados
+abertos durante a importação nunca disputam o mesmo ID. E-mails desconhecidos
+ficam com o usuário padrão. Linhas inválidas, e lotes que o banco recusar, são
+pulados e relatados, sem interromper o restante.
+"""
+import csv
+import io
+import json
+import time as timer
+from datetime import datetime, time, timedelta
+from sqlalchemy import select, insert, or_, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import aliased
+from app import db
+from app.forms import TicketForm
+from app.models import User, Ticket, Comment, TicketHistory
+
+STATUSES = ['Aberto', 'Em Atendimento', 'Resolvido', 'Fechado']
+SECTORS = [value for value, _ in TicketForm.target_sector.kwargs['choices']]
+PRIORITIES = [value for value, _ in TicketForm.priority.kwargs['choices']]
+
+TICKET_FIELDS = ['id', 'title', 'description', 'origin_sector', 'target_sector', 'priority', 'status',
+                 'created_at', 'updated_at', 'closed_at', 'author_email', 'assignee_email', 'attachment_filename']
+COMMENT_FIELDS = ['ticket_id', 'content', 'author_email', 'created_at', 'attachment_filename']
+HISTORY_FIELDS = ['ticket_id', 'field_changed', 'old_value', 'new_value', 'changed_by_email', 'timestamp']
+CSV_FIELDS = {'tickets': TICKET_FIELDS, 'comments': COMMENT_FIELDS, 'history': HISTORY_FIELDS}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+# --- EXPORTAÇÃO ---
+
+def ticket_filters(start=None, end=None, sector=None, status=None):
+    """Condições sobre Ticket: criação entre start e end (datas, inclusive), setor de origem ou destino e status."""
+    conditions = []
+    if start:
+        conditions.append(Ticket.created_at >= datetime.combine(start, time.min))
+    if end:
+        conditions.append(Ticket.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    if sector:
+        conditions.append(or_(Ticket.target_sector == sector, Ticket.origin_sector == sector))
+    if status:
+        conditions.append(Ticket.status == status)
+    return conditions
+
+
+def iter_ticket_batches(filters, batch_size=1000):
+    """Lotes de chamados (dicionários com os campos de TICKET_FIELDS), em ordem de ID."""
+    author, assignee = aliased(User), aliased(User)
+    query = (select(Ticket.id, Ticket.title, Ticket.description, Ticket.origin_sector, Ticket.target_sector,
+                    Ticket.priority, Ticket.status, Ticket.created_at, Ticket.updated_at, Ticket.closed_at,
+                    author.email.label('author_email'), assignee.email.label('assignee_email'),
+                    Ticket.attachment_filename)
+             .outerjoin(author, author.id == Ticket.user_id)
+             .outerjoin(assignee, assignee.id == Ticket.assigned_to)
+             .where(*filters).order_by(Ticket.id).limit(batch_size))
+    last_id = 0
+    while True:
+        rows = db.session.execute(query.where(Ticket.id > last_id)).mappings().all()
+        if not rows:
+            return
+        yield [dict(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def _comments_of(ticket_ids):
+    return db.session.execute(
+        select(Comment.ticket_id, Comment.content, User.email.label('author_email'), Comment.created_at,
+               Comment.attachment_filename)
+        .outerjoin(User, User.id == Comment.user_id)
+        .where(Comment.ticket_id.in_(ticket_ids)).order_by(Comment.ticket_id, Comment.id)
+    ).mappings().all()
+
+
+def _history_of(ticket_ids):
+    return db.session.execute(
+        select(TicketHistory.ticket_id, TicketHistory.field_changed, TicketHistory.old_value, TicketHistory.new_value,
+               User.email.label('changed_by_email'), TicketHistory.timestamp)
+        .outerjoin(User, User.id == TicketHistory.changed_by_user_id)
+        .where(TicketHistory.ticket_id.in_(ticket_ids)).order_by(TicketHistory.ticket_id, TicketHistory.id)
+    ).mappings().all()
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def export_json_lines(filters, batch_size=1000):
+    """Gera o JSON Lines em blocos de texto (um bloco por lote de chamados)."""
+    for tickets in iter_ticket_batches(filters, batch_size):
+        ids = [ticket['id'] for ticket in tickets]
+        nested = {ticket_id: {'comments': [], 'history': []} for ticket_id in ids}
+        for row in _comments_of(ids):
+            nested[row['ticket_id']]['comments'].append({k: _serialize(row[k]) for k in COMMENT_FIELDS[1:]})
+        for row in _history_of(ids):
+            nested[row['ticket_id']]['history'].append({k: _serialize(row[k]) for k in HISTORY_FIELDS[1:]})
+        yield ''.join(
+            json.dumps({**{k: _serialize(v) for k, v in ticket.items()}, **nested[ticket['id']]}, ensure_ascii=False) + '\n'
+            for ticket in tickets
+        )
+
+
+def export_csv(filters, kind='tickets', batch_size=1000):
+    """Gera o CSV (com cabeçalho) de chamados, comentários ou histórico, em blocos de texto."""
+    fields = CSV_FIELDS[kind]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for tickets in iter_ticket_batches(filters, batch_size):
+        if kind == 'tickets':
+            rows = tickets
+        else:
+            ids = [ticket['id'] for ticket in tickets]
+            rows = _comments_of(ids) if kind == 'comments' else _history_of(ids)
+        writer.writerows({k: _serialize(row[k]) for k in fields} for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# --- IMPORTAÇÃO ---
+
+def _read_json_lines(stream):
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_no, None, f'JSON inválido ({error.msg})'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, 'cada linha deve ser um objeto JSON'
+            continue
+        yield line_no, record, None
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    missing = {'title', 'description', 'target_sector'} - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f"Colunas obrigatórias ausentes no CSV: {', '.join(sorted(missing))}")
+    for record in reader:
+        yield reader.line_num, {k: v for k, v in record.items() if v not in ('', None)}, None
+
+
+def _parse_datetime(value, field, default=None):
+    if value in (None, ''):
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field} inválido: {value!r}')
+
+
+def _choice(record, field, options, default=None):
+    value = record.get(field) or default
+    if value not in options:
+        raise ValueError(f'{field} inválido: {value!r}')
+    return value
+
+
+def _convert(record, ticket_id, user_ids, default_user_id, now):
+    """
+    Registro importado -> (linha do chamado, linhas de comentários, linhas de histórico).
+    ticket_id é provisório (a posição no lote) e é trocado pelo ID gravado depois do INSERT.
+    """
+    title = (record.get('title') or '').strip()
+    description = (record.get('description') or '').strip()
+    if not title or not description:
+        raise ValueError('title e description são obrigatórios')
+    status = _choice(record, 'status', STATUSES, 'Aberto')
+    target_sector = _choice(record, 'target_sector', SECTORS)
+    author_id = user_ids.get((record.get('author_email') or '').lower(), default_user_id)
+    created_at = _parse_datetime(record.get('created_at'), 'created_at', now)
+    updated_at = _parse_datetime(record.get('updated_at'), 'updated_at', created_at)
+    closed_at = _parse_datetime(record.get('closed_at'), 'closed_at', updated_at if status == 'Fechado' else None)
+
+    ticket = {
+        'title': title[:150], 'description': description, 'user_id': author_id,
+        'origin_sector': _choice(record, 'origin_sector', SECTORS, target_sector), 'target_sector': target_sector,
+        'priority': _choice(record, 'priority', PRIORITIES, 'baixa'), 'status': status,
+        'created_at': created_at, 'updated_at': updated_at, 'closed_at': closed_at,
+        'assigned_to': user_ids.get((record.get('assignee_email') or '').lower()),
+        'attachment_filename': record.get('attachment_filename'),
+    }
+
+    comments = []
+    for comment in record.get('comments') or []:
+        if not comment.get('content'):
+            continue
+        comments.append({'ticket_id': ticket_id, 'content': comment['content'],
+                         'user_id': user_ids.get((comment.get('author_email') or '').lower(), default_user_id),
+                         'created_at': _parse_datetime(comment.get('created_at'), 'comments.created_at', created_at),
+                         'attachment_filename': comment.get('attachment_filename')})
+
+    history = [{'ticket_id': ticket_id, 'field_changed': entry.get('field_changed') or 'status',
+                'old_value': entry.get('old_value'), 'new_value': entry.get('new_value'),
+                'changed_by_user_id': user_ids.get((entry.get('changed_by_email') or '').lower()),
+                'timestamp': _parse_datetime(entry.get('timestamp'), 'history.timestamp', created_at)}
+               for entry in record.get('history') or []]
+    if not history:
+        # Sem histórico (ex.: planilha legada): abertura e, se for o caso, o fechamento, usados pelos relatórios
+        history.append({'ticket_id': ticket_id, 'field_changed': 'status', 'old_value': 'N/A', 'new_value': 'Aberto',
+                        'changed_by_user_id': author_id, 'timestamp': created_at})
+        if status == 'Fechado':
+            history.append({'ticket_id': ticket_id, 'field_changed': 'status', 'old_value': 'Aberto',
+                            'new_value': 'Fechado', 'changed_by_user_id': None, 'timestamp': closed_at})
+    return ticket, comments, history
+
+
+def import_tickets(stream, fmt='json', batch_size=1000, default_user=None, progress=None, max_errors=100):
+    """
+    Importa chamados de um arquivo texto (JSON Lines ou CSV). default_user é o
+    e-mail usado quando o autor não existe (padrão: o primeiro administrador).
+    Retorna um dicionário com as quantidades gravadas, os erros e os segundos gastos.
+    """
+    from app import dashboard, reports
+    started = timer.monotonic()
+    report = progress or (lambda message: None)
+    user_ids = {email.lower(): user_id for email, user_id in db.session.query(User.email, User.id)}
+    if default_user:
+        default_user_id = user_ids.get(default_user.lower())
+        if default_user_id is None:
+            raise ImportFormatError(f'Usuário padrão não encontrado: {default_user}')
+    else:
+        default_user_id = db.session.query(func.min(User.id)).filter(User.access_level == 'administrador').scalar()
+    now = datetime.utcnow()
+    records = _read_json_lines(stream) if fmt == 'json' else _read_csv(stream)
+
+    result = {'tickets': 0, 'comments': 0, 'history': 0, 'errors': [], 'error_count': 0}
+    tickets, comments, history = [], [], []
+    first_line = None
+
+    def add_error(message):
+        result['error_count'] += 1
+        if len(result['errors']) < max_errors:
+            result['errors'].append(message)
+
+    def flush():
+        if tickets:
+            # render_nulls: linhas com e sem valores nulos vão no mesmo executemany, sem quebrar o lote
+            options = {'render_nulls': True}
+            try:
+                # sort_by_parameter_order: o RETURNING vem na ordem das linhas do lote, por contrato. O SQLite
+                # não garante a ordem do RETURNING de um INSERT com vários VALUES, então o SQLAlchemy grava os
+                # chamados um a um (na mesma transação); comentários e histórico seguem em executemany
+                ids = db.session.execute(insert(Ticket).returning(Ticket.id, sort_by_parameter_order=True),
+                                         tickets, execution_options=options).scalars().all()
+                for row in comments + history:
+                    row['ticket_id'] = ids[row['ticket_id']]
+                if comments:
+                    db.session.execute(insert(Comment), comments, execution_options=options)
+                db.session.execute(insert(TicketHistory), history, execution_options=options)
+                db.session.commit()
+            except SQLAlchemyError as exc:
+                db.session.rollback()
+                add_error(f"Linhas {first_line} em diante: lote de {len(tickets)} chamado(s) não gravado "
+                          f"({exc.__class__.__name__}: {getattr(exc, 'orig', exc)})")
+                result['error_count'] += len(tickets) - 1
+            else:
+                result['tickets'] += len(tickets)
+                result['comments'] += len(comments)
+                result['history'] += len(history)
+                report(f"{result['tickets']} chamados importados")
+        tickets.clear()
+        comments.clear()
+        history.clear()
+
+    for line_no, record, error in records:
+        if error is None:
+            try:
+                ticket, ticket_comments, ticket_history = _convert(record, len(tickets), user_ids, default_user_id, now)
+            except (ValueError, TypeError, AttributeError) as exc:
+                error = str(exc)
+        if error is not None:
+            add_error(f'Linha {line_no}: {error}')
+            continue
+        if not tickets:
+            first_line = line_no
+        tickets.append(ticket)
+        comments.extend(ticket_comments)
+        history.extend(ticket_history)
+        if len(tickets) >= batch_size:
+            flush()
+    flush()
+
+    if result['tickets']:
+        reports.refresh_daily_rollup()
+        dashboard.invalidate()
+    result['seconds'] = round(timer.monotonic() - started, 1)
+    return result
@@ -1,34 +1,46 @@
-import os
-import shutil
-from datetime import datetime
 from app import create_app
+from app import backup, auto_close, archive
 
-def run_backup():
+def run_backup(app=None):
     """
-    Cria uma instância da aplicação Flask para acessar as configurações
-    e executa a lógica de backup do banco de dados.
+    Executa a lógica de backup do banco de dados (cópia online, gzip e retenção),
+    com a aplicação enxuta (só configuração e banco) se nenhuma for passada.
     """
-    app = create_app()
+    app = app or create_app(light=True)
     with app.app_context():
-        db_path = os.path.join(app.instance_path, 'site.db')
-        backup_folder = app.config['BACKUP_FOLDER']
-        
-        # Garante que a pasta de backup exista
-        os.makedirs(backup_folder, exist_ok=True)
-        
-        # Define o nome do arquivo de backup com data e hora
-        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        backup_filename = f'site_{timestamp}.db'
-        backup_path = os.path.join(backup_folder, backup_filename)
-        
         try:
-            # Copia o arquivo do banco de dados para a pasta de backup
-            shutil.copy2(db_path, backup_path)
-            print(f'Backup criado com sucesso: {backup_filename}')
+            manifest, removed = backup.backup_now()
+            print(f'Backup criado com sucesso: {manifest["filename"]} '
+                  f'({manifest["size"]} bytes, {manifest["duration_seconds"]:.1f}s)')
+            for filename in removed:
+                print(f'Backup antigo removido pela retenção: {filename}')
         except Exception as e:
             print(f'ERRO ao criar backup: {e}')
 
+def run_auto_close(app=None):
+    """Fecha os chamados 'Resolvido' parados há mais de auto_close_days (ver Configurações)."""
+    app = app or create_app(light=True)
+    with app.app_context():
+        try:
+            closed, seconds = auto_close.close_resolved_tickets(batch_size=app.config['AUTO_CLOSE_BATCH_SIZE'])
+            print(f'{closed} chamado(s) fechado(s) automaticamente em {seconds:.2f}s.')
+        except Exception as e:
+            print(f'ERRO no fechamento automático: {e}')
+
+def run_archive(app=None):
+    """Move para o arquivo morto os chamados fechados há mais de ARCHIVE_AFTER_DAYS dias."""
+    app = app or create_app(light=True)
+    with app.app_context():
+        try:
+            moved, seconds = archive.archive_closed_tickets(batch_size=app.config['ARCHIVE_BATCH_SIZE'])
+            print(f'{moved} chamado(s) movido(s) para o arquivo morto em {seconds:.2f}s.')
+        except Exception as e:
+            print(f'ERRO ao arquivar chamados: {e}')
+
 if __name__ == '__main__':
     print("Iniciando o script de backup agendado...")
-    run_backup()
+    app = create_app(light=True)
+    run_backup(app)
+    run_auto_close(app)
+    run_archive(app)
     print("Script de backup finalizado.")
\ No newline at end of file
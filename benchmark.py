@@ -0,0 +1,414 @@
+"""
+Benchmark das rotas da aplicação sobre dados sintéticos.
+
+Cria (ou reaproveita) um banco separado, popula-o com o gerador do "flask seed"
+e chama cada rota pelo test client do Flask, logado como administrador,
+técnico ou colaborador. Para cada cenário registra a latência (mediana e p95),
+o número de consultas SQL (contadas no processo, inclusive as de respostas em
+streaming, feitas depois dos cabeçalhos e fora do X-Query-Count) e o pico de
+memória alocada durante a requisição (tracemalloc), e compara com
+benchmarks/baseline.json.
+
+    python benchmark.py                          # 2.000 chamados, 20 repetições
+    python benchmark.py --tickets 100000         # outra escala (o banco é criado uma vez)
+    python benchmark.py --save-baseline          # grava o resultado como nova referência
+
+Termina com código 1 se algum cenário ficou mais lento que a tolerância,
+passou a fazer mais consultas ou a alocar bem mais memória que na referência.
+As consultas valem em qualquer máquina; latência e memória só são comparáveis
+com uma referência gravada na mesma máquina. Rotas novas precisam ganhar um
+cenário aqui (ou entrar em EXCLUDED).
+
+Os cenários "subida" medem, em processos Python novos, o import do pacote e o
+create_app (completo e o enxuto dos scripts) com o banco já preparado: é o
+custo de cada worker do gunicorn e de cada execução do backup_scheduler.py.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+
+# Dez chamados no formato do "flask tickets-export", para o cenário de importação
+IMPORT_SAMPLE = ''.join(json.dumps({
+    'title': f'Chamado importado {n}', 'description': 'Migrado do sistema antigo.', 'target_sector': 'TI',
+    'status': 'Fechado', 'created_at': '2024-01-02T08:00:00', 'closed_at': '2024-01-03T10:00:00',
+    'comments': [{'content': 'Resolvido no sistema antigo.', 'created_at': '2024-01-03T09:00:00'}],
+}) + '\n' for n in range(10)).encode()
+
+# Rotas que não entram no benchmark, e por quê
+EXCLUDED = {
+    'static': 'arquivos estáticos servidos pelo servidor web',
+    'main.stream': 'SSE: a conexão fica aberta, não há latência de resposta a medir',
+    'main.logout': 'encerraria a sessão usada pelos demais cenários',
+    'main.delete_user': 'destrutiva',
+    'main.toggle_user_status': 'destrutiva',
+    'main.create_backup': 'copia o banco inteiro; medida pelo próprio backup (duration_seconds)',
+    'main.delete_backup': 'destrutiva',
+    'main.download_backup': 'send_file de um arquivo gzip, sem acesso ao banco',
+    'main.attachment_thumbnail': 'mesmo caminho de main.attachment (miniaturas dependem do Pillow)',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--tickets', type=int, default=2000, help='Chamados gerados no banco do benchmark.')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetições medidas de cada cenário.')
+    parser.add_argument('--database', help='Arquivo SQLite do benchmark (reaproveitado se já estiver populado).')
+    parser.add_argument('--only', help='Roda apenas os cenários cujo nome contém este texto.')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Arquivo de referência.')
+    parser.add_argument('--save-baseline', action='store_true', help='Grava o resultado como nova referência.')
+    parser.add_argument('--output', help='Grava o resultado (JSON) neste arquivo.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Piora relativa tolerada na latência e na memória.')
+    return parser.parse_args()
+
+
+def create_benchmark_app(database):
+    """Aplicação apontando para o banco do benchmark, com anexos e backups fora da pasta do projeto."""
+    workdir = os.path.dirname(database)
+    # As variáveis precisam existir antes de importar config.py
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    os.environ.setdefault('ATTACHMENT_FOLDER', os.path.join(workdir, 'attachments'))
+    os.environ.setdefault('REQUEST_CACHE_VERSION_FILE', database + '.cache-version')
+    import config
+    config.Config.WTF_CSRF_ENABLED = False
+    config.Config.BACKUP_FOLDER = os.path.join(workdir, 'backups')
+    from app import create_app
+    return create_app()
+
+
+def prepare_data(app, tickets):
+    """Popula o banco, se ainda estiver vazio, e escolhe os usuários e registros usados nos cenários."""
+    from app import db, seed
+    from app.models import User, Ticket, ChatConversation
+
+    if Ticket.query.count() == 0:
+        print(f'Gerando {tickets} chamados...')
+        counts = seed.seed_database(tickets)
+        print(f"Banco populado em {counts['seconds']}s.")
+
+    tecnico = User.query.filter_by(access_level='tecnico', sector='TI').order_by(User.id).first()
+    colaborador = (User.query.filter_by(access_level='colaborador')
+                   .filter(User.tickets_created.any()).order_by(User.id).first())
+    own_ticket = Ticket.query.filter_by(user_id=colaborador.id).order_by(Ticket.id.desc()).first()
+    sector_ticket = (Ticket.query.filter_by(target_sector='TI', status='Em Atendimento')
+                     .order_by(Ticket.id.desc()).first())
+    conversation = (ChatConversation.query.filter_by(user_id=tecnico.id)
+                    .order_by(ChatConversation.last_message_at.desc()).first())
+
+    # Um anexo no armazenamento para medir a rota de download
+    content = b'benchmark\n' * 1024
+    attachment = hashlib.sha256(content).hexdigest() + '.txt'
+    folder = app.config['ATTACHMENT_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, attachment), 'wb') as f:
+        f.write(content)
+
+    return {
+        'tickets': Ticket.query.count(),
+        'users': {
+            'administrador': ('admin@empresa.com', 'admin123'),
+            'tecnico': (tecnico.email, seed.SEED_PASSWORD),
+            'colaborador': (colaborador.email, seed.SEED_PASSWORD),
+        },
+        'own_ticket': own_ticket.id,
+        'sector_ticket': sector_ticket.id,
+        'sector_batch': [ticket_id for ticket_id, in db.session.query(Ticket.id).filter(
+            Ticket.target_sector == 'TI', Ticket.status.in_(['Resolvido', 'Em Atendimento'])
+        ).order_by(Ticket.id).limit(50)],
+        'partner': conversation.partner_id if conversation else colaborador.id,
+        'attachment': attachment,
+        'max_ticket': db.session.query(db.func.max(Ticket.id)).scalar(),
+    }
+
+
+def build_scenarios(data):
+    """
+    Lista de cenários: (nome, perfil, método, URL, opções). As opções aceitam
+    'data'/'json' (fixos ou função da repetição) e 'revalidate' (reenvia o
+    ETag da primeira resposta, medindo o caminho do 304).
+    """
+    ticket, own, partner = data['sector_ticket'], data['own_ticket'], data['partner']
+    statuses = ['Resolvido', 'Em Atendimento']
+    return [
+        ('login (GET)', 'anonimo', 'GET', '/login', {}),
+        ('login (POST)', 'anonimo', 'POST', '/login',
+         {'data': {'email': data['users']['tecnico'][0], 'password': data['users']['tecnico'][1]}}),
+        ('home admin', 'administrador', 'GET', '/home', {}),
+        ('home tecnico', 'tecnico', 'GET', '/home', {}),
+        ('home colaborador', 'colaborador', 'GET', '/home', {}),
+        ('kanban busca', 'tecnico', 'GET', '/tickets_kanban?q=impressora', {}),
+        ('raiz', 'tecnico', 'GET', '/', {}),
+        ('kanban', 'tecnico', 'GET', '/tickets_kanban', {}),
+        ('kanban coluna', 'tecnico', 'GET', '/api/kanban/column?status=Fechado', {}),
+        ('busca', 'tecnico', 'GET', '/api/search?q=impressora', {}),
+        ('chamado (tecnico)', 'tecnico', 'GET', f'/ticket/{ticket}', {}),
+        ('chamado (autor)', 'colaborador', 'GET', f'/ticket/{own}', {}),
+        ('chamado comentar', 'colaborador', 'POST', f'/ticket/{own}',
+         {'data': lambda i: {'content': f'Comentário de benchmark {i}', 'submit_comment': 'y'}}),
+        ('chamado atualizar', 'tecnico', 'POST', f'/ticket/{ticket}',
+         {'data': lambda i: {'status': statuses[i % 2], 'priority': 'media', 'assigned_to': 0, 'submit_update': 'y'}}),
+        ('kanban mover', 'tecnico', 'POST', '/api/tickets/bulk_update',
+         {'json': lambda i: {'ticket_ids': [ticket], 'changes': {'status': statuses[i % 2]}}}),
+        ('alterar em massa (50)', 'tecnico', 'POST', '/api/tickets/bulk_update',
+         {'json': lambda i: {'ticket_ids': data['sector_batch'], 'changes': {'status': statuses[i % 2]}}}),
+        ('abrir chamado (GET)', 'colaborador', 'GET', '/create_ticket', {}),
+        ('abrir chamado (POST)', 'colaborador', 'POST', '/create_ticket',
+         {'data': lambda i: {'title': f'Benchmark {i} impressora', 'description': 'Chamado criado pelo benchmark.',
+                             'origin_sector': 'Vendas', 'target_sector': 'TI', 'priority': 'media'}}),
+        ('dashboard', 'administrador', 'GET', '/dashboard', {}),
+        ('dashboard métricas', 'administrador', 'GET', '/api/dashboard/metrics', {}),
+        ('relatórios', 'administrador', 'GET', '/reports', {}),
+        ('usuários', 'administrador', 'GET', '/users', {}),
+        ('cadastro (GET)', 'administrador', 'GET', '/register', {}),
+        ('configurações', 'administrador', 'GET', '/settings', {}),
+        ('backup', 'administrador', 'GET', '/backup', {}),
+        ('métricas', 'administrador', 'GET', '/metrics', {}),
+        ('exportar json', 'administrador', 'GET', '/export?format=json&status=Aberto', {}),
+        ('exportar csv', 'administrador', 'GET', '/export?format=csv&kind=history&sector=RH', {}),
+        ('importar', 'administrador', 'POST', '/import', {'data': lambda i: {'file': (io.BytesIO(IMPORT_SAMPLE), 'chamados.jsonl')}}),
+        ('ajuda', 'colaborador', 'GET', '/help', {}),
+        ('novidades (cursor)', 'colaborador', 'GET', '/check_updates', {}),
+        ('novidades', 'colaborador', 'GET', '/check_updates?since=0', {}),
+        ('novidades (304)', 'colaborador', 'GET', '/check_updates?since=0', {'revalidate': True}),
+        ('notificações lidas', 'colaborador', 'POST', '/api/notifications/mark_read', {'json': {}}),
+        ('chat usuários', 'tecnico', 'GET', '/chat', {}),
+        ('chat conversa', 'tecnico', 'GET', f'/chat/{partner}', {}),
+        ('chat enviar', 'tecnico', 'POST', f'/chat/{partner}',
+         {'data': lambda i: {'content': f'Mensagem {i}'}, 'headers': {'X-Requested-With': 'XMLHttpRequest'}}),
+        ('chat mensagens', 'tecnico', 'GET', f'/api/chat/{partner}/messages', {}),
+        ('chat mensagens (304)', 'tecnico', 'GET', f'/api/chat/{partner}/messages', {'revalidate': True}),
+        ('chat não lidas', 'tecnico', 'GET', '/api/chat/unread_info', {}),
+        ('chat não lidas (304)', 'tecnico', 'GET', '/api/chat/unread_info', {'revalidate': True}),
+        ('chat marcar lidas', 'tecnico', 'POST', f'/api/chat/{partner}/mark_as_read', {}),
+        ('anexo', 'tecnico', 'GET', f"/attachments/{data['attachment']}", {}),
+    ]
+
+
+def check_coverage(app, scenarios):
+    """Falha se alguma rota registrada não tiver cenário nem estiver em EXCLUDED."""
+    covered = set()
+    adapter = app.url_map.bind('localhost')
+    for _, _, method, url, _ in scenarios:
+        endpoint, _ = adapter.match(url.split('?')[0], method=method)
+        covered.add(endpoint)
+    missing = {rule.endpoint for rule in app.url_map.iter_rules()} - covered - set(EXCLUDED)
+    return sorted(missing)
+
+
+def login(app, email, password):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': password})
+    if response.status_code != 302:
+        raise SystemExit(f'Falha no login de {email}.')
+    return client
+
+
+# Executado em um processo novo: imprime os tempos (ms), as consultas do create_app e o pico de memória
+STARTUP_SCRIPT = """
+import json, sys, time, tracemalloc
+light, trace = sys.argv[1] == 'light', sys.argv[2] == 'trace'
+if trace:
+    tracemalloc.start()
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+from app.instrumentation import count_queries
+with count_queries() as counter:
+    ready = time.perf_counter()
+    create_app(light=light)
+    finished = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_ms': (finished - ready) * 1000,
+                  'queries': counter['count'], 'peak_kb': tracemalloc.get_traced_memory()[1] / 1024 if trace else 0}))
+"""
+
+STARTUP_SCENARIOS = [
+    ('subida: import do app', 'full', 'import_ms'),
+    ('subida: create_app', 'full', 'create_ms'),
+    ('subida: app de script', 'light', 'create_ms'),
+]
+
+
+def _startup_sample(mode, trace=False):
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, mode, 'trace' if trace else 'time'],
+                            cwd=BASE_DIR, env=os.environ.copy(), capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_startup(repeat):
+    """Cenários de subida, cada repetição em um processo novo (o banco já está preparado)."""
+    samples = {mode: [_startup_sample(mode) for _ in range(repeat)] for mode in ('full', 'light')}
+    traced = {mode: _startup_sample(mode, trace=True) for mode in ('full', 'light')}
+    results = {}
+    for name, mode, key in STARTUP_SCENARIOS:
+        values = [sample[key] for sample in samples[mode]]
+        results[name] = {
+            'status': 0,
+            'median_ms': round(statistics.median(values), 2),
+            'p95_ms': round(_percentile(values, 0.95), 2),
+            'queries': 0 if key == 'import_ms' else max(sample['queries'] for sample in samples[mode]),
+            'peak_kb': round(traced[mode]['peak_kb'], 1),
+        }
+    return results
+
+
+def _resolve(value, i):
+    return value(i) if callable(value) else value
+
+
+def _request(client, method, url, options, i, headers):
+    kwargs = {'headers': {**options.get('headers', {}), **headers}}
+    if 'data' in options:
+        kwargs['data'] = _resolve(options['data'], i)
+    if 'json' in options:
+        kwargs['json'] = _resolve(options['json'], i)
+    response = client.open(url, method=method, **kwargs)
+    response.get_data() # Respostas em streaming só terminam de ser geradas aqui
+    response.close()
+    return response
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run_scenario(app, clients, scenario, repeat):
+    from app.instrumentation import count_queries
+    name, role, method, url, options = scenario
+
+    def client_for():
+        return app.test_client() if role == 'anonimo' else clients[role]
+
+    warmup = _request(client_for(), method, url, options, 0, {})
+    if warmup.status_code >= 400:
+        return {'error': f'HTTP {warmup.status_code}'}
+    headers = {}
+    if options.get('revalidate'):
+        headers['If-None-Match'] = warmup.headers.get('ETag', '')
+
+    latencies, queries, status = [], [], None
+    for i in range(1, repeat + 1):
+        client = client_for()
+        started = time.perf_counter()
+        with count_queries() as counter:
+            response = _request(client, method, url, options, i, headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter['count'])
+        status = response.status_code
+
+    # Memória numa execução à parte: o tracemalloc deixa as requisições mais lentas
+    client = client_for()
+    tracemalloc.start()
+    _request(client, method, url, options, repeat + 1, headers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'median_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lista de regressões em relação à referência (ignora variações de latência abaixo de 1 ms)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or 'error' in previous:
+            continue
+        if 'error' in current:
+            regressions.append(f"{name}: {current['error']}")
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: {previous['queries']} -> {current['queries']} consultas")
+        if current['median_ms'] > previous['median_ms'] * (1 + tolerance) and current['median_ms'] - previous['median_ms'] > 1:
+            regressions.append(f"{name}: mediana {previous['median_ms']} -> {current['median_ms']} ms")
+        if current['peak_kb'] > previous['peak_kb'] * (1 + tolerance) and current['peak_kb'] - previous['peak_kb'] > 256:
+            regressions.append(f"{name}: memória {previous['peak_kb']} -> {current['peak_kb']} KiB")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    database = os.path.abspath(args.database) if args.database else os.path.join(
+        tempfile.mkdtemp(prefix='chamados-benchmark-'), 'benchmark.db')
+    app = create_benchmark_app(database)
+
+    with app.app_context():
+        data = prepare_data(app, args.tickets)
+    scenarios = build_scenarios(data)
+    missing = check_coverage(app, scenarios)
+    if missing:
+        raise SystemExit(f"Rotas sem cenário de benchmark: {', '.join(missing)}")
+    if args.only:
+        scenarios = [s for s in scenarios if args.only in s[0]]
+
+    clients = {role: login(app, email, password) for role, (email, password) in data['users'].items()}
+    print(f"Banco: {database} ({data['tickets']} chamados), {args.repeat} repetições por cenário\n")
+    print(f"{'cenário':<26}{'mediana ms':>12}{'p95 ms':>10}{'consultas':>11}{'pico KiB':>11}")
+    results = {}
+    for scenario in scenarios:
+        result = run_scenario(app, clients, scenario, args.repeat)
+        results[scenario[0]] = result
+        if 'error' in result:
+            print(f"{scenario[0]:<26}{result['error']:>12}")
+        else:
+            print(f"{scenario[0]:<26}{result['median_ms']:>12}{result['p95_ms']:>10}{result['queries']:>11}{result['peak_kb']:>11}")
+    if not args.only or any(args.only in name for name, _, _ in STARTUP_SCENARIOS):
+        # Um processo por repetição: limitado a 10 para o benchmark não demorar demais
+        for name, result in run_startup(min(args.repeat, 10)).items():
+            if not args.only or args.only in name:
+                results[name] = result
+                print(f"{name:<26}{result['median_ms']:>12}{result['p95_ms']:>10}{result['queries']:>11}{result['peak_kb']:>11}")
+
+    report = {
+        'meta': {
+            'tickets': data['tickets'], 'repeat': args.repeat, 'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version, 'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'\nReferência gravada em {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('\nSem referência para comparar (use --save-baseline).')
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['meta']['tickets'] != data['tickets']:
+        print(f"\nAviso: a referência foi medida com {baseline['meta']['tickets']} chamados.")
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print('\nRegressões em relação à referência:')
+        for line in regressions:
+            print(f'  - {line}')
+        return 1
+    print('\nNenhuma regressão em relação à referência.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Canal WebSocket do chat: um processo asyncio que roda ao lado do Flask.
+
+    pip install websockets
+    python chat_server.py [--host 0.0.0.0] [--port 8765]
+
+e CHAT_WS_URL=ws://servidor:8765/ na configuração do Flask, para que a página
+da conversa abra o socket. Sem CHAT_WS_URL, ou com o socket fechado, a página
+continua no polling de sempre.
+
+- Autenticação: o cookie de sessão do Flask, validado com a mesma SECRET_KEY;
+  o Origin precisa ser o host da página (ou estar em CHAT_WS_ALLOWED_ORIGINS).
+- Mensagens novas: uma única tarefa lê o banco a cada CHAT_WS_TAIL_SECONDS
+  ("id > último visto") e entrega cada mensagem aos sockets do remetente e do
+  destinatário. Assim chegam também as enviadas pelo formulário HTTP, por
+  outro processo; as enviadas pelo socket acordam a leitura na hora.
+- Confirmações: "delivered" quando a mensagem chega a um socket aberto do
+  destinatário (só em memória) e "read" quando ele abre a conversa, que marca
+  ChatMessage.is_read com o mesmo UPDATE da rota mark_as_read.
+- Presença: entrada e saída de cada usuário são avisadas a todos os sockets.
+- Reconexão: o cliente manda {"type": "hello", "last_id": N} e recebe o que
+  perdeu desde N.
+O acesso ao banco roda em um pool pequeno de threads; o resto é I/O do
+asyncio, então algumas centenas de sockets cabem em um processo (atenção ao
+limite de arquivos abertos do sistema, ulimit -n). Anexos continuam indo pelo
+formulário HTTP. Os avisos do stream SSE (/stream) são do processo Flask: as
+mensagens enviadas pelo socket aparecem no contador do menu pelo polling.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from itsdangerous import BadSignature
+from sqlalchemy import func, or_
+from werkzeug.http import parse_cookie
+
+try:
+    from websockets.asyncio.server import serve, broadcast
+    from websockets.exceptions import ConnectionClosed
+except ImportError:  # Dependência opcional: sem ela o chat fica só no polling
+    serve = broadcast = ConnectionClosed = None
+
+from app import create_app, db
+from app.chat import record_chat_message, mark_conversation_read, serialize_message
+from app.models import User, ChatMessage
+
+logger = logging.getLogger('chat_server')
+
+MAX_FRAME_BYTES = 64 * 1024
+MAX_CONTENT_LENGTH = 500  # O mesmo limite do ChatMessageForm
+TAIL_BATCH = 500
+RESYNC_LIMIT = 200
+DB_THREADS = 8
+
+
+# --- CONSULTAS (rodam no pool de threads, dentro de um contexto do Flask) ---
+
+def _active_user(user_id):
+    return db.session.query(User.id).filter(User.id == user_id, User.is_active == True).scalar()
+
+
+def _last_message_id():
+    return db.session.query(func.max(ChatMessage.id)).scalar() or 0
+
+
+def _serialize(rows):
+    return [serialize_message(msg, sender_name) for msg, sender_name in rows]
+
+
+def _messages_after(last_id, limit):
+    """Mensagens de todas as conversas com ID maior que last_id, em ordem."""
+    return _serialize(db.session.query(ChatMessage, User.name).join(User, User.id == ChatMessage.sender_id).filter(
+        ChatMessage.id > last_id
+    ).order_by(ChatMessage.id).limit(limit).all())
+
+
+def _resync(user_id, last_id, partner_id, limit):
+    """O que o usuário perdeu desde last_id (de uma conversa, se partner_id vier)."""
+    query = db.session.query(ChatMessage, User.name).join(User, User.id == ChatMessage.sender_id).filter(
+        or_(ChatMessage.sender_id == user_id, ChatMessage.recipient_id == user_id), ChatMessage.id > last_id
+    )
+    if partner_id is not None:
+        query = query.filter(or_(ChatMessage.sender_id == partner_id, ChatMessage.recipient_id == partner_id))
+    rows = query.order_by(ChatMessage.id).limit(limit + 1).all()
+    return _serialize(rows[:limit]), len(rows) > limit
+
+
+def _send(sender_id, recipient_id, content):
+    if db.session.get(User, recipient_id) is None:
+        return None
+    msg = ChatMessage(sender_id=sender_id, recipient_id=recipient_id, content=content)
+    db.session.add(msg)
+    db.session.flush()
+    record_chat_message(msg)
+    db.session.commit()
+    return msg.id
+
+
+def _mark_read(user_id, partner_id):
+    """Marca a conversa como lida; retorna o maior ID lido (ou None se nada mudou)."""
+    updated = mark_conversation_read(user_id, partner_id)
+    up_to = db.session.query(func.max(ChatMessage.id)).filter(
+        ChatMessage.sender_id == partner_id, ChatMessage.recipient_id == user_id
+    ).scalar()
+    db.session.commit()
+    return up_to if updated else None
+
+
+def session_user_id(app, cookie_header):
+    """ID do usuário logado no cookie de sessão do Flask (Flask-Login), ou None."""
+    value = parse_cookie(cookie_header or '').get(app.config['SESSION_COOKIE_NAME'])
+    if not value:
+        return None
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        session = serializer.loads(value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return None
+    user_id = str(session.get('_user_id', ''))
+    return int(user_id) if user_id.isdigit() else None
+
+
+class ChatHub:
+    """Sockets abertos por usuário, a leitura contínua do banco e o tratamento das mensagens do cliente."""
+
+    def __init__(self, app):
+        self.app = app
+        self.sockets = {}
+        self.users = {}
+        self.last_id = 0
+        self.wakeup = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='chat-db')
+        origins = app.config['CHAT_WS_ALLOWED_ORIGINS']
+        self.allowed_origins = {origin.strip() for origin in origins.split(',') if origin.strip()} if origins else None
+
+    async def run_db(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self._in_context, func, args)
+
+    def _in_context(self, func, args):
+        # Contexto de requisição: serialize_message monta URLs com url_for
+        with self.app.test_request_context():
+            return func(*args)
+
+    def _emit(self, user_ids, payload):
+        connections = [connection for uid in set(user_ids) for connection in self.sockets.get(uid, ())]
+        if connections:
+            broadcast(connections, json.dumps(payload))
+        return len(connections)
+
+    def _emit_all(self, payload):
+        broadcast([connection for connections in self.sockets.values() for connection in connections], json.dumps(payload))
+
+    # --- CONEXÃO ---
+
+    def origin_allowed(self, request):
+        origin = request.headers.get('Origin')
+        if origin is None:
+            return True  # Clientes fora do navegador não mandam Origin (nem o cookie de outra pessoa)
+        if self.allowed_origins is not None:
+            return origin in self.allowed_origins
+        return urlsplit(origin).hostname == urlsplit('//' + request.headers.get('Host', '')).hostname
+
+    async def authenticate(self, connection, request):
+        if not self.origin_allowed(request):
+            return connection.respond(403, 'Origem não permitida.\n')
+        user_id = session_user_id(self.app, request.headers.get('Cookie'))
+        if user_id is None or not await self.run_db(_active_user, user_id):
+            return connection.respond(401, 'Não autenticado.\n')
+        self.users[connection] = user_id
+        return None
+
+    async def handler(self, connection):
+        user_id = self.users.pop(connection)
+        first = user_id not in self.sockets
+        self.sockets.setdefault(user_id, set()).add(connection)
+        if first:
+            self._emit_all({'type': 'presence', 'user_id': user_id, 'online': True})
+        await connection.send(json.dumps({'type': 'presence', 'online': sorted(self.sockets)}))
+        try:
+            async for raw in connection:
+                try:
+                    data = json.loads(raw)
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    await connection.send(json.dumps({'type': 'error', 'message': 'Mensagem inválida.'}))
+                    continue
+                await self.dispatch(connection, user_id, data)
+        finally:
+            connections = self.sockets.get(user_id, set())
+            connections.discard(connection)
+            if not connections:
+                self.sockets.pop(user_id, None)
+                self._emit_all({'type': 'presence', 'user_id': user_id, 'online': False})
+
+    # --- MENSAGENS DO CLIENTE ---
+
+    async def dispatch(self, connection, user_id, data):
+        kind = data.get('type')
+        try:
+            if kind == 'hello':
+                await self.on_hello(connection, user_id, data)
+            elif kind == 'send':
+                await self.on_send(connection, user_id, data)
+            elif kind == 'read':
+                await self.on_read(user_id, data)
+            else:
+                await connection.send(json.dumps({'type': 'error', 'message': 'Tipo de mensagem desconhecido.'}))
+        except ConnectionClosed:
+            raise
+        except Exception:
+            # Falha no banco (ex.: "database is locked"): o socket continua aberto e o cliente pode reenviar
+            logger.exception('Erro ao tratar mensagem %r do usuário %s no chat.', kind, user_id)
+            await connection.send(json.dumps({'type': 'error', 'client_id': data.get('client_id'),
+                                              'message': 'Erro ao processar a mensagem. Tente novamente.'}))
+
+    async def on_hello(self, connection, user_id, data):
+        """Reconexão: devolve o que chegou depois de last_id."""
+        last_id, partner_id = data.get('last_id'), data.get('partner_id')
+        if not isinstance(last_id, int) or (partner_id is not None and not isinstance(partner_id, int)):
+            return await connection.send(json.dumps({'type': 'error', 'message': 'last_id inválido.'}))
+        messages, has_more = await self.run_db(_resync, user_id, last_id, partner_id, RESYNC_LIMIT)
+        await connection.send(json.dumps({'type': 'messages', 'messages': messages, 'has_more': has_more}))
+        self._confirm_delivery([message for message in messages if message['recipient_id'] == user_id])
+
+    async def on_send(self, connection, user_id, data):
+        content, recipient_id, client_id = data.get('content'), data.get('to'), data.get('client_id')
+        content = content.strip() if isinstance(content, str) else ''
+        if not content or len(content) > MAX_CONTENT_LENGTH or not isinstance(recipient_id, int):
+            return await connection.send(json.dumps({'type': 'error', 'client_id': client_id,
+                                                     'message': f'A mensagem deve ter de 1 a {MAX_CONTENT_LENGTH} caracteres.'}))
+        message_id = await self.run_db(_send, user_id, recipient_id, content)
+        if message_id is None:
+            return await connection.send(json.dumps({'type': 'error', 'client_id': client_id, 'message': 'Destinatário não encontrado.'}))
+        await connection.send(json.dumps({'type': 'ack', 'client_id': client_id, 'id': message_id}))
+        self.wakeup.set()
+
+    async def on_read(self, user_id, data):
+        partner_id = data.get('partner_id')
+        if not isinstance(partner_id, int):
+            return
+        up_to = await self.run_db(_mark_read, user_id, partner_id)
+        if up_to is not None:
+            self._emit([partner_id], {'type': 'read', 'reader_id': user_id, 'up_to': up_to})
+
+    # --- ENTREGA ---
+
+    def _confirm_delivery(self, messages):
+        by_sender = {}
+        for message in messages:
+            by_sender.setdefault(message['sender_id'], []).append(message['id'])
+        for sender_id, ids in by_sender.items():
+            self._emit([sender_id], {'type': 'delivered', 'ids': ids})
+
+    def deliver(self, messages):
+        delivered = []
+        for message in messages:
+            payload = {'type': 'message', 'message': message}
+            self._emit([message['sender_id']], payload)
+            if message['recipient_id'] != message['sender_id'] and self._emit([message['recipient_id']], payload):
+                delivered.append(message)
+        self._confirm_delivery(delivered)
+
+    async def tail(self, interval):
+        """Lê as mensagens novas do banco (de qualquer processo) e as entrega aos sockets abertos."""
+        self.last_id = await self.run_db(_last_message_id)
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                while True:
+                    messages = await self.run_db(_messages_after, self.last_id, TAIL_BATCH)
+                    if not messages:
+                        break
+                    self.last_id = messages[-1]['id']
+                    self.deliver(messages)
+                    if len(messages) < TAIL_BATCH:
+                        break
+            except Exception:
+                logger.exception('Erro ao ler mensagens novas do chat.')
+
+    async def run(self, host, port):
+        async with serve(self.handler, host, port, process_request=self.authenticate, max_size=MAX_FRAME_BYTES):
+            logger.info('Servidor de chat ouvindo em ws://%s:%s/', host, port)
+            await self.tail(self.app.config['CHAT_WS_TAIL_SECONDS'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor WebSocket do chat.')
+    parser.add_argument('--host', help='Padrão: CHAT_WS_HOST.')
+    parser.add_argument('--port', type=int, help='Padrão: CHAT_WS_PORT.')
+    args = parser.parse_args()
+    if serve is None:
+        sys.exit('O servidor de chat precisa do pacote websockets: pip install websockets')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    app = create_app()
+    hub = ChatHub(app)
+    try:
+        asyncio.run(hub.run(args.host or app.config['CHAT_WS_HOST'], args.port or app.config['CHAT_WS_PORT']))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
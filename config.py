@@ -2,14 +2,97 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'sua_chave_secreta_aqui'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///site.db'
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///site.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Prepara o banco ao iniciar se o esquema estiver desatualizado (também via "flask init-db")
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE', 'true').lower() != 'false'
+
+    # --- AJUSTES DO SQLITE E DO POOL DE CONEXÕES (ver app/database.py) ---
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB') or 20000)
+    SQLITE_MMAP_SIZE_MB = int(os.environ.get('SQLITE_MMAP_SIZE_MB') or 256) # 0 desliga o mmap
+    # Pool (QueuePool): só para bancos em arquivo; o SQLite em memória usa um pool de conexão única
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 3600)
+
+    # --- ORÇAMENTO DE CONSULTAS SQL POR REQUISIÇÃO ---
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET') or 20) # Rotas podem definir o seu com @query_budget
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true' # Erro em vez de aviso
+
+    # --- ARQUIVO MORTO (chamados fechados antigos em um SQLite separado, ver app/archive.py) ---
+    ARCHIVE_DATABASE = os.environ.get('ARCHIVE_DATABASE') # Padrão: <banco>-archive.db, ao lado do banco principal
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 365) # Fechados e sem alteração há mais tempo que isso
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE') or 500)
+
+    # --- ALTERAÇÃO EM MASSA (seleção múltipla no kanban) ---
+    BULK_UPDATE_MAX_TICKETS = int(os.environ.get('BULK_UPDATE_MAX_TICKETS') or 500) # Chamados por requisição
+
+    # --- EXPORTAÇÃO E IMPORTAÇÃO DE CHAMADOS ---
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000) # Chamados lidos por consulta
+
+    # --- MÉTRICAS DE DESEMPENHO (rota /metrics, formato Prometheus) ---
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS') or 200) # Consultas mais lentas vão para o log; 0 desliga
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # Permite a coleta sem login: "Authorization: Bearer <token>"
     # --- CONFIGURAÇÃO ADICIONADA ---
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app/static/uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024 # Limite de 16MB para uploads
+    # Anexos novos, gravados pelo SHA-256 do conteúdo (ver app/attachments.py)
+    ATTACHMENT_FOLDER = os.environ.get('ATTACHMENT_FOLDER') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'attachments')
+    ATTACHMENT_CACHE_SECONDS = 365 * 24 * 3600 # Conteúdo imutável: o nome muda se o arquivo mudar
+    ATTACHMENT_GC_GRACE_SECONDS = int(os.environ.get('ATTACHMENT_GC_GRACE_SECONDS') or 3600)
+    THUMBNAIL_SIZE = int(os.environ.get('THUMBNAIL_SIZE') or 320) # Miniaturas exigem o Pillow (opcional)
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS') or 2)
     
     # --- NOVA CONFIGURAÇÃO PARA BACKUP ---
     BACKUP_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'backups')
+    BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY') or 7) # Último backup de cada um dos N dias mais recentes
+    BACKUP_KEEP_WEEKLY = int(os.environ.get('BACKUP_KEEP_WEEKLY') or 4) # ... e de cada uma das M semanas mais recentes (0 e 0 = sem limpeza)
+    BACKUP_STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES') or 1024) # Páginas copiadas por passo (escritas seguem entre os passos)
     
     # --- NOVA CONFIGURAÇÃO PARA FECHAMENTO AUTOMÁTICO ---
-    AUTO_CLOSE_DAYS = 7 # Valor padrão de 7 dias
\ No newline at end of file
+    AUTO_CLOSE_DAYS = 7 # Valor padrão de 7 dias
+    AUTO_CLOSE_BATCH_SIZE = int(os.environ.get('AUTO_CLOSE_BATCH_SIZE') or 500) # Chamados por transação
+
+    # --- DASHBOARD: VALIDADE DO CACHE DAS MÉTRICAS (SEGUNDOS) ---
+    DASHBOARD_CACHE_SECONDS = int(os.environ.get('DASHBOARD_CACHE_SECONDS') or 60)
+    DASHBOARD_REFRESH_SECONDS = int(os.environ.get('DASHBOARD_REFRESH_SECONDS') or 60) # Atualização dos gráficos no navegador
+
+    # --- CACHE DO USUÁRIO LOGADO E DAS CONFIGURAÇÕES (LIDOS EM TODA REQUISIÇÃO) ---
+    REQUEST_CACHE_SECONDS = int(os.environ.get('REQUEST_CACHE_SECONDS') or 300)
+    REQUEST_CACHE_MAX_ENTRIES = int(os.environ.get('REQUEST_CACHE_MAX_ENTRIES') or 1024)
+    REQUEST_CACHE_VERSION_FILE = os.environ.get('REQUEST_CACHE_VERSION_FILE') # Padrão: ao lado do banco SQLite
+
+    # --- CARDS DE CHAMADO RENDERIZADOS (HOME E KANBAN), VER app/card_cache.py ---
+    TICKET_CARD_CACHE_MAX_ENTRIES = int(os.environ.get('TICKET_CARD_CACHE_MAX_ENTRIES') or 5000) # Poucos KB por card; 0 desliga
+    TICKET_CARD_CACHE_SECONDS = int(os.environ.get('TICKET_CARD_CACHE_SECONDS') or 3600) # A chave já muda com o chamado
+
+    # --- FUSO HORÁRIO DAS DATAS EXIBIDAS (O BANCO GRAVA EM UTC) ---
+    DISPLAY_TIMEZONE = os.environ.get('DISPLAY_TIMEZONE') or 'America/Sao_Paulo'
+
+    # --- KANBAN: CHAMADOS CARREGADOS POR COLUNA A CADA PÁGINA ---
+    KANBAN_PAGE_SIZE = int(os.environ.get('KANBAN_PAGE_SIZE') or 25)
+
+    # --- COMPRESSÃO DAS RESPOSTAS (GZIP, OU BROTLI SE O PACOTE ESTIVER INSTALADO) ---
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() != 'false'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024) # Bytes; abaixo disso não compensa
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY') or 5)
+    COMPRESS_MIMETYPES = ['application/json', 'text/html']
+
+    # --- CONFIGURAÇÃO DAS NOTIFICAÇÕES EM TEMPO REAL (SSE) ---
+    SSE_ENABLED = os.environ.get('SSE_ENABLED', 'true').lower() != 'false'
+    SSE_KEEPALIVE_SECONDS = int(os.environ.get('SSE_KEEPALIVE_SECONDS') or 20)
+    SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS') or 300) # O navegador reconecta sozinho
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS') or 50) # Streams abertos por processo (cada um ocupa uma thread); acima disso, polling
+
+    # --- CHAT EM TEMPO REAL (WEBSOCKET, VER chat_server.py) ---
+    CHAT_WS_URL = os.environ.get('CHAT_WS_URL') # Ex.: ws://servidor:8765/ (vazio: o chat usa só o polling)
+    CHAT_WS_HOST = os.environ.get('CHAT_WS_HOST') or '0.0.0.0'
+    CHAT_WS_PORT = int(os.environ.get('CHAT_WS_PORT') or 8765)
+    CHAT_WS_ALLOWED_ORIGINS = os.environ.get('CHAT_WS_ALLOWED_ORIGINS') # Separadas por vírgula; padrão: mesmo host da página
+    CHAT_WS_TAIL_SECONDS = float(os.environ.get('CHAT_WS_TAIL_SECONDS') or 0.5) # Intervalo da leitura de mensagens novas no banco
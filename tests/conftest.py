@@ -0,0 +1,70 @@
+"""
+Fixtures comuns dos testes de integração: cada teste cria a aplicação com o
+banco, os anexos e os backups numa pasta temporária. O orçamento de consultas
+roda em modo estrito (QUERY_BUDGET_STRICT): uma rota que passe do seu
+@query_budget falha com QueryBudgetExceeded.
+
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from app import create_app, bootstrap
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Fábrica de aplicações apontando para um banco em tmp_path (ou para a URI informada)."""
+    def factory(uri=None, **settings):
+        database = tmp_path / 'site.db'
+        values = {
+            'SQLALCHEMY_DATABASE_URI': uri or f'sqlite:///{database}',
+            'ATTACHMENT_FOLDER': str(tmp_path / 'attachments'),
+            'BACKUP_FOLDER': str(tmp_path / 'backups'),
+            'REQUEST_CACHE_VERSION_FILE': str(tmp_path / 'cache-version'),
+            'WTF_CSRF_ENABLED': False,
+            'QUERY_BUDGET_STRICT': True,
+            **settings,
+        }
+        for name, value in values.items():
+            monkeypatch.setattr(config.Config, name, value, raising=False)
+        app = create_app()
+        app.config['TESTING'] = True
+        return app
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def seeded_app(make_app):
+    from app import seed
+    app = make_app()
+    with app.app_context():
+        seed.seed_database(tickets=200, batch_size=100)
+    return app
+
+
+def login(client, email=bootstrap.DEFAULT_ADMIN_EMAIL, password=bootstrap.DEFAULT_ADMIN_PASSWORD):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302
+
+
+def add_user(name, access_level='colaborador', sector='TI', password='senha123', is_active=True):
+    """Cria um usuário (dentro de um contexto da aplicação) e retorna o seu ID."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from app.models import User
+    user = User(name=name, email=f'{name.lower()}@empresa.com', sector=sector, access_level=access_level,
+                password=generate_password_hash(password), is_active=is_active)
+    db.session.add(user)
+    db.session.commit()
+    return user.id
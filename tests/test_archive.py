@@ -0,0 +1,52 @@
+"""Arquivo morto: chamados fechados antigos em um SQLite anexado."""
+import os
+from datetime import datetime, timedelta
+
+from app import archive, db
+from app.models import User, Ticket, Comment, TicketHistory
+from conftest import login
+
+
+def test_memory_database_without_archive(make_app):
+    # Banco em memória não tem arquivo morto ao lado: as páginas funcionam só com as tabelas ativas
+    app = make_app(uri='sqlite://')
+    client = app.test_client()
+    login(client)
+    for url in ('/home', '/tickets_kanban', '/dashboard', '/reports', '/backup'):
+        assert client.get(url).status_code == 200
+
+
+def test_archived_ticket_leaves_main_database_and_keeps_its_id(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        admin_id = User.query.first().id
+        ticket = Ticket(title='Servidor antigo', description='Desligar o servidor', origin_sector='TI', target_sector='TI',
+                        status='Fechado', user_id=admin_id, created_at=now - timedelta(days=400),
+                        updated_at=now - timedelta(days=400), closed_at=now - timedelta(days=400))
+        db.session.add(ticket)
+        db.session.flush()
+        db.session.add(Comment(ticket_id=ticket.id, user_id=admin_id, content='Desligado e etiquetado'))
+        db.session.add(TicketHistory(ticket_id=ticket.id, changed_by_user_id=admin_id, field_changed='status',
+                                     old_value='Aberto', new_value='Fechado', timestamp=now - timedelta(days=400)))
+        db.session.commit()
+        # O maior ID da base: sem AUTOINCREMENT, o próximo chamado o reaproveitaria
+        ticket_id = ticket.id
+
+        assert archive.archive_closed_tickets()[0] == 1
+        assert db.session.get(Ticket, ticket_id) is None
+        assert db.session.query(Comment).filter_by(ticket_id=ticket_id).count() == 0
+        assert db.session.query(TicketHistory).filter_by(ticket_id=ticket_id).count() == 0
+        assert os.path.exists(archive.archive_path())
+
+    client = app.test_client()
+    login(client)
+    page = client.get(f'/ticket/{ticket_id}')
+    assert page.status_code == 200
+    html = page.get_data(as_text=True)
+    assert 'Servidor antigo' in html and 'Desligado e etiquetado' in html and 'Arquivado' in html
+
+    with app.app_context():
+        new = Ticket(title='Novo', description='Outro', origin_sector='TI', target_sector='TI', user_id=admin_id)
+        db.session.add(new)
+        db.session.commit()
+        assert new.id > ticket_id
@@ -0,0 +1,60 @@
+"""Anexos: armazenamento pelo SHA-256 do conteúdo e coleta de lixo."""
+import base64
+import hashlib
+import io
+import os
+import time
+
+from app import attachments, db
+from app.models import Ticket
+from conftest import login
+
+# PNG de 1x1 pixel: válido também para a miniatura, se o Pillow estiver instalado
+PNG = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII=')
+
+
+def stored_files(folder):
+    return sorted(entry.name for entry in os.scandir(folder) if entry.is_file())
+
+
+def test_same_content_is_stored_once(app):
+    client = app.test_client()
+    login(client)
+    for title in ('Print da tela', 'Mesmo print'):
+        response = client.post('/create_ticket', data={
+            'title': title, 'description': 'Erro ao salvar', 'origin_sector': 'TI', 'target_sector': 'TI',
+            'priority': 'media', 'attachment': (io.BytesIO(PNG), f'{title}.PNG'),
+        }, content_type='multipart/form-data')
+        assert response.status_code == 302
+
+    name = hashlib.sha256(PNG).hexdigest() + '.png'
+    with app.app_context():
+        assert [value for value, in db.session.query(Ticket.attachment_filename).filter(Ticket.title.in_(
+            ['Print da tela', 'Mesmo print']))] == [name, name]
+    assert stored_files(app.config['ATTACHMENT_FOLDER']) == [name]
+
+
+def test_garbage_collection_respects_references_and_grace(make_app):
+    app = make_app(ATTACHMENT_GC_GRACE_SECONDS=600)
+    folder = app.config['ATTACHMENT_FOLDER']
+    os.makedirs(os.path.join(folder, 'thumbs'))
+    referenced, orphan, recent = ('a' * 64 + '.png', 'b' * 64 + '.png', 'c' * 64 + '.txt')
+    old = time.time() - 3600
+    for path in (referenced, orphan, recent, '.upload-interrompido', 'thumbs/' + 'a' * 64 + '.png',
+                 'thumbs/' + 'b' * 64 + '.png'):
+        with open(os.path.join(folder, path), 'wb') as f:
+            f.write(b'x' * 10)
+        if path != recent:
+            os.utime(os.path.join(folder, path), (old, old))
+
+    with app.app_context():
+        db.session.add(Ticket(title='Com anexo', description='d', origin_sector='TI', target_sector='TI', user_id=1,
+                              attachment_filename=referenced))
+        db.session.commit()
+        removed, freed = attachments.collect_garbage(app.config['ATTACHMENT_GC_GRACE_SECONDS'])
+
+    # Só os antigos sem referência saem; o novo sem referência espera o fim da carência
+    assert sorted(removed) == sorted([orphan, '.upload-interrompido', os.path.join('thumbs', 'b' * 64 + '.png')])
+    assert freed == 30
+    assert stored_files(folder) == [referenced, recent]
+    assert stored_files(os.path.join(folder, 'thumbs')) == ['a' * 64 + '.png']
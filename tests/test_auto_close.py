@@ -0,0 +1,37 @@
+"""Fechamento automático dos chamados 'Resolvido' parados."""
+from datetime import datetime, timedelta
+
+from app import auto_close, db
+from app.models import Ticket, TicketHistory, SystemSettings
+from conftest import add_user
+
+
+def test_closes_only_stale_resolved_tickets_once(make_app):
+    app = make_app(AUTO_CLOSE_DAYS=5)
+    now = datetime(2026, 10, 1, 12, 0)
+    with app.app_context():
+        SystemSettings.query.delete()  # Sem configuração gravada vale o AUTO_CLOSE_DAYS
+        author = add_user('Ana')
+        cases = [('Resolvido', 6), ('Resolvido', 6), ('Resolvido', 30), ('Resolvido', 4),
+                 ('Aberto', 10), ('Em Atendimento', 10), ('Fechado', 10)]
+        tickets = []
+        for status, days in cases:
+            tickets.append(Ticket(title=f'{status} há {days} dias', description='Teste', origin_sector='TI',
+                                  target_sector='TI', status=status, user_id=author,
+                                  created_at=now - timedelta(days=days), updated_at=now - timedelta(days=days)))
+        db.session.add_all(tickets)
+        db.session.commit()
+        ids = [ticket.id for ticket in tickets]
+
+        # Lotes de 2: os três elegíveis passam por mais de uma transação
+        closed, _ = auto_close.close_resolved_tickets(batch_size=2, now=now)
+        assert closed == 3
+        statuses = dict(db.session.query(Ticket.id, Ticket.status))
+        assert [statuses[ticket_id] for ticket_id in ids] == ['Fechado'] * 3 + ['Resolvido', 'Aberto', 'Em Atendimento', 'Fechado']
+        history = db.session.query(TicketHistory.ticket_id, TicketHistory.changed_by_user_id, TicketHistory.old_value,
+                                   TicketHistory.new_value).order_by(TicketHistory.ticket_id).all()
+        assert history == [(ticket_id, None, 'Resolvido', 'Fechado') for ticket_id in ids[:3]]
+        assert all(db.session.get(Ticket, ticket_id).closed_at == now for ticket_id in ids[:3])
+
+        assert auto_close.close_resolved_tickets(batch_size=2, now=now)[0] == 0
+        assert db.session.query(TicketHistory).count() == 3
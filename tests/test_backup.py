@@ -0,0 +1,76 @@
+"""Backups: cópia do banco em arquivo, restauração conferida e retenção."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import backup_scheduler
+from app import backup, db
+from app.models import User
+from conftest import add_user
+
+
+def user_count():
+    return db.session.query(User).count()
+
+
+def test_backup_and_restore_file_database(app):
+    with app.app_context():
+        add_user('Ana')
+        manifest, removed = backup.backup_now()
+        backup_path = os.path.join(app.config['BACKUP_FOLDER'], manifest['filename'])
+        assert removed == [] and os.path.exists(backup.manifest_path(backup_path))
+        assert [item['filename'] for item in backup.list_backups(app.config['BACKUP_FOLDER'])] == [manifest['filename']]
+        saved = user_count()
+
+        add_user('Bruno')
+        backup.restore_backup(backup_path, backup.database_path())
+        db.session.remove()
+        db.engine.dispose()
+        assert user_count() == saved
+
+
+def test_restore_refuses_tampered_backup(app):
+    with app.app_context():
+        manifest, _ = backup.backup_now()
+        backup_path = os.path.join(app.config['BACKUP_FOLDER'], manifest['filename'])
+        with open(backup_path, 'r+b') as f:
+            f.seek(manifest['size'] // 2)
+            byte = f.read(1)
+            f.seek(-1, os.SEEK_CUR)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        add_user('Ana')
+        saved = user_count()
+
+        with pytest.raises(backup.BackupError, match='SHA-256'):
+            backup.restore_backup(backup_path, backup.database_path())
+        db.session.remove()
+        assert user_count() == saved
+
+
+def test_retention_keeps_latest_daily_and_weekly(tmp_path):
+    folder = str(tmp_path)
+    # Dois backups por dia, de segunda 28/09 a quarta 14/10/2026
+    first = datetime(2026, 9, 28)
+    for day in range(17):
+        for hour in (8, 20):
+            filename = f"site_{(first + timedelta(days=day, hours=hour)).strftime(backup.TIMESTAMP_FORMAT)}.db.gz"
+            open(os.path.join(folder, filename), 'wb').close()
+            open(backup.manifest_path(os.path.join(folder, filename)), 'w').close()
+
+    removed = backup.apply_retention(folder, keep_daily=3, keep_weekly=2)
+
+    # Diários: 14, 13 e 12/10; semanais: a semana de 12/10 (o de 14/10) e a de 05/10 (o de 11/10)
+    kept = sorted(item['filename'] for item in backup.list_backups(folder))
+    assert kept == [f'site_2026-10-{day}_20-00-00.db.gz' for day in (11, 12, 13, 14)]
+    assert len(removed) == 34 - 4
+    assert sorted(os.listdir(folder)) == sorted(kept + [f'{name}.json' for name in kept])
+
+
+def test_backup_of_memory_database_explains_the_error(make_app, capsys):
+    app = make_app(uri='sqlite://')
+    with app.app_context():
+        with pytest.raises(backup.BackupError, match='em memória'):
+            backup.database_path()
+    backup_scheduler.run_backup(app)
+    assert 'ERRO ao criar backup: O banco está em memória' in capsys.readouterr().out
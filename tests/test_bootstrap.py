@@ -0,0 +1,16 @@
+"""Subida do banco: preparo de um banco novo e o caminho rápido das subidas seguintes."""
+import os
+
+from app import db, bootstrap, migrations
+
+
+def test_bootstrap_prepares_new_file_database(app, tmp_path):
+    with app.app_context():
+        assert bootstrap.installed_version(db.engine) == bootstrap.latest_version()
+        from app.models import User, SystemSettings
+        assert User.query.filter_by(email=bootstrap.DEFAULT_ADMIN_EMAIL).count() == 1
+        assert SystemSettings.query.count() == 1
+        # Na próxima subida o esquema já está em dia: nada é refeito
+        assert bootstrap.ensure_ready(log=lambda message: None) is False
+        assert migrations.upgrade(db.engine) == []
+    assert os.path.exists(tmp_path / 'site.db')
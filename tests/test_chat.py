@@ -0,0 +1,93 @@
+"""Chat: contadores de não lidas mantidos em ChatConversation e leitura em massa."""
+import asyncio
+import json
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.chat import rebuild_conversations
+from app.models import ChatConversation, ChatMessage
+from conftest import login, add_user
+
+
+def unread(user_id, partner_id):
+    return db.session.query(ChatConversation.unread_count).filter_by(user_id=user_id, partner_id=partner_id).scalar()
+
+
+def test_unread_count_follows_send_and_mark_as_read(app):
+    with app.app_context():
+        ana, bruno = add_user('Ana'), add_user('Bruno')
+    client = app.test_client()
+    login(client, 'ana@empresa.com', 'senha123')
+    for n in range(3):
+        assert client.post(f'/chat/{bruno}', data={'content': f'Mensagem {n}'}).status_code == 302
+    with app.app_context():
+        assert unread(bruno, ana) == 3
+        assert unread(ana, bruno) == 0
+
+    client = app.test_client()
+    login(client, 'bruno@empresa.com', 'senha123')
+    info = client.get('/api/chat/unread_info').get_json()
+    assert info['unread_counts'] == {str(ana): 3} and info['unread_total'] == 3
+    assert client.post(f'/api/chat/{ana}/mark_as_read').status_code == 200
+    with app.app_context():
+        assert unread(bruno, ana) == 0
+        assert ChatMessage.query.filter_by(recipient_id=bruno, is_read=False).count() == 0
+    assert client.get('/api/chat/unread_info').get_json()['unread_total'] == 0
+
+
+def test_rebuild_conversations_matches_messages(app):
+    with app.app_context():
+        ana, bruno, carla = add_user('Ana'), add_user('Bruno'), add_user('Carla')
+        messages = [(ana, bruno, False), (ana, bruno, True), (bruno, ana, False), (carla, ana, False),
+                    (carla, ana, False), (ana, ana, False)]
+        for sender, recipient, is_read in messages:
+            db.session.add(ChatMessage(sender_id=sender, recipient_id=recipient, content='oi', is_read=is_read))
+        db.session.commit()
+
+        rebuild_conversations(db.session.connection())
+        db.session.commit()
+        per_message = dict(((recipient, sender), count) for recipient, sender, count in db.session.query(
+            ChatMessage.recipient_id, ChatMessage.sender_id, func.count(ChatMessage.id)
+        ).filter(ChatMessage.is_read == False, ChatMessage.sender_id != ChatMessage.recipient_id).group_by(
+            ChatMessage.recipient_id, ChatMessage.sender_id
+        ))
+        summary = {(row.user_id, row.partner_id): row.unread_count for row in ChatConversation.query}
+        assert {key: count for key, count in summary.items() if count} == per_message
+        # Uma linha por ponta de cada conversa, inclusive a do usuário consigo mesmo
+        assert set(summary) == {(bruno, ana), (ana, bruno), (ana, carla), (carla, ana), (ana, ana)}
+
+
+def test_chat_users_lists_conversations_and_other_users(app):
+    with app.app_context():
+        ana, bruno, carla = add_user('Ana'), add_user('Bruno'), add_user('Carla')
+    client = app.test_client()
+    login(client, 'ana@empresa.com', 'senha123')
+    client.post(f'/chat/{bruno}', data={'content': 'oi'})
+    page = client.get('/chat').get_data(as_text=True)
+    assert 'Bruno' in page and 'Carla' in page and 'Administrador' in page
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, payload):
+        self.sent.append(json.loads(payload))
+
+
+def test_socket_reports_database_errors(app, monkeypatch):
+    import chat_server
+    with app.app_context():
+        ana, bruno = add_user('Ana'), add_user('Bruno')
+
+    def locked(*args):
+        raise OperationalError('INSERT INTO chat_message', {}, Exception('database is locked'))
+    monkeypatch.setattr(chat_server, '_send', locked)
+    hub, socket = chat_server.ChatHub(app), FakeSocket()
+    # O erro volta para o cliente com o client_id da mensagem, sem derrubar o socket
+    asyncio.run(hub.dispatch(socket, ana, {'type': 'send', 'to': bruno, 'content': 'Oi', 'client_id': 'c1'}))
+    assert socket.sent == [{'type': 'error', 'client_id': 'c1', 'message': 'Erro ao processar a mensagem. Tente novamente.'}]
+    with app.app_context():
+        assert db.session.query(ChatMessage).count() == 0
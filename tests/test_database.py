@@ -0,0 +1,61 @@
+"""Banco em arquivo com WAL: leituras e escritas concorrentes pelo pool configurado."""
+import threading
+import time
+
+from sqlalchemy import text
+
+from app import db
+from app.models import Notification, Ticket
+from conftest import add_user
+
+
+def test_concurrent_reads_and_writes_on_pooled_connections(make_app):
+    app = make_app(DB_POOL_SIZE=6, DB_MAX_OVERFLOW=0, SQLITE_BUSY_TIMEOUT_MS=4321)
+    with app.app_context():
+        user_id = add_user('Ana')
+        ticket = Ticket(title='Rede', description='Sem rede', origin_sector='TI', target_sector='TI', user_id=user_id)
+        db.session.add(ticket)
+        db.session.commit()
+        ticket_id = ticket.id
+
+    errors, pragmas, connections = [], [], set()
+    lock = threading.Lock()
+    start = threading.Barrier(6)
+
+    def worker(writer):
+        with app.app_context():
+            try:
+                start.wait()
+                connection = db.session.connection()
+                with lock:
+                    connections.add(id(connection.connection.dbapi_connection))
+                    pragmas.append((connection.execute(text('PRAGMA journal_mode')).scalar(),
+                                    connection.execute(text('PRAGMA busy_timeout')).scalar()))
+                for n in range(20):
+                    if writer:
+                        # Escrita primeiro e transação segurada: o outro escritor espera pelo busy_timeout
+                        db.session.add(Notification(user_id=user_id, ticket_id=ticket_id, message=f'Aviso {n}'))
+                        db.session.flush()
+                        time.sleep(0.01)
+                        db.session.commit()
+                    else:
+                        db.session.query(Notification).filter_by(user_id=user_id, is_read=False).count()
+                        db.session.commit()
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n < 2,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    # Cada thread recebeu a sua conexão do pool, e todas com os PRAGMAs da configuração
+    assert len(connections) == 6
+    assert pragmas == [('wal', 4321)] * 6
+    with app.app_context():
+        assert db.session.query(Notification).count() == 40
@@ -0,0 +1,49 @@
+"""Migrações versionadas: bancos antigos chegam ao esquema atual sem perder dados."""
+import sqlite3
+
+from app import db
+
+
+def test_legacy_ticket_table_gains_autoincrement(make_app, tmp_path):
+    app = make_app()
+    with app.app_context():
+        db.engine.dispose()
+    conn = sqlite3.connect(tmp_path / 'site.db')
+    conn.executescript("""
+        CREATE TABLE ticket_old AS SELECT * FROM ticket;
+        DROP TABLE ticket;
+        CREATE TABLE ticket (
+            id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, description TEXT NOT NULL,
+            origin_sector VARCHAR(50) NOT NULL, target_sector VARCHAR(50) NOT NULL, priority VARCHAR(20) NOT NULL,
+            status VARCHAR(20) NOT NULL, created_at DATETIME, updated_at DATETIME, closed_at DATETIME,
+            user_id INTEGER NOT NULL, assigned_to INTEGER, attachment_filename VARCHAR(100)
+        );
+        DROP TABLE ticket_old;
+        CREATE INDEX ix_ticket_status_created_at ON ticket (status, created_at);
+        INSERT INTO ticket (id, title, description, origin_sector, target_sector, priority, status, created_at, user_id)
+        VALUES (7, 'Legado', 'Chamado antigo', 'TI', 'TI', 'media', 'Aberto', '2024-01-01 08:00:00', 1);
+        DELETE FROM schema_version WHERE version >= 9;
+    """)
+    conn.commit()
+    conn.close()
+    # Arquivo morto com um chamado fechado: a sequência e os fechamentos também vêm dele
+    archive = sqlite3.connect(tmp_path / 'site-archive.db')
+    archive.executescript("""
+        CREATE TABLE ticket (id INTEGER PRIMARY KEY, target_sector VARCHAR(50), assigned_to INTEGER,
+                             status VARCHAR(20), created_at DATETIME, closed_at DATETIME);
+        INSERT INTO ticket VALUES (50, 'TI', NULL, 'Fechado', '2024-01-01 08:00:00', '2024-01-02 08:00:00');
+    """)
+    archive.commit()
+    archive.close()
+
+    app = make_app()
+    with app.app_context():
+        ddl = db.session.execute(db.text("SELECT sql FROM sqlite_master WHERE name = 'ticket'")).scalar()
+        assert 'AUTOINCREMENT' in ddl.upper()
+        indexes = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE tbl_name = 'ticket'")).scalars().all()
+        assert 'ix_ticket_status_created_at' in indexes
+        from app.models import Ticket
+        assert db.session.get(Ticket, 7).title == 'Legado'
+        assert db.session.execute(db.text("SELECT seq FROM sqlite_sequence WHERE name = 'ticket'")).scalar() == 50
+        closings = db.session.execute(db.text("SELECT ticket_id, assigned_to, close_seconds FROM ticket_closing")).all()
+        assert [tuple(row) for row in closings] == [(50, 0, 86400.0)]
@@ -0,0 +1,74 @@
+"""
+Orçamento de consultas SQL das rotas principais, para cada perfil, sobre um
+banco populado pelo gerador de dados sintéticos.
+"""
+import pytest
+
+from app import bootstrap
+from app.instrumentation import QueryBudgetExceeded
+from conftest import login
+
+
+def test_routes_within_query_budget(seeded_app):
+    from app import seed
+    from app.models import User, Ticket
+    with seeded_app.app_context():
+        tecnico = User.query.filter_by(access_level='tecnico', sector='TI').order_by(User.id).first()
+        colaborador = User.query.filter_by(access_level='colaborador').filter(User.tickets_created.any()).first()
+        own_ticket = Ticket.query.filter_by(user_id=colaborador.id).first().id
+        sector_ticket = Ticket.query.filter_by(target_sector='TI').order_by(Ticket.id.desc()).first().id
+        users = {'administrador': (bootstrap.DEFAULT_ADMIN_EMAIL, bootstrap.DEFAULT_ADMIN_PASSWORD),
+                 'tecnico': (tecnico.email, seed.SEED_PASSWORD),
+                 'colaborador': (colaborador.email, seed.SEED_PASSWORD)}
+        partner = colaborador.id
+
+    routes = {
+        'administrador': ['/home', '/tickets_kanban', '/dashboard', '/api/dashboard/metrics', '/reports',
+                          '/users', '/settings', '/backup', '/export?format=json&status=Aberto'],
+        'tecnico': ['/home', '/home?q=impressora', '/tickets_kanban',
+                    '/tickets_kanban?q=impressora',
+                    '/api/kanban/column?status=Fechado', '/api/search?q=impressora', f'/ticket/{sector_ticket}',
+                    '/chat', f'/chat/{partner}', f'/api/chat/{partner}/messages', '/api/chat/unread_info',
+                    '/check_updates'],
+        'colaborador': ['/home', '/tickets_kanban', f'/ticket/{own_ticket}', '/create_ticket'],
+    }
+    for profile, urls in routes.items():
+        client = seeded_app.test_client()
+        login(client, *users[profile])
+        for url in urls:
+            # Lê e fecha a resposta: as rotas em streaming (exportação) só consultam o banco ao serem lidas
+            with client.get(url) as response:
+                response.get_data()
+                assert response.status_code in (200, 204), f'{profile} {url}: {response.status_code}'
+
+    client = seeded_app.test_client()
+    login(client, *users['tecnico'])
+    response = client.post('/api/tickets/bulk_update', json={'ticket_ids': [sector_ticket], 'changes': {'status': 'Em Atendimento'}})
+    assert response.status_code == 200
+    response = client.post(f'/ticket/{sector_ticket}', data={'status': 'Resolvido', 'priority': 'media',
+                                                             'assigned_to': 0, 'submit_update': 'y'})
+    assert response.status_code == 302
+
+
+def test_strict_budget_raises(make_app):
+    app = make_app(QUERY_BUDGET=1)
+    client = app.test_client()
+    login(client)
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/users')
+
+
+def test_streamed_response_checks_budget_on_close(app, monkeypatch):
+    client = app.test_client()
+    login(client)
+    with client.get('/export?format=json') as response:
+        response.get_data()
+        # As consultas do corpo acontecem depois dos cabeçalhos: sem contagem parcial no X-Query-Count
+        assert 'X-Query-Count' not in response.headers
+    assert 'X-Query-Count' in client.get('/home').headers
+
+    # O orçamento é conferido quando a resposta termina, com as consultas feitas ao gerar o corpo
+    monkeypatch.setattr(app.view_functions['main.export_tickets'], 'query_budget', 0)
+    with pytest.raises(QueryBudgetExceeded, match='export_tickets'):
+        with client.get('/export?format=json') as response:
+            response.get_data()
@@ -0,0 +1,58 @@
+"""Relatórios: chamados atualmente fechados contam uma vez, pelo último fechamento; a página só lê."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+
+
+def test_reopened_ticket_counts_once(make_app):
+    from app.models import Ticket, User
+    from app.ticket_updates import apply_changes
+    from app import reports
+    app = make_app()
+    with app.app_context():
+        admin = User.query.first()
+        ticket = Ticket(title='Reaberto', description='d', origin_sector='TI', target_sector='TI', status='Aberto',
+                        user_id=admin.id, created_at=datetime.utcnow() - timedelta(days=5))
+        db.session.add(ticket)
+        db.session.commit()
+        base = datetime.utcnow()
+        for status, days_ago in (('Fechado', 3), ('Aberto', 2), ('Fechado', 1)):
+            apply_changes([db.session.get(Ticket, ticket.id)], {'status': status}, admin, now=base - timedelta(days=days_ago))
+            db.session.commit()
+            reports.refresh_daily_rollup()
+        count, seconds = reports.summarize(reports.closing_stats())['total']
+        assert count == 1
+        assert seconds == pytest.approx(4 * 86400, abs=60)
+        assert reports.closed_ticket_details().total == 1
+
+
+def test_reports_page_only_reads_the_rollup_kept_by_writers(app):
+    from sqlalchemy import event
+    from app.models import Ticket, TicketClosing, User
+    from conftest import login
+    with app.app_context():
+        admin = User.query.first()
+        ticket = Ticket(title='Fechado pelo kanban', description='d', origin_sector='TI', target_sector='TI',
+                        status='Em Atendimento', user_id=admin.id)
+        db.session.add(ticket)
+        db.session.commit()
+        ticket_id = ticket.id
+    client = app.test_client()
+    login(client)
+    response = client.post('/api/tickets/bulk_update', json={'ticket_ids': [ticket_id], 'changes': {'status': 'Fechado'}})
+    assert response.get_json()['updated'] == 1
+    with app.app_context():
+        # Consolidado por quem fechou, antes de qualquer visita à página
+        assert db.session.query(TicketClosing.ticket_id).all() == [(ticket_id,)]
+
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement.lstrip().split()[0].upper())
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            page = client.get('/reports').get_data(as_text=True)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    assert 'Fechado pelo kanban' in page
+    assert statements and set(statements) == {'SELECT'}
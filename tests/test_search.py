@@ -0,0 +1,52 @@
+"""Busca: índice FTS5 mantido pelos triggers e o LIKE de quando não há FTS5."""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import db, search
+from app.models import Ticket, Comment
+
+
+def fts_ids(term):
+    return [rowid for rowid, in db.session.execute(
+        text(f'SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH :match ORDER BY rowid'),
+        {'match': search.build_match_query(term)})]
+
+
+def add_ticket(title, updated_at=None):
+    ticket = Ticket(title=title, description='Descrição padrão', origin_sector='TI', target_sector='TI', user_id=1,
+                    updated_at=updated_at)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket
+
+
+def test_triggers_keep_index_in_sync(app):
+    with app.app_context():
+        assert search.is_available(db.session)
+        ticket = add_ticket('Impressora sem toner')
+        assert fts_ids('toner') == [ticket.id]
+
+        ticket.title = 'Monitor piscando'
+        db.session.commit()
+        assert fts_ids('toner') == [] and fts_ids('piscando') == [ticket.id]
+
+        db.session.add(Comment(ticket_id=ticket.id, user_id=1, content='Cabo HDMI trocado'))
+        db.session.commit()
+        assert fts_ids('hdmi') == [ticket.id]
+
+        db.session.delete(ticket)
+        db.session.commit()
+        assert fts_ids('piscando') == [] and fts_ids('hdmi') == []
+        assert db.session.execute(text(f'SELECT count(*) FROM {search.FTS_TABLE}')).scalar() == 0
+
+
+def test_like_fallback_orders_by_last_update(app):
+    now = datetime.utcnow()
+    with app.app_context():
+        old = add_ticket('Teclado antigo', now - timedelta(days=3))
+        recent = add_ticket('Teclado novo', now - timedelta(days=1))
+        tie = add_ticket('Teclado reserva', now - timedelta(days=1))
+        tickets, snippets = search.search_tickets(db.session, Ticket.query, 'teclado', fts_table=None)
+        assert [ticket.id for ticket in tickets] == [tie.id, recent.id, old.id]
+        assert snippets == {}
@@ -0,0 +1,100 @@
+"""Alteração de chamados: página do chamado e alteração em massa (kanban, inclusive o arrastar de um card)."""
+from app import db
+from app import ticket_updates
+from app.models import Ticket
+from conftest import login, add_user
+
+
+def add_ticket(user_id, status='Aberto', target_sector='TI', assigned_to=None, origin_sector='TI'):
+    ticket = Ticket(title='Impressora', description='Não imprime', origin_sector=origin_sector, target_sector=target_sector,
+                    status=status, priority='media', user_id=user_id, assigned_to=assigned_to)
+    db.session.add(ticket)
+    db.session.commit()
+    return ticket.id
+
+
+def bulk_update(client, ticket_ids, changes):
+    return client.post('/api/tickets/bulk_update', json={'ticket_ids': ticket_ids, 'changes': changes})
+
+
+def update(client, ticket_id, assigned_to):
+    return client.post(f'/ticket/{ticket_id}', data={'status': 'Em Atendimento', 'priority': 'media',
+                                                     'assigned_to': assigned_to, 'submit_update': 'y'})
+
+
+def test_view_ticket_skips_inactive_assignees(app):
+    with app.app_context():
+        ativo = add_user('Ativo', access_level='tecnico')
+        inativo = add_user('Inativo', access_level='tecnico', is_active=False)
+        ticket_id = add_ticket(ativo)
+    client = app.test_client()
+    login(client)
+    # Fora da lista de responsáveis, o formulário não valida: a página volta sem alterar o chamado
+    assert update(client, ticket_id, inativo).status_code == 200
+    with app.app_context():
+        assert db.session.get(Ticket, ticket_id).assigned_to is None
+    assert update(client, ticket_id, ativo).status_code == 302
+    with app.app_context():
+        assert db.session.get(Ticket, ticket_id).assigned_to == ativo
+
+
+def test_view_ticket_flashes_change_error(app, monkeypatch):
+    with app.app_context():
+        tecnico = add_user('Tecnico', access_level='tecnico')
+        ticket_id = add_ticket(tecnico)
+    client = app.test_client()
+    login(client)
+    # O responsável é desativado entre a validação do formulário e a gravação
+    monkeypatch.setattr(ticket_updates, '_user_names', lambda tickets, assignee: {assignee: ('Tecnico', False)})
+    response = update(client, ticket_id, tecnico)
+    assert response.status_code == 302
+    assert 'Responsável inválido.' in client.get(response.location).get_data(as_text=True)
+    with app.app_context():
+        ticket = db.session.get(Ticket, ticket_id)
+        assert ticket.assigned_to is None and ticket.status == 'Aberto'
+
+
+def test_view_ticket_keeps_current_inactive_assignee(app):
+    with app.app_context():
+        inativo = add_user('Inativo', access_level='tecnico', is_active=False)
+        ticket_id = add_ticket(inativo, assigned_to=inativo)
+    client = app.test_client()
+    login(client)
+    # O responsável atual, mesmo inativo, continua válido enquanto não for trocado
+    assert update(client, ticket_id, inativo).status_code == 302
+    with app.app_context():
+        ticket = db.session.get(Ticket, ticket_id)
+        assert ticket.status == 'Em Atendimento' and ticket.assigned_to == inativo
+
+
+def test_bulk_update_refuses_tickets_outside_editable_ids(app):
+    with app.app_context():
+        add_user('Tecnico', access_level='tecnico', sector='TI')
+        autor = add_user('Autor', sector='RH')
+        visible = add_ticket(autor)
+        hidden = add_ticket(autor, target_sector='RH', origin_sector='RH')
+    client = app.test_client()
+    login(client, 'tecnico@empresa.com', 'senha123')
+    data = bulk_update(client, [visible, hidden, 999999], {'status': 'Em Atendimento'}).get_json()
+    assert data['updated'] == 1 and not data['success']
+    assert [(result['id'], result['success']) for result in data['results']] == [(visible, True), (hidden, False), (999999, False)]
+    assert data['results'][1]['message'] == 'Permissão negada.'
+    with app.app_context():
+        assert db.session.get(Ticket, visible).status == 'Em Atendimento'
+        assert db.session.get(Ticket, hidden).status == 'Aberto'
+
+
+def test_bulk_update_limits_tickets_per_request(make_app):
+    app = make_app(BULK_UPDATE_MAX_TICKETS=3)
+    with app.app_context():
+        autor = add_user('Autor')
+        ticket_ids = [add_ticket(autor) for _ in range(4)]
+    client = app.test_client()
+    login(client)
+    response = bulk_update(client, ticket_ids, {'status': 'Resolvido'})
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Máximo de 3 chamados por vez.'
+    with app.app_context():
+        assert {ticket.status for ticket in Ticket.query.filter(Ticket.id.in_(ticket_ids))} == {'Aberto'}
+    # IDs repetidos contam uma vez só
+    assert bulk_update(client, ticket_ids[:3] * 2, {'status': 'Resolvido'}).get_json()['updated'] == 3
@@ -0,0 +1,51 @@
+"""Exportação e importação de chamados: ida e volta pelo JSON Lines."""
+import io
+
+from app import db
+from app import transfer
+from app.models import Ticket, Comment, TicketHistory
+from conftest import login, add_user
+
+
+def attached(ticket_id):
+    comments = [content for content, in db.session.query(Comment.content)
+                .filter_by(ticket_id=ticket_id).order_by(Comment.id)]
+    history = [(field, new) for field, new in db.session.query(TicketHistory.field_changed, TicketHistory.new_value)
+               .filter_by(ticket_id=ticket_id).order_by(TicketHistory.id)]
+    return comments, history
+
+
+def test_export_import_keeps_comments_and_history_on_their_ticket(app):
+    with app.app_context():
+        autor = add_user('Autor')
+        for n in range(7):
+            ticket = Ticket(title=f'Chamado {n}', description='Teste', origin_sector='TI', target_sector='TI',
+                            priority='media', status='Aberto', user_id=autor)
+            db.session.add(ticket)
+            db.session.flush()
+            # Quantidades diferentes por chamado: uma troca de posição no lote apareceria no resultado
+            for k in range(n % 3):
+                db.session.add(Comment(ticket_id=ticket.id, user_id=autor, content=f'Comentário {n}.{k}'))
+            db.session.add(TicketHistory(ticket_id=ticket.id, changed_by_user_id=autor, field_changed='status',
+                                         old_value='N/A', new_value='Aberto'))
+            for k in range(n % 2):
+                db.session.add(TicketHistory(ticket_id=ticket.id, changed_by_user_id=autor, field_changed='priority',
+                                             old_value='baixa', new_value=f'nota {n}'))
+        db.session.commit()
+        originals = {title: (ticket_id, attached(ticket_id)) for ticket_id, title in db.session.query(Ticket.id, Ticket.title)}
+        last_id = max(ticket_id for ticket_id, _ in originals.values())
+
+    client = app.test_client()
+    login(client)
+    with client.get('/export?format=json') as response:
+        assert response.status_code == 200
+        exported = response.get_data(as_text=True)
+
+    with app.app_context():
+        # Lotes pequenos: vários INSERTs com RETURNING, cada um ligado aos seus comentários e histórico
+        result = transfer.import_tickets(io.StringIO(exported), batch_size=3)
+        assert result['tickets'] == 7 and result['error_count'] == 0
+        imported = db.session.query(Ticket.id, Ticket.title).filter(Ticket.id > last_id).all()
+        assert len(imported) == 7
+        for ticket_id, title in imported:
+            assert attached(ticket_id) == originals[title][1]